@@ -1,5 +1,8 @@
-import requests
-from PySide6.QtCore import Qt, Slot
+import os
+import sys
+import threading
+
+from PySide6.QtCore import Qt, QTimer, Signal, Slot
 from PySide6.QtGui import QPixmap, QAction, QImage
 from PySide6.QtWidgets import (
     QWidget,
@@ -10,20 +13,84 @@ from PySide6.QtWidgets import (
     QCheckBox,
     QComboBox,
     QPushButton,
-    QScrollArea,
     QMenu,
+    QFileDialog,
 )
 
 import config
+import fetch_planner
+import instrumentation
+import metadata_cache
+import pixmap_cache
+import prefetch
+import query_cache
+import rate_limit
+import renditions
+import session
+import singleflight
+import startup
 import utils
-from downloader import ImageDownloaderThread
-from fetch import FetchDataThread
-from viewer import FullImageViewer
+from overlay import PerformanceOverlay
+from results import (
+    ResultDataRole,
+    ResultsModel,
+    ResultsProxyModel,
+    ResultsView,
+    THUMBNAIL_PENDING,
+    ThumbnailStateRole,
+    ThumbnailUrlRole,
+)
+
+
+def _fetch():
+    """Imports the search thread on first use.  It brings in asyncio and the search
+    client, which the first window does not need."""
+    import fetch
+
+    return fetch
+
+
+def _downloader():
+    """Imports thumbnail downloads, and with them the decode pool, on first use,
+    see _fetch()."""
+    import downloader
+
+    return downloader
+
+
+def _decode_pool():
+    """Imports the decode pool on first use, see _fetch()."""
+    import decode_pool
+
+    return decode_pool
+
+
+def _thumbnail_pack():
+    """Imports the thumbnail pack on first use, see _fetch()."""
+    import thumbnail_pack
+
+    return thumbnail_pack
+
+
+def _saver():
+    """Imports image saving, and with it the HTTP stack, on first use, see _fetch()."""
+    import saver
+
+    return saver
+
+
+def _viewer():
+    """Imports the full image viewer on first use, see _fetch()."""
+    import viewer
+
+    return viewer
 
 
 class App(QWidget):
     """An application for criteria based browsing of the MET Collection."""
 
+    classifications_counted = Signal(list)  # (classification, count) pairs
+
     def __init__(self):
         """
         The metexplorer application main UI.
@@ -31,29 +98,58 @@ class App(QWidget):
         metexplorer returns thumbnails and information of the work."""
 
         super().__init__()
-        self.results = None  # Search results
+        self.search_params = None  # Query, image filter and classification of the current search
+        self.search_sort = None  # Sort field and direction when the search started
+        self.object_ids = None  # IDs of every object matching the current search
+        self.next_offset = 0  # Position in object_ids of the next page to fetch
+        self.search_generation = 0  # Incremented by every search to discard late results
         self.has_images = None  # Filter for result with images
         self.query = None  # Search term field
+        self.sort_field = None  # Sort field value
         self.order = None  # Sort order value
         self.classification = None  # Artwork classification value
-        self.results_layout = None  # Search results layout
-        self.scroll_area = None  # Scroll area for results
+        self.classification_counter = None  # Thread counting classifications, if any
+        self.results_model = ResultsModel(self)  # Search results, in search order
+        self.results_proxy = ResultsProxyModel(self)  # Sorted and filtered results shown
+        self.results_proxy.setSourceModel(self.results_model)
+        self.results_view = None  # Virtualized list of results
+        self.context_menu = None  # Right click menu shared by all results
+        self.context_row = None  # Result row the context menu was opened on
+        self.opened_row = None  # Result row whose image was last opened in the viewer
         self.loading_label = None  # Placeholder label for image downloading
+        self.no_results_label = None  # Message shown when a search finds nothing
+        self.download_label = None  # Status of image saves and bulk downloads
+        self.bulk_download = None  # Thread saving every result, if one is running
         self.full_image_viewer = None  # Full sized image viewer
+        self.overlay = None  # Stage latencies and queue depths, toggled with F12
 
         self.setWindowTitle("MET Collection Explorer")
         self.resize(config.APPLICATION_DEFAULT_WIDTH, config.APPLICATION_DEFAULT_HEIGHT)
         self.init_ui()
 
-        self.fetch_threads = []  # Threaded queries
-        self.image_threads = []  # Threaded image search
+        self.fetch_threads = []  # Threaded queries of the current search
+        self.stopped_threads = set()  # Cancelled queries still winding down
+        self.image_scheduler = None  # Thumbnail downloads, started with the first one
+        self.image_requests = {}  # Download request ID -> thumbnail URL
+        self.requested_urls = {}  # Thumbnail URL -> download request ID
+        self.prefetcher = prefetch.get_prefetcher()  # Full images and next pages
+        self.prefetcher.is_idle = self.is_idle
+        startup.mark("create window")
+        if config.RESTORE_SESSION:
+            self.restore_session()
+            startup.mark("restore session")
+        self.sort_results()
+        # Filtering may fetch the next page, which waits until the window is painted
+        QTimer.singleShot(0, self.filter_results)
+        QTimer.singleShot(0, self.refresh_classifications)
 
     def init_ui(self):
         """Sets up the user interface with the layouts."""
         layout = QVBoxLayout()
         layout.addLayout(self.create_form_layout())
-        self.create_scroll_area(layout)
+        self.create_results_view(layout)
         self.create_loading_label(layout)
+        self.create_context_menu()
         self.setLayout(layout)
 
     def create_form_layout(self):
@@ -67,21 +163,30 @@ class App(QWidget):
         self.query.setMinimumWidth(100)
         form_layout.addWidget(self.query)
 
-        # Modifiable Classification dropdown.  Displays top 50 classifications.
+        # Modifiable Classification dropdown.  Displays the most common classifications.
         form_layout.addWidget(QLabel("Classification:"))
         self.classification = QComboBox()
         self.classification.setMinimumWidth(265)
         self.classification.setEditable(True)
-        self.classification.addItems(config.CLASSIFICATION_OPTIONS)
+        self.classifications_counted.connect(self.set_classifications)
+        self.set_classifications([])
         form_layout.addWidget(self.classification)
 
         # Filter for entries which have images.
         self.has_images = QCheckBox("Has Images")
         self.has_images.setChecked(True)
+        self.has_images.toggled.connect(self.filter_results)
         form_layout.addWidget(self.has_images)
 
-        # Sort by ascending or descending work date.
-        form_layout.addWidget(QLabel("Order By Date:"))
+        # Sort by work date, title, artist or search relevance.
+        form_layout.addWidget(QLabel("Sort By:"))
+        self.sort_field = QComboBox()
+        self.sort_field.addItems(list(config.SORT_OPTIONS))
+        self.sort_field.currentIndexChanged.connect(self.sort_results)
+        form_layout.addWidget(self.sort_field)
+
+        # Sort ascending or descending.
+        form_layout.addWidget(QLabel("Order:"))
         self.order = QComboBox()
         self.order.addItems([config.ORDER_ASCENDING, config.ORDER_DESCENDING])
         self.order.currentIndexChanged.connect(self.sort_results)
@@ -93,15 +198,18 @@ class App(QWidget):
         form_layout.addWidget(search_button)
         return form_layout
 
-    def create_scroll_area(self, layout):
-        """Creates the scroll area to display search results."""
-        self.scroll_area = QScrollArea()
-        self.scroll_area.setWidgetResizable(True)
-        self.results_layout = QVBoxLayout()
-        results_widget = QWidget()
-        results_widget.setLayout(self.results_layout)
-        self.scroll_area.setWidget(results_widget)
-        layout.addWidget(self.scroll_area)
+    def create_results_view(self, layout):
+        """Creates the list view to display search results."""
+        self.results_view = ResultsView()
+        self.results_view.setModel(self.results_proxy)
+        self.results_view.visible_rows_changed.connect(self.request_visible_thumbnails)
+        self.results_view.visible_rows_changed.connect(self.load_more_if_needed)
+        self.results_view.visible_rows_changed.connect(self.prefetch_images)
+        self.results_view.hovered_row_changed.connect(self.prefetch_images)
+        self.results_view.thumbnail_clicked.connect(self.show_result_image)
+        self.results_view.customContextMenuRequested.connect(self.show_context_menu)
+        layout.addWidget(self.results_view)
+        self.overlay = PerformanceOverlay(self.queue_depths, self.results_view)
 
     def create_loading_label(self, layout):
         """Displays a "Loading..." label in the image area while data fetching."""
@@ -109,175 +217,564 @@ class App(QWidget):
         self.loading_label.setAlignment(Qt.AlignCenter)
         layout.addWidget(self.loading_label)
         self.loading_label.hide()
+        self.no_results_label = QLabel("No results found.")
+        self.no_results_label.setAlignment(Qt.AlignCenter)
+        layout.addWidget(self.no_results_label)
+        self.no_results_label.hide()
+        self.download_label = QLabel()
+        layout.addWidget(self.download_label)
+        self.download_label.hide()
+
+    def create_context_menu(self):
+        """Create the right click menu shared by all search results."""
+        self.context_menu = QMenu(self)
+
+        # Learn More option to launch MET information link on work
+        learn_more_action = QAction("Learn More", self)
+        learn_more_action.triggered.connect(
+            lambda: utils.open_object_url(self.context_result().get("objectURL"))
+        )
+        self.context_menu.addAction(learn_more_action)
+
+        # Download Image option
+        self.download_image_action = QAction("Download Image", self)
+        self.download_image_action.triggered.connect(
+            lambda: self.download_large_image(
+                renditions.full_image_url(self.context_result())
+            )
+        )
+        self.context_menu.addAction(self.download_image_action)
+
+        # Save the images and metadata of every result shown
+        download_all_action = QAction("Download All Results...", self)
+        download_all_action.triggered.connect(self.download_all_results)
+        self.context_menu.addAction(download_all_action)
+
+        # Performance overlay, also toggled with F12 anywhere in the window
+        self.context_menu.addSeparator()
+        overlay_action = QAction("Performance Overlay", self)
+        overlay_action.setCheckable(True)
+        overlay_action.setShortcut(Qt.Key_F12)
+        overlay_action.toggled.connect(self.overlay.set_shown)
+        self.context_menu.addAction(overlay_action)
+        self.addAction(overlay_action)
 
     def search(self):
         """Performs the search operation by clearing the existing results, and starting a new fetch."""
-        utils.clear_layout(self.results_layout)
-        self.loading_label.show()
         self.terminate_threads()
-        fetch_thread = FetchDataThread(
+        self.search_generation += 1
+        self.results_model.clear()
+        self.no_results_label.hide()
+        self.search_params = (
             self.query.text(),
             self.has_images.isChecked(),
             self.classification.currentText(),
         )
+        self.search_sort = (
+            config.SORT_OPTIONS[self.sort_field.currentText()],
+            self.order.currentText() == config.ORDER_DESCENDING,
+        )
+        self.object_ids = None
+        self.next_offset = 0
+        self.opened_row = None
+        self.prefetcher.set_objects([])
+        self.refresh_classifications()
+        self.load_next_page()
+
+    def refresh_classifications(self):
+        """Counts the classifications of the objects fetched so far on a background
+        thread, then lists the most common, see set_classifications()."""
+        if self.classification_counter is not None:
+            if self.classification_counter.is_alive():
+                return
+
+        def count():
+            try:
+                counts = metadata_cache.get_cache().classification_counts(
+                    config.CLASSIFICATION_OPTIONS_MAX
+                )
+            except Exception as e:
+                print(f"Error counting classifications: {e}")
+                return
+            self.classifications_counted.emit(counts)
+
+        self.classification_counter = threading.Thread(
+            target=count, name="classifications", daemon=True
+        )
+        self.classification_counter.start()
+
+    @Slot(list)
+    def set_classifications(self, counts):
+        """Lists the classifications of counts, most common first, completed with
+        config.CLASSIFICATION_OPTIONS, keeping the current text."""
+        options = [""]
+        known = {""}
+        for option in [name for name, _ in counts] + config.CLASSIFICATION_OPTIONS:
+            if len(options) > config.CLASSIFICATION_OPTIONS_MAX:
+                break
+            if option.lower() not in known:
+                known.add(option.lower())
+                options.append(option)
+        text = self.classification.currentText()
+        self.classification.blockSignals(True)
+        self.classification.clear()
+        self.classification.addItems(options)
+        self.classification.setCurrentText(text)
+        self.classification.blockSignals(False)
+
+    def load_next_page(self):
+        """Starts fetching the next page of results of the current search."""
+        self.loading_label.show()
+        if self.object_ids is not None:
+            self.prefetcher.record_objects(
+                self.object_ids[self.next_offset : self.next_offset + config.MAX_RESULTS]
+            )
+        fetch_thread = _fetch().FetchDataThread(
+            *self.search_params,
+            self.object_ids,
+            self.next_offset,
+            self.search_sort,
+            self.search_generation,
+        )
         fetch_thread.result_ready.connect(self.add_results)
         fetch_thread.no_results.connect(self.show_no_results)
-        fetch_thread.finished.connect(lambda: self.loading_label.hide())
+        fetch_thread.ids_ready.connect(self.set_object_ids)
+        fetch_thread.page_end.connect(self.set_next_offset)
+        fetch_thread.results_removed.connect(self.remove_results)
+        fetch_thread.finished.connect(lambda: self.page_finished(fetch_thread))
         self.fetch_threads.append(fetch_thread)
         fetch_thread.start()
 
+    def has_more_pages(self):
+        """Returns whether the current search has object IDs not fetched yet."""
+        return self.object_ids is not None and self.next_offset < len(self.object_ids)
+
+    @Slot(int, list)
+    def set_object_ids(self, generation, object_ids):
+        """Keeps every object ID of the search so further pages can be fetched, and
+        orders the results shown by them, as after a search ran again."""
+        if generation == self.search_generation:
+            self.object_ids = object_ids
+            self.results_model.set_order(object_ids)
+
+    @Slot(int, int)
+    def set_next_offset(self, generation, offset):
+        """Moves to the object ID where the page just fetched stopped."""
+        if generation == self.search_generation:
+            self.next_offset = offset
+
+    @Slot(int, list)
+    def remove_results(self, generation, object_ids):
+        """Removes results a search run again no longer found."""
+        if generation == self.search_generation:
+            self.results_model.remove_objects(object_ids)
+
+    def page_finished(self, fetch_thread):
+        """Shows "No results found." once every page is fetched without a result,
+        otherwise fetches another page if the list does not reach the bottom of the view."""
+        self.stopped_threads.discard(fetch_thread)
+        if fetch_thread not in self.fetch_threads:
+            return
+        self.fetch_threads.remove(fetch_thread)
+        self.loading_label.hide()
+        if self.results_proxy.rowCount() == 0 and not self.has_more_pages():
+            if self.object_ids is not None:
+                self.show_no_results()
+            return
+        self.load_more_if_needed()
+        if not self.fetch_threads and self.has_more_pages():
+            self.prefetcher.set_objects(
+                self.object_ids[self.next_offset : self.next_offset + config.MAX_RESULTS]
+            )
+
+    def is_idle(self):
+        """Returns whether no search page, thumbnail or viewer image is loading.
+        Called from prefetch threads."""
+        return not (
+            self.fetch_threads
+            or (
+                self.image_scheduler is not None
+                and (
+                    self.image_scheduler.queue_depth()
+                    or self.image_scheduler.in_flight()
+                )
+            )
+            or ("viewer" in sys.modules and _viewer().running_loaders)
+        )
+
+    @Slot()
+    def prefetch_images(self):
+        """Prefetches the full images most likely to be opened next: the hovered result,
+        the results following the one opened last, then the visible results from the top.
+        The result opened last stays wanted, so its prefetch counts as a hit once viewed."""
+        rows = []
+        if self.results_view.hovered_row >= 0:
+            rows.append(self.results_view.hovered_row)
+        if self.opened_row is not None:
+            first = self.opened_row
+            rows.extend(range(first, first + 1 + config.PREFETCH_AHEAD_ROWS))
+        visible = self.results_view.visible_row_range()
+        if visible is not None:
+            rows.extend(range(visible[0], visible[1] + 1))
+        urls = []
+        for row in dict.fromkeys(rows):
+            index = self.results_proxy.index(row, 0)
+            if not index.isValid():
+                continue
+            url = renditions.full_image_url(index.data(ResultDataRole))
+            if url and url not in urls:
+                urls.append(url)
+            if len(urls) == config.PREFETCH_MAX_IMAGES:
+                break
+        self.prefetcher.set_images(urls)
+
+    @Slot()
+    def load_more_if_needed(self):
+        """Fetches the next page when the list is scrolled near its end."""
+        if self.fetch_threads or not self.has_more_pages():
+            return
+        visible = self.results_view.visible_row_range()
+        rows = self.results_proxy.rowCount()
+        if visible is None or visible[1] >= rows - config.LOAD_MORE_THRESHOLD_ROWS:
+            self.load_next_page()
+
     def terminate_threads(self):
-        """Terminates all fetch and image download threads."""
-        for thread in self.fetch_threads + self.image_threads:
+        """Cancels all fetch threads and pending image downloads without waiting for them.
+        Cancelled threads are kept referenced until they finish."""
+        for thread in self.fetch_threads:
             thread.stop()
-            thread.quit()
-            thread.wait()
+            self.stopped_threads.add(thread)
         self.fetch_threads.clear()
-        self.image_threads.clear()
-
-    @Slot(list)
-    def add_results(self, results):
-        """Add a new frame for each search result."""
-        self.results = results
-        self.sort_results()
+        self.cancel_image_downloads()
+
+    def cancel_image_downloads(self):
+        """Cancels thumbnail downloads for result rows that are being discarded."""
+        if self.image_scheduler is not None:
+            self.image_scheduler.cancel_all()
+        self.image_requests.clear()
+        self.requested_urls.clear()
+
+    @Slot(int, list)
+    def add_results(self, generation, results):
+        """Show a new row for each search result of the current search."""
+        if generation == self.search_generation:
+            self.results_model.append_results(results)
+        self.no_results_label.hide()
 
+    @Slot()
     def sort_results(self):
-        """Sort search results by work end date then filter results if user requires an image."""
-        if hasattr(self, "results"):
-            sorted_results = sorted(
-                self.results,
-                key=lambda x: x.get("objectEndDate", 0),
-                reverse=self.order.currentText() == config.ORDER_DESCENDING,
-            )
-            utils.clear_layout(self.results_layout)
-            filtered_results = []
-
-            # Display entries which contain an image if "Has Images" is checked.
-            # Otherwise, display all results.
-            for data in sorted_results:
-                has_primary_image_sm = bool(data.get("primaryImageSmall"))
-
-                if self.has_images.isChecked() and has_primary_image_sm:
-                    filtered_results.append(data)
-                elif not self.has_images.isChecked():
-                    filtered_results.append(data)
-            if not filtered_results:
-                self.show_no_results()
-            else:
-                for data in filtered_results:
-                    self.add_result(data)
+        """Reorder the existing rows by the chosen field and order.
+        Already downloaded thumbnails are kept by the model, so re-sorting downloads nothing."""
+        self.results_proxy.set_sort(
+            config.SORT_OPTIONS[self.sort_field.currentText()],
+            Qt.DescendingOrder
+            if self.order.currentText() == config.ORDER_DESCENDING
+            else Qt.AscendingOrder,
+        )
 
     @Slot()
-    def show_no_results(self):
-        """Display a message if no results found."""
+    def filter_results(self):
+        """Display entries which contain an image if "Has Images" is checked.
+        Otherwise, display all results."""
+        self.results_proxy.set_require_image(self.has_images.isChecked())
+        if self.results_proxy.rowCount() == 0 and self.results_model.rowCount():
+            self.show_no_results()
+        else:
+            self.no_results_label.hide()
+        self.load_more_if_needed()
+
+    @Slot(int)
+    def show_no_results(self, generation=None):
+        """Display a message if no results found, unless a newer search has started."""
+        if generation is not None and generation != self.search_generation:
+            return
         self.loading_label.hide()
-        no_results_label = QLabel("No results found.")
-        no_results_label.setAlignment(Qt.AlignCenter)
-        self.results_layout.addWidget(no_results_label)
-
-    def add_result(self, data):
-        """Add a frame for every result entry."""
-        frame = utils.create_result_frame(data, self)
-        self.results_layout.addWidget(frame)
-        self.add_context_menu(frame, data)
+        self.no_results_label.show()
 
     def download_large_image(self, image_url):
-        """Fetch image for local download."""
-        response = requests.get(image_url)
-        if response.status_code == 200:
-            image = QImage()
-            image.loadFromData(response.content)
-            pixmap = QPixmap(image)
-            utils.download_image_to_local(pixmap, image_url)
-
-    def add_context_menu(self, frame, data):
-        """Create a right click menu to search results."""
-        menu = QMenu()
-
-        # Learn More option to launch MET information link on work
-        learn_more_action = QAction("Learn More", self)
-        learn_more_action.triggered.connect(
-            lambda: utils.open_object_url(data.get("objectURL"))
+        """Saves the original image to a chosen file in the background."""
+        _saver().save_image(image_url, self.show_download_status, self)
+
+    def download_all_results(self):
+        """Saves the image and metadata of every result shown to a chosen directory.
+        A download already running is stopped; completed files are skipped, so
+        choosing the same directory again resumes it."""
+        directory = QFileDialog.getExistingDirectory(
+            self,
+            "Download All Results",
+            os.path.join(os.path.expanduser("~"), "Downloads"),
         )
-        menu.addAction(learn_more_action)
-
-        # Download Image option
-        if "primaryImage" in data and data["primaryImage"]:
-            download_image_action = QAction("Download Image", self)
-            download_image_action.triggered.connect(
-                lambda: self.download_large_image(data["primaryImage"])
+        if not directory:
+            return
+        if self.bulk_download is not None:
+            self.bulk_download.stop()
+        results = [
+            self.results_proxy.index(row, 0).data(ResultDataRole)
+            for row in range(self.results_proxy.rowCount())
+        ]
+        self.bulk_download = _saver().BulkDownloadThread(results, directory)
+        self.bulk_download.progress.connect(self.show_bulk_download_progress)
+        self.bulk_download.completed.connect(
+            lambda saved, failed: self.show_download_status(
+                f"Downloaded {saved} results to {directory}"
+                + (f" ({failed} failed)" if failed else "")
             )
-            menu.addAction(download_image_action)
-
-        frame.setContextMenuPolicy(Qt.CustomContextMenu)
-        frame.customContextMenuRequested.connect(
-            lambda pos: menu.exec_(frame.mapToGlobal(pos))
         )
-
-    def download_image(
-        self, url, layout, loading_label, full_image_url, object_url=None
-    ):
-        """Starts an image download thread for every result entry."""
-        image_thread = ImageDownloaderThread(url, layout, loading_label)
-        image_thread.image_ready.connect(
-            lambda pixmap, l=layout: self.add_image(
-                pixmap, l, loading_label, full_image_url, object_url
+        self.show_download_status(f"Downloading {len(results)} results...")
+        _saver().start(self.bulk_download)
+
+    @Slot(int, int, int)
+    def show_bulk_download_progress(self, done, total, byte_count):
+        """Reports how many results have been saved so far."""
+        if self.sender() is self.bulk_download:
+            self.show_download_status(
+                f"Downloading results: {done}/{total} ({byte_count / 1024 / 1024:.1f} MB)"
             )
+
+    def show_download_status(self, text):
+        """Shows the status of image saves below the results."""
+        self.download_label.setText(text)
+        self.download_label.show()
+
+    def queue_depths(self):
+        """Returns the depth of each work queue, for the performance overlay."""
+        thumbnails = (
+            self.image_scheduler.stats()
+            if self.image_scheduler is not None
+            else {"queued": 0, "in_flight": 0}
         )
-        image_thread.error_occurred.connect(
-            lambda l=layout: self.show_error(l, loading_label)
+        prefetched = self.prefetcher.stats()
+        limiter = rate_limit.get_limiter().stats()
+        pack = (
+            _thumbnail_pack().get_pack() if "thumbnail_pack" in sys.modules else None
         )
-        self.image_threads.append(image_thread)
-        image_thread.start()
-
-    @Slot(QPixmap, QHBoxLayout)
-    def add_image(self, pixmap, layout, loading_label, full_image_url, object_url=None):
-        """Add image to search results layout."""
-        layout.removeWidget(loading_label)
-        loading_label.deleteLater()
-        label = QLabel()
-        label.setPixmap(pixmap)
-        label.setAlignment(Qt.AlignRight | Qt.AlignVCenter)
-        label.mousePressEvent = (
-            lambda event, url=full_image_url, obj_url=object_url: self.show_full_image(
-                url, obj_url
-            )
+        return {
+            "fetch threads": len(self.fetch_threads),
+            "thumbnails queued": thumbnails["queued"],
+            "thumbnails downloading": thumbnails["in_flight"],
+            "decodes pending": (
+                _decode_pool().get_pool().stats()["pending"]
+                if "decode_pool" in sys.modules
+                else 0
+            ),
+            "prefetch images queued": prefetched["images"]["queued"],
+            "prefetch objects queued": prefetched["objects"]["queued"],
+            "shared requests in flight": sum(
+                group["in_flight"] for group in singleflight.stats().values()
+            ),
+            "requests in flight": limiter["in_flight"],
+            "request concurrency limit": limiter["concurrency"],
+            "request rate limit (/s)": limiter["rate"],
+            "pixmap cache (MB)": round(
+                pixmap_cache.get_cache().stats()["bytes"] / 1024 / 1024, 1
+            ),
+            "wasted fetch ratio": round(fetch_planner.stats()["wasted_ratio"], 2),
+            "query cache hit ratio": round(
+                query_cache.get_cache().stats()["hit_ratio"], 2
+            ),
+            "thumbnail pack hit ratio": (
+                round(pack.stats()["hit_ratio"], 2) if pack is not None else 0.0
+            ),
+        }
+
+    def context_result(self):
+        """Returns the result the context menu was opened on."""
+        return self.results_proxy.index(self.context_row, 0).data(ResultDataRole)
+
+    @Slot()
+    def show_context_menu(self, pos):
+        """Opens the shared right click menu for the result under pos."""
+        index = self.results_view.indexAt(pos)
+        if not index.isValid():
+            return
+        self.context_row = index.row()
+        self.download_image_action.setVisible(
+            bool(renditions.full_image_url(self.context_result()))
         )
-        layout.addWidget(label, alignment=Qt.AlignRight)
+        self.context_menu.exec_(self.results_view.viewport().mapToGlobal(pos))
 
-    @Slot(QHBoxLayout)
-    def show_error(self, layout, loading_label):
+    @Slot()
+    def request_visible_thumbnails(self):
+        """Queues thumbnail downloads for rows in view, and a margin of rows around them.
+        Visible rows go first, the rest by their distance from the visible rows."""
+        visible = self.results_view.visible_row_range()
+        if visible is None:
+            return
+        first, last = visible
+        margin = config.RESULTS_THUMBNAIL_MARGIN_ROWS
+        for row in range(
+            max(first - margin, 0),
+            min(last + margin, self.results_proxy.rowCount() - 1) + 1,
+        ):
+            index = self.results_proxy.index(row, 0)
+            if index.data(ThumbnailStateRole) != THUMBNAIL_PENDING:
+                continue
+            priority = max(first - row, row - last, 0)
+            url = index.data(ThumbnailUrlRole)
+            request_id = self.requested_urls.get(url)
+            if request_id is None:
+                request_id = self.thumbnail_scheduler().submit(url, priority)
+                self.image_requests[request_id] = url
+                self.requested_urls[url] = request_id
+            else:
+                self.image_scheduler.set_priority(request_id, priority)
+
+        # Rows scrolled far out of view wait behind everything near the view.
+        for url, request_id in self.requested_urls.items():
+            rows = [
+                self.results_proxy.mapFromSource(self.results_model.index(row)).row()
+                for row in self.results_model.rows_by_url.get(url, [])
+            ]
+            rows = [row for row in rows if row >= 0]
+            if rows and all(
+                row < first - margin or row > last + margin for row in rows
+            ):
+                self.image_scheduler.set_priority(
+                    request_id, min(abs(row - first) for row in rows)
+                )
+
+    def thumbnail_scheduler(self):
+        """Returns the thumbnail download scheduler, starting it on first use."""
+        if self.image_scheduler is None:
+            self.image_scheduler = _downloader().ImageDownloadScheduler(parent=self)
+            self.image_scheduler.image_ready.connect(self.add_image)
+            self.image_scheduler.error_occurred.connect(self.show_error)
+        return self.image_scheduler
+
+    @Slot(int, QImage)
+    def add_image(self, request_id, image):
+        """Add a downloaded thumbnail to the results."""
+        url = self.image_requests.pop(request_id, None)
+        if url is None:
+            return
+        self.requested_urls.pop(url, None)
+        self.results_model.set_thumbnail(url, QPixmap.fromImage(image))
+
+    @Slot(int)
+    def show_error(self, request_id):
         """Display error if image fails to load."""
-        layout.removeWidget(loading_label)
-        loading_label.deleteLater()
-        error_label = QLabel("Image failed to load")
-        error_label.setAlignment(Qt.AlignCenter)
-        error_label.setFixedSize(
-            config.THUMBNAIL_MAX_WIDTH, config.THUMBNAIL_MAX_HEIGHT
-        )
-        layout.addWidget(error_label, alignment=Qt.AlignRight)
+        url = self.image_requests.pop(request_id, None)
+        if url is None:
+            return
+        self.requested_urls.pop(url, None)
+        self.results_model.set_thumbnail_error(url)
+
+    @Slot()
+    def show_result_image(self, index):
+        """Opens the full image of a result whose thumbnail was clicked."""
+        data = index.data(ResultDataRole)
+        image_url = renditions.full_image_url(data)
+        self.opened_row = index.row()
+        self.prefetch_images()
+        if image_url:
+            self.show_full_image(
+                image_url, data.get("objectURL"), renditions.thumbnail_url(data)
+            )
 
     def closeEvent(self, event):
         """Close application and terminate all threads."""
         self.terminate_threads()
+        for thread in list(self.stopped_threads):
+            thread.wait()
+        if self.image_scheduler is not None:
+            self.image_scheduler.shutdown()
+        self.prefetcher.shutdown()
+        if "decode_pool" in sys.modules:
+            _decode_pool().shutdown()
+        if "saver" in sys.modules:
+            _saver().stop_all()
+        if config.RESTORE_SESSION:
+            self.save_session()
+        if config.INSTRUMENTATION_TRACE_PATH:
+            try:
+                instrumentation.export_chrome_trace(config.INSTRUMENTATION_TRACE_PATH)
+            except OSError as e:
+                print(f"Error exporting trace: {e}")
         super().closeEvent(event)
 
-    def show_full_image(self, image_url, object_url=None):
-        """Opens a new window to display the full sized image."""
+    def save_session(self):
+        """Saves the current search, its first results in search order and their
+        thumbnails, to be shown on the next start, see restore_session()."""
+        if self.search_params is None:
+            return
+        results = self.results_model.results[: config.SESSION_MAX_RESULTS]
+        next_offset = self.next_offset
+        if len(results) < self.results_model.rowCount() and self.object_ids:
+            # Continue after the last result kept
+            try:
+                next_offset = self.object_ids.index(results[-1]["objectID"]) + 1
+            except ValueError:
+                pass
+        thumbnails = {}
+        cache = pixmap_cache.get_cache()
+        for data in results:
+            url = renditions.thumbnail_url(data)
+            key = pixmap_cache.thumbnail_key(url)
+            if url and url not in thumbnails and key in cache:
+                thumbnails[url] = cache.get(key).toImage()
+        state = {
+            "search_params": list(self.search_params),
+            "search_sort": list(self.search_sort),
+            "sort_field": self.sort_field.currentText(),
+            "order": self.order.currentText(),
+            "next_offset": next_offset,
+            "results": results,
+        }
+        session.save(state, self.object_ids, thumbnails)
+
+    def restore_session(self):
+        """Shows the search saved on the last exit with its results and thumbnails,
+        without any request.  Further pages are fetched as usual when scrolled to."""
+        snapshot = session.load()
+        if snapshot is None:
+            return
+        state, object_ids, pack = snapshot
+        try:
+            query, has_images, classification = state["search_params"]
+            field, descending = state["search_sort"]
+            results = state["results"]
+            next_offset = state["next_offset"]
+            self.sort_field.setCurrentText(state["sort_field"])
+            self.order.setCurrentText(state["order"])
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"Error restoring session: {e}")
+            return
+        self.query.setText(query)
+        self.has_images.setChecked(has_images)
+        self.classification.setCurrentText(classification)
+        self.search_params = (query, has_images, classification)
+        self.search_sort = (field, descending)
+        self.object_ids = object_ids or None
+        self.next_offset = next_offset
+        # Thumbnails are copied from the mapped pack as they are, without decoding
+        cache = pixmap_cache.get_cache()
+        for data in results:
+            url = renditions.thumbnail_url(data)
+            image = pack.get(url) if url else None
+            if image is not None:
+                cache.put(pixmap_cache.thumbnail_key(url), QPixmap.fromImage(image))
+        pack.close()
+        self.results_model.append_results(results)
+
+    def show_full_image(self, image_url, object_url=None, preview_url=None):
+        """Opens a new window to display the full sized image.
+        A smaller rendition at preview_url is shown while the full image downloads."""
         # Opens a new image viewer with full size image.
         if not self.full_image_viewer:
-            self.full_image_viewer = FullImageViewer(image_url, object_url)
+            self.full_image_viewer = _viewer().FullImageViewer(image_url, object_url, preview_url)
             self.full_image_viewer.closed.connect(self.full_image_viewer_closed)
             self.full_image_viewer.show()
 
         # Refresh existing image viewer with new full size image if there is one existing
         else:
             if not self.full_image_viewer.isVisible():
-                self.full_image_viewer = FullImageViewer(image_url, object_url)
+                self.full_image_viewer = _viewer().FullImageViewer(
+                    image_url, object_url, preview_url
+                )
                 self.full_image_viewer.closed.connect(self.full_image_viewer_closed)
                 self.full_image_viewer.show()
             else:
-                self.full_image_viewer.update_image(image_url, object_url)
+                self.full_image_viewer.update_image(image_url, object_url, preview_url)
 
     @Slot()
     def full_image_viewer_closed(self):
@@ -0,0 +1,277 @@
+"""Local stand-in for the MET API, serving recorded or generated fixtures.
+
+A fixtures directory holds:
+    search.json         query -> search response; the "" entry answers any other query
+    objects/<id>.json   object records, as returned by /objects/<id>
+    images/<path>       image files, by the path of their URL on images.metmuseum.org
+    aliases.json        optional image URL path -> file path under images/, letting
+                        generated fixtures share a few image files between objects
+
+Image URLs in object records are rewritten to point at the server.
+
+    python benchmarks/fake_api.py benchmarks/fixtures --port 8765 --latency 0.05
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+IMAGE_HOST = "https://images.metmuseum.org/"
+
+
+class Conditions:
+    """Network conditions imposed on every response."""
+
+    def __init__(
+        self,
+        latency=0.0,
+        bandwidth=0,
+        error_rate=0.0,
+        throttle_rate=0,
+        seed=0,
+    ):
+        """latency: seconds before each response starts.
+        bandwidth: bytes per second of each response body, 0 for unlimited.
+        error_rate: fraction of requests answered with 500.
+        throttle_rate: requests per second beyond which requests are answered with 403,
+        as the MET API does, 0 for unlimited.
+        seed: makes the choice of failed requests reproducible."""
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.random = random.Random(seed)
+
+    def to_dict(self):
+        return {
+            "latency": self.latency,
+            "bandwidth": self.bandwidth,
+            "error_rate": self.error_rate,
+            "throttle_rate": self.throttle_rate,
+        }
+
+
+class FakeApi:
+    """Serves a fixtures directory over HTTP on a background thread.
+
+        with FakeApi("benchmarks/fixtures", Conditions(latency=0.05)) as api:
+            config.API_URL = api.api_url
+    """
+
+    def __init__(self, directory, conditions=None, port=0):
+        """Listens on port, or on a free port if 0."""
+        self.directory = directory
+        self.conditions = conditions or Conditions()
+        with open(os.path.join(directory, "search.json"), encoding="utf-8") as file:
+            self.searches = json.load(file)
+        aliases_path = os.path.join(directory, "aliases.json")
+        self.aliases = {}
+        if os.path.exists(aliases_path):
+            with open(aliases_path, encoding="utf-8") as file:
+                self.aliases = json.load(file)
+        self._recent = deque()  # Times of requests in the last second, for throttling
+        self._lock = threading.Lock()
+        self.reset_counts()
+        self.server = _Server(("127.0.0.1", port), _handler(self))
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    @property
+    def api_url(self):
+        """URL to use as config.API_URL."""
+        return f"{self.base_url}/public/collection/v1"
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        """Serves requests on a background thread."""
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stops serving and closes the listening socket."""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def reset_counts(self):
+        """Zeroes the request counts, e.g. between benchmark runs."""
+        with self._lock:
+            self.counts = {
+                "requests": 0,
+                "bytes": 0,
+                "errors": 0,
+                "throttled": 0,
+                "search": 0,
+                "objects": 0,
+                "images": 0,
+            }
+
+    def count(self, **amounts):
+        """Adds to the request counts."""
+        with self._lock:
+            for name, amount in amounts.items():
+                self.counts[name] += amount
+
+    def stats(self):
+        """Returns the requests and bytes served since the last reset."""
+        with self._lock:
+            return dict(self.counts)
+
+    def fault(self):
+        """Returns the error status to answer the next request with, or None."""
+        conditions = self.conditions
+        now = time.monotonic()
+        with self._lock:
+            if conditions.throttle_rate:
+                while self._recent and now - self._recent[0] > 1:
+                    self._recent.popleft()
+                self._recent.append(now)
+                if len(self._recent) > conditions.throttle_rate:
+                    return 403
+            if conditions.error_rate:
+                if conditions.random.random() < conditions.error_rate:
+                    return 500
+        return None
+
+    def search(self, query):
+        """Returns the recorded response to a search for query."""
+        return self.searches.get(
+            query, self.searches.get("", {"total": 0, "objectIDs": None})
+        )
+
+    def object_record(self, object_id):
+        """Returns an object record with image URLs pointing at the server, or None."""
+        path = os.path.join(self.directory, "objects", f"{object_id}.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as file:
+            text = file.read()
+        return text.replace(IMAGE_HOST, f"{self.base_url}/images/")
+
+    def image_path(self, url_path):
+        """Returns the file serving an image URL path, or None."""
+        url_path = self.aliases.get(url_path, url_path)
+        path = os.path.normpath(os.path.join(self.directory, "images", url_path))
+        inside = path.startswith(os.path.normpath(self.directory))
+        if not inside or not os.path.isfile(path):
+            return None
+        return path
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        """Ignores clients hanging up, as benchmark processes do when they finish."""
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def _handler(api):
+    """Returns a request handler class serving api."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Keep connections alive, as the real API does
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            parts = url.path.strip("/").split("/")
+            if api.conditions.latency:
+                time.sleep(api.conditions.latency)
+            status = api.fault()
+            if status is not None:
+                api.count(errors=status == 500, throttled=status == 403)
+                return self.send(status, b"{}")
+
+            if parts[0] == "images":
+                path = api.image_path("/".join(parts[1:]))
+                if path is None:
+                    return self.send(404, b"")
+                with open(path, "rb") as file:
+                    body = file.read()
+                api.count(images=1)
+                return self.send(200, body, "image/jpeg")
+            if url.path.endswith("/search"):
+                query = parse_qs(url.query).get("q", [""])[0]
+                api.count(search=1)
+                return self.send(200, json.dumps(api.search(query)).encode())
+            if url.path.endswith("/objects"):
+                # Metadata changes since a date: none, fixtures do not change.
+                return self.send(200, b'{"total": 0, "objectIDs": null}')
+            if parts[-2:-1] == ["objects"] and parts[-1].isdigit():
+                record = api.object_record(int(parts[-1]))
+                if record is None:
+                    return self.send(404, b'{"message": "Not a valid object"}')
+                api.count(objects=1)
+                return self.send(200, record.encode())
+            self.send(404, b"")
+
+        def send(self, status, body, content_type="application/json"):
+            """Sends a response, paced to the bandwidth limit."""
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            bandwidth = api.conditions.bandwidth
+            chunk_size = max(1024, bandwidth // 20) if bandwidth else len(body) or 1
+            try:
+                for start in range(0, len(body), chunk_size):
+                    chunk = body[start : start + chunk_size]
+                    self.wfile.write(chunk)
+                    api.count(bytes=len(chunk))
+                    if bandwidth:
+                        time.sleep(len(chunk) / bandwidth)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # The client gave up on the response
+            api.count(requests=1)
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve MET API fixtures locally.")
+    parser.add_argument("fixtures", help="Fixtures directory")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds per response")
+    parser.add_argument(
+        "--bandwidth", type=int, default=0, help="Bytes per second per response"
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="Fraction answered with 500"
+    )
+    parser.add_argument(
+        "--throttle-rate", type=int, default=0, help="Requests per second before 403s"
+    )
+    args = parser.parse_args()
+    conditions = Conditions(
+        args.latency, args.bandwidth, args.error_rate, args.throttle_rate
+    )
+    api = FakeApi(args.fixtures, conditions, args.port)
+    print(f"Serving {args.fixtures} as {api.api_url}")
+    try:
+        api.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""Creates fixtures for the fake MET API (see fake_api.py).
+
+    python benchmarks/fixtures.py generate benchmarks/fixtures
+    python benchmarks/fixtures.py record benchmarks/recorded -q sunflowers --limit 80
+
+Generated fixtures are synthetic but deterministic, so every machine benchmarks the same
+data.  Recorded fixtures are real API responses and images, for checking that generated
+ones remain representative.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from urllib.parse import urlparse
+
+from fake_api import IMAGE_HOST
+
+# Generated objects cycle through these classifications
+CLASSIFICATIONS = ["Paintings", "Prints", "Photographs", "Ceramics", "Textiles"]
+
+
+def jpeg(width, height, seed):
+    """Returns a JPEG of smooth random colour, compressing about as well as a photograph."""
+    from PySide6.QtCore import QBuffer, QIODevice, Qt
+    from PySide6.QtGui import QImage
+
+    rng = random.Random(seed)
+    small_width, small_height = max(1, width // 8), max(1, height // 8)
+    small = QImage(
+        rng.randbytes(small_width * small_height * 4),
+        small_width,
+        small_height,
+        QImage.Format_RGB32,
+    ).copy()
+    image = small.scaled(width, height, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+    buffer = QBuffer()
+    buffer.open(QIODevice.WriteOnly)
+    image.save(buffer, "JPG", 85)
+    return bytes(buffer.data())
+
+
+def write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    mode = "wb" if isinstance(content, bytes) else "w"
+    with open(path, mode, **({} if mode == "wb" else {"encoding": "utf-8"})) as file:
+        file.write(content)
+
+
+def generate(directory, count=240, distinct_images=8, seed=0):
+    """Writes count objects matching every search.  Every tenth object has no image;
+    the others share distinct_images originals and web-large renditions, under URLs
+    of their own so that no download is served from a cache."""
+    rng = random.Random(seed)
+    aliases = {}
+    for index in range(distinct_images):
+        write(
+            os.path.join(directory, "images", "pool", "original", f"{index}.jpg"),
+            jpeg(3000, 2250, seed + index),
+        )
+        write(
+            os.path.join(directory, "images", "pool", "web-large", f"{index}.jpg"),
+            jpeg(600, 450, seed + index),
+        )
+    for object_id in range(1, count + 1):
+        data = {
+            "objectID": object_id,
+            "isPublicDomain": True,
+            "primaryImage": "",
+            "primaryImageSmall": "",
+            "additionalImages": [],
+            "title": f"Study No. {object_id}",
+            "artistDisplayName": f"Artist {rng.randrange(40)}",
+            "objectDate": str(1500 + rng.randrange(500)),
+            "objectBeginDate": 1500 + rng.randrange(500),
+            "objectEndDate": 1500 + rng.randrange(500),
+            "medium": "Oil on canvas",
+            "classification": CLASSIFICATIONS[object_id % len(CLASSIFICATIONS)],
+            "objectURL": f"https://www.metmuseum.org/art/collection/search/{object_id}",
+            "metadataDate": "2024-01-01T00:00:00.000Z",
+        }
+        if object_id % 10:
+            pool = rng.randrange(distinct_images)
+            for rendition, field in (
+                ("original", "primaryImage"),
+                ("web-large", "primaryImageSmall"),
+            ):
+                path = f"CRDImages/bench/{rendition}/{object_id}.jpg"
+                data[field] = IMAGE_HOST + path
+                aliases[path] = f"pool/{rendition}/{pool}.jpg"
+        write(
+            os.path.join(directory, "objects", f"{object_id}.json"), json.dumps(data)
+        )
+    write(os.path.join(directory, "aliases.json"), json.dumps(aliases))
+    search = {"total": count, "objectIDs": list(range(1, count + 1))}
+    write(os.path.join(directory, "search.json"), json.dumps({"": search}))
+
+
+def record(directory, query, limit, api_url, images=True):
+    """Saves the API's answer to a search, its first limit objects and their images."""
+    import requests
+
+    session = requests.Session()
+
+    def get(url, **kwargs):
+        time.sleep(1 / 40)  # Well within the API's limit of 80 requests per second
+        response = session.get(url, timeout=30, **kwargs)
+        response.raise_for_status()
+        return response
+
+    search = get(f"{api_url}/search", params={"q": query}).json()
+    object_ids = (search.get("objectIDs") or [])[:limit]
+    search = {"total": len(object_ids), "objectIDs": object_ids}
+    write(os.path.join(directory, "search.json"), json.dumps({query: search, "": search}))
+    for count, object_id in enumerate(object_ids, 1):
+        try:
+            data = get(f"{api_url}/objects/{object_id}").json()
+        except requests.RequestException as e:
+            print(f"Error recording object {object_id}: {e}")
+            continue
+        write(
+            os.path.join(directory, "objects", f"{object_id}.json"), json.dumps(data)
+        )
+        for field in ("primaryImageSmall", "primaryImage") if images else ():
+            url = data.get(field)
+            if not url or not url.startswith(IMAGE_HOST):
+                continue
+            path = os.path.join(directory, "images", urlparse(url).path.lstrip("/"))
+            if not os.path.exists(path):
+                try:
+                    write(path, get(url).content)
+                except requests.RequestException as e:
+                    print(f"Error recording image {url}: {e}")
+        print(f"Recorded {count}/{len(object_ids)} objects", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create fake MET API fixtures.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    generate_parser = commands.add_parser("generate", help="Generate synthetic fixtures")
+    generate_parser.add_argument("directory")
+    generate_parser.add_argument("--count", type=int, default=240, help="Objects")
+    record_parser = commands.add_parser("record", help="Record from the MET API")
+    record_parser.add_argument("directory")
+    record_parser.add_argument("-q", "--query", required=True, help="Search term")
+    record_parser.add_argument("--limit", type=int, default=80, help="Objects")
+    record_parser.add_argument(
+        "--no-images", action="store_true", help="Record object records only"
+    )
+    record_parser.add_argument(
+        "--api-url",
+        default="https://collectionapi.metmuseum.org/public/collection/v1",
+    )
+    args = parser.parse_args()
+    if args.command == "generate":
+        generate(args.directory, args.count)
+    else:
+        record(args.directory, args.query, args.limit, args.api_url, not args.no_images)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,435 @@
+"""Benchmarks searches against the fake MET API under reproducible network conditions.
+
+    python benchmarks/run.py                          # "search" benchmark, "typical" network
+    python benchmarks/run.py -b search -b gui -s all --repeat 3
+    python benchmarks/run.py --no-save                # measure without storing the result
+
+Each run is a fresh process with empty caches.  Results are appended to
+benchmarks/results.jsonl with the commit measured, and compared with the last result
+stored for another clean commit on the same platform, Python and Qt, so regressions
+show up as the change against it.  The results file is kept per machine, not committed.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCHMARKS_DIR)
+FIXTURES_DIR = os.path.join(BENCHMARKS_DIR, "fixtures")
+RESULTS_PATH = os.path.join(BENCHMARKS_DIR, "results.jsonl")
+
+# Network conditions of each scenario, see fake_api.Conditions
+SCENARIOS = {
+    "local": {},  # No added latency: the cost of the client itself
+    "typical": {"latency": 0.05, "bandwidth": 2 * 1024 * 1024},
+    "slow": {"latency": 0.3, "bandwidth": 256 * 1024},
+    "flaky": {"latency": 0.05, "bandwidth": 2 * 1024 * 1024, "error_rate": 0.05},
+    "throttled": {"latency": 0.02, "throttle_rate": 40},
+}
+
+# search: the search client and thumbnail downloads without Qt widgets
+# gui: the application window, offscreen
+# startup: starting the application until its window is first painted
+BENCHMARKS = ["search", "gui", "startup"]
+
+# Reported metrics, in report order, and whether lower is better
+METRICS = {
+    "time_to_first_window": True,
+    "time_to_first_result": True,
+    "time_to_all_results": True,
+    "time_to_all_thumbnails": True,
+    "results": False,
+    "thumbnails": False,
+    "requests": True,
+    "bytes": True,
+    "errors": None,
+    "throttled": None,
+    "peak_rss_mb": True,
+    "peak_threads": True,
+}
+
+# Longest a single run may take (seconds)
+RUN_TIMEOUT = 300
+
+
+class ResourceSampler:
+    """Samples the thread count of this process on a background thread.
+    Peak memory comes from the operating system's own accounting."""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak_threads = 0
+        self._is_running = True
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+
+    def _sample(self):
+        while self._is_running:
+            self.peak_threads = max(self.peak_threads, thread_count())
+            time.sleep(self.interval)
+
+    def stop(self):
+        """Stops sampling and returns peak_threads and peak_rss_mb."""
+        self._is_running = False
+        self._thread.join()
+        return {"peak_threads": self.peak_threads, "peak_rss_mb": peak_rss_mb()}
+
+
+def thread_count():
+    """Returns the number of OS threads in this process, Qt's included where possible."""
+    try:
+        with open("/proc/self/status", encoding="ascii") as file:
+            for line in file:
+                if line.startswith("Threads:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return threading.active_count()
+
+
+def peak_rss_mb():
+    """Returns the peak resident memory of this process in megabytes, or None if unknown."""
+    try:
+        import resource
+    except ImportError:
+        return None  # Windows
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_search(query):
+    """Streams a page of search results through the search client, downloading
+    each thumbnail as its record arrives, as the application does."""
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+    from contextlib import aclosing
+
+    import config
+    import downloader
+    import renditions
+    from client import SearchClient
+
+    start = time.perf_counter()
+    marks = {}
+
+    async def search():
+        thumbnails = []
+        with ThreadPoolExecutor(config.IMAGE_DOWNLOAD_WORKERS) as pool:
+            async with SearchClient() as client:
+                async with aclosing(
+                    client.search(query, has_images=True, limit=config.MAX_RESULTS)
+                ) as records:
+                    async for data in records:
+                        marks.setdefault(
+                            "time_to_first_result", time.perf_counter() - start
+                        )
+                        marks["results"] = marks.get("results", 0) + 1
+                        url = renditions.thumbnail_url(data)
+                        if url:
+                            thumbnails.append(
+                                pool.submit(downloader.download_thumbnail, url)
+                            )
+            marks["time_to_all_results"] = time.perf_counter() - start
+            marks["thumbnails"] = sum(
+                1 for future in thumbnails if future.result() is not None
+            )
+        marks["time_to_all_thumbnails"] = time.perf_counter() - start
+
+    asyncio.run(search())
+    return marks
+
+
+def run_gui(query):
+    """Searches in the application window, until the first page of results and the
+    thumbnails of the rows in view are shown."""
+    from PySide6.QtCore import QTimer
+    from PySide6.QtWidgets import QApplication
+
+    application = QApplication([])
+    from app import App
+    from results import THUMBNAIL_READY, ThumbnailStateRole
+
+    import startup
+
+    window = App()
+    window.show()
+    application.processEvents()
+    # As main.py does once the window is painted, before anyone could type a query
+    startup.warm_up().join()
+    window.query.setText(query)
+    start = time.perf_counter()
+    marks = {}
+
+    def first_rows(*args):
+        marks.setdefault("time_to_first_result", time.perf_counter() - start)
+
+    def check():
+        model = window.results_model
+        if window.fetch_threads or model.rowCount() == 0:
+            if time.perf_counter() - start > RUN_TIMEOUT:
+                application.quit()
+            return
+        marks.setdefault("time_to_all_results", time.perf_counter() - start)
+        scheduler = window.image_scheduler
+        stats = scheduler.stats() if scheduler is not None else {}
+        if window.image_requests or stats.get("queued") or stats.get("in_flight"):
+            return
+        marks["time_to_all_thumbnails"] = time.perf_counter() - start
+        marks["results"] = model.rowCount()
+        marks["thumbnails"] = sum(
+            1
+            for row in range(model.rowCount())
+            if model.index(row).data(ThumbnailStateRole) == THUMBNAIL_READY
+        )
+        application.quit()
+
+    window.results_model.rowsInserted.connect(first_rows)
+    timer = QTimer()
+    timer.timeout.connect(check)
+    timer.start(5)
+    window.search()
+    application.exec()
+    window.close()
+    return marks
+
+
+def run_startup(query):
+    """Starts the application as main.py does, until its window is first painted.
+    Timed from the import of startup.py."""
+    import startup
+    from PySide6.QtWidgets import QApplication
+
+    startup.mark("import Qt")
+    from app import App
+
+    startup.mark("import app")
+    application = QApplication([])
+    window = App()
+    window.show()
+    application.processEvents()
+    startup.mark("first paint")
+    return {"time_to_first_window": startup.elapsed()}
+
+
+def child(benchmark, api_url, query):
+    """Runs one benchmark in this process and prints its metrics as JSON."""
+    sys.path.insert(0, ROOT)
+    import config
+
+    config.API_URL = api_url
+    sampler = ResourceSampler()
+    run = {"gui": run_gui, "startup": run_startup}.get(benchmark, run_search)
+    marks = run(query)
+    marks.update(sampler.stop())
+    print(json.dumps(marks))
+    sys.stdout.flush()
+    os._exit(0)  # Skip waiting for abandoned requests and prefetches
+
+
+def run_once(api, benchmark, query):
+    """Runs a benchmark in a fresh process with empty caches.  Returns its metrics,
+    with the requests and bytes the fake API served to it."""
+    api.reset_counts()
+    with tempfile.TemporaryDirectory() as cache_dir:
+        environment = dict(
+            os.environ, METEXPLORER_CACHE_DIR=cache_dir, QT_QPA_PLATFORM="offscreen"
+        )
+        environment.pop("METEXPLORER_TRACE", None)
+        completed = subprocess.run(
+            [sys.executable, __file__, "--child", benchmark, api.api_url, query],
+            env=environment,
+            capture_output=True,
+            text=True,
+            timeout=RUN_TIMEOUT,
+        )
+    lines = completed.stdout.strip().splitlines()
+    if completed.returncode != 0 or not lines:
+        raise RuntimeError(
+            f"{benchmark} benchmark failed:\n{completed.stdout}{completed.stderr}"
+        )
+    metrics = json.loads(lines[-1])
+    served = api.stats()
+    for name in ("requests", "bytes", "errors", "throttled"):
+        metrics[name] = served[name]
+    return metrics
+
+
+def median_metrics(runs):
+    """Returns the median of each metric over several runs."""
+    metrics = {}
+    for name in METRICS:
+        values = [run[name] for run in runs if run.get(name) is not None]
+        if values:
+            metrics[name] = statistics.median(values)
+    return metrics
+
+
+def git_commit():
+    """Returns the short hash of the commit measured and whether the tree has changes."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        dirty = bool(
+            subprocess.run(
+                ["git", "status", "--porcelain", "--untracked-files=no"],
+                cwd=ROOT,
+                capture_output=True,
+                text=True,
+            ).stdout.strip()
+        )
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, False
+
+
+def load_results():
+    """Returns every stored benchmark result, oldest first."""
+    if not os.path.exists(RESULTS_PATH):
+        return []
+    with open(RESULTS_PATH, encoding="utf-8") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def baseline(results, result):
+    """Returns the last stored result of the same benchmark and scenario from another
+    commit, measured on the same platform, Python and Qt.  Results measured on a tree
+    with uncommitted changes are skipped."""
+    for previous in reversed(results):
+        if (
+            not previous.get("dirty")
+            and previous["benchmark"] == result["benchmark"]
+            and previous["scenario"] == result["scenario"]
+            and previous["query"] == result["query"]
+            and previous["commit"] != result["commit"]
+            and all(
+                previous.get(key) == result[key] for key in ("platform", "python", "qt")
+            )
+        ):
+            return previous
+    return None
+
+
+def format_value(name, value):
+    if value is None:
+        return "-"
+    if name.startswith("time_"):
+        return f"{value:.3f}s"
+    if name == "bytes":
+        return f"{value / 1024 / 1024:.1f}MB"
+    if isinstance(value, float):
+        return f"{value:.1f}"
+    return str(value)
+
+
+def report(result, previous):
+    """Prints a result, with the change from previous if there is one."""
+    title = f"{result['benchmark']} / {result['scenario']} ({result['repeat']} runs)"
+    if previous:
+        title += f", compared with {previous['commit']} of {previous['date'][:10]}"
+    print(title)
+    for name, lower_is_better in METRICS.items():
+        value = result["metrics"].get(name)
+        line = f"  {name:<24}{format_value(name, value):>12}"
+        old = previous["metrics"].get(name) if previous else None
+        if old is not None and value is not None:
+            line += f"{format_value(name, old):>12}"
+            if old:
+                change = (value - old) / old * 100
+                line += f"{change:>+9.1f}%"
+                if lower_is_better is not None and abs(change) >= 10:
+                    better = (change < 0) == lower_is_better
+                    line += "  better" if better else "  WORSE"
+        print(line)
+    print()
+
+
+def main():
+    if len(sys.argv) == 5 and sys.argv[1] == "--child":
+        child(*sys.argv[2:])
+        return
+    parser = argparse.ArgumentParser(
+        description="Benchmark searches against a local fake MET API."
+    )
+    parser.add_argument(
+        "-b",
+        "--benchmark",
+        action="append",
+        choices=BENCHMARKS,
+        help="Benchmark to run, may be repeated (default: search)",
+    )
+    parser.add_argument(
+        "-s",
+        "--scenario",
+        action="append",
+        choices=list(SCENARIOS) + ["all"],
+        help="Network conditions, may be repeated (default: typical)",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Runs to take the median of")
+    parser.add_argument("-q", "--query", default="benchmark", help="Search term")
+    parser.add_argument(
+        "--fixtures",
+        default=FIXTURES_DIR,
+        help="Fixtures directory, generated if missing (see fixtures.py)",
+    )
+    parser.add_argument(
+        "--no-save", action="store_true", help="Do not store the results"
+    )
+    args = parser.parse_args()
+    benchmarks = args.benchmark or ["search"]
+    scenarios = args.scenario or ["typical"]
+    if "all" in scenarios:
+        scenarios = list(SCENARIOS)
+
+    import PySide6
+    from fake_api import Conditions, FakeApi
+    from fixtures import generate
+
+    if not os.path.exists(os.path.join(args.fixtures, "search.json")):
+        print(f"Generating fixtures in {args.fixtures}...")
+        generate(args.fixtures)
+    commit, dirty = git_commit()
+    stored = load_results()
+    for scenario in scenarios:
+        conditions = Conditions(**SCENARIOS[scenario])
+        with FakeApi(args.fixtures, conditions) as api:
+            for benchmark in benchmarks:
+                runs = [
+                    run_once(api, benchmark, args.query) for _ in range(args.repeat)
+                ]
+                result = {
+                    "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                    "commit": commit,
+                    "dirty": dirty,
+                    "benchmark": benchmark,
+                    "scenario": scenario,
+                    "conditions": conditions.to_dict(),
+                    "query": args.query,
+                    "repeat": args.repeat,
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "qt": PySide6.__version__,
+                    "metrics": median_metrics(runs),
+                }
+                report(result, baseline(stored, result))
+                if not args.no_save:
+                    with open(RESULTS_PATH, "a", encoding="utf-8") as file:
+                        file.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import threading
+import time
+
+
+class Cancelled(Exception):
+    """Raised by CancelToken.check() once the work it guards should stop."""
+
+
+class CancelToken:
+    """Flag shared with work running on other threads, telling it to stop.
+    It is set by cancel() or by passing its deadline.  A child token is also cancelled
+    with its parent, and never outlives the parent's deadline."""
+
+    def __init__(self, timeout=None, parent=None):
+        """Cancels itself timeout seconds from now, if given."""
+        self.parent = parent
+        self.deadline = time.monotonic() + timeout if timeout is not None else None
+        if parent is not None and parent.deadline is not None:
+            self.deadline = min(self.deadline or parent.deadline, parent.deadline)
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """Tells the work to stop.  Safe to call from any thread."""
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        """Whether the work should stop."""
+        if self._cancelled.is_set():
+            return True
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return True
+        return self.parent is not None and self.parent.cancelled
+
+    def is_running(self):
+        """The opposite of cancelled, for code taking an is_running() callable."""
+        return not self.cancelled
+
+    def check(self):
+        """Raises Cancelled if the work should stop."""
+        if self.cancelled:
+            raise Cancelled()
+
+    def remaining(self):
+        """Returns the seconds left before the deadline, or None if there is none."""
+        if self.deadline is None:
+            return None
+        return max(self.deadline - time.monotonic(), 0)
+
+    def sleep(self, seconds):
+        """Sleeps up to seconds, waking early on cancel() or the deadline.
+        Returns whether the work may continue."""
+        remaining = self.remaining()
+        if remaining is not None:
+            seconds = min(seconds, remaining)
+        self._cancelled.wait(seconds)
+        return not self.cancelled
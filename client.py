@@ -0,0 +1,240 @@
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing
+
+import config
+import instrumentation
+
+
+def _met_api():
+    """Imports the request layer on first use, keeping this module cheap to import."""
+    import met_api
+
+    return met_api
+
+
+def _fetch_planner():
+    """Imports the fetch planner on first use, see _met_api()."""
+    import fetch_planner
+
+    return fetch_planner
+
+
+def _query_cache():
+    """Returns the shared query cache, or None while searches are answered by the local
+    index, which is no slower and sorts its answers.  Imported on first use, see _met_api()."""
+    import local_index
+    import query_cache
+
+    if local_index.get_index() is not None:
+        return None
+    return query_cache.get_cache()
+
+
+class SearchClient:
+    """Asyncio client for searching the MET collection, independent of Qt.
+    Object records are fetched with bounded concurrency through the shared HTTP session,
+    metadata cache and local index, and streamed in search order.
+
+        async with SearchClient() as client:
+            async for data in client.search("sunflowers", has_images=True):
+                ...
+    """
+
+    def __init__(self, concurrency=config.FETCH_WORKERS, token=None, tags=None):
+        """Fetches at most concurrency objects at once.  Once the cancellation token is
+        cancelled, requests not yet made are skipped and requests in flight abandoned.
+        tags, e.g. {"search": 3}, are added to the instrumentation spans of requests."""
+        self.concurrency = concurrency
+        self.token = token
+        self.tags = tags or {}
+        self._executor = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Abandons fetches not yet started and releases the worker threads."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _call(self, function, *args):
+        """Runs a blocking request function on the client's worker threads."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, function, *args
+        )
+
+    async def search_object_ids(
+        self, query, has_images=False, classification="", sort=None
+    ):
+        """Returns the IDs of all matching objects in relevance order, or None if the search failed."""
+        return await self._call(
+            self._search_object_ids, query, has_images, classification, sort
+        )
+
+    def cached_object_ids(self, query, has_images=False, classification=""):
+        """Returns (object IDs, fresh) of an earlier identical search, or None, see
+        query_cache.QueryCache.get()."""
+        cache = _query_cache()
+        if cache is None:
+            return None
+        return cache.get(query, has_images, classification)
+
+    async def fetch_object(self, object_id):
+        """Returns the record of one object, or None if it could not be fetched."""
+        return await self._call(self._fetch_object, object_id)
+
+    def _search_object_ids(self, query, has_images, classification, sort):
+        """Runs a search on a worker thread."""
+        with instrumentation.span("search", query=query, **self.tags):
+            object_ids = _met_api().search_object_ids(
+                query, has_images, classification, sort, self.token
+            )
+        cache = _query_cache()
+        if object_ids is not None and cache is not None:
+            cache.put(query, has_images, classification, object_ids)
+        return object_ids
+
+    def _fetch_object(self, object_id):
+        """Fetches an object on a worker thread."""
+        with instrumentation.span("fetch_object", object_id=object_id, **self.tags):
+            return _met_api().fetch_object_data(object_id, self.token)
+
+    async def fetch_batches(
+        self,
+        object_ids,
+        classification="",
+        batch_size=config.RESULT_BATCH_SIZE,
+        interval=config.RESULT_BATCH_INTERVAL,
+    ):
+        """Yields lists of object records in the order of object_ids, skipping objects that
+        failed or are not of classification.  The first batch is yielded at once, later ones
+        when they hold batch_size objects or interval seconds have passed.
+        object_ids may be a fetch_planner.FetchPlan choosing the IDs to fetch as records
+        arrive; objects known not to be of classification are skipped either way.
+        Fetches run at most twice the concurrency ahead of the first object not yet yielded."""
+        met_api = _met_api()
+        plan = object_ids
+        if not isinstance(plan, _fetch_planner().FetchPlan):
+            plan = _fetch_planner().FetchPlan(object_ids, classification)
+        tasks = deque()
+        batch = []
+        last_yield = None
+
+        def fill():
+            while len(tasks) < 2 * self.concurrency:
+                object_id = plan.next_id()
+                if object_id is None:
+                    return
+                tasks.append(asyncio.ensure_future(self.fetch_object(object_id)))
+
+        fill()
+        try:
+            while tasks:
+                if not tasks[0].done():
+                    timeout = None
+                    if batch:
+                        timeout = max(interval - (time.monotonic() - last_yield), 0)
+                    await asyncio.wait({tasks[0]}, timeout=timeout)
+                while tasks and tasks[0].done():
+                    data = tasks.popleft().result()
+                    plan.record(data)
+                    if data and met_api.matches_classification(data, classification):
+                        batch.append(data)
+                fill()
+                if batch and (
+                    len(batch) >= batch_size
+                    or not tasks
+                    or last_yield is None
+                    or time.monotonic() - last_yield >= interval
+                ):
+                    yield batch
+                    batch = []
+                    last_yield = time.monotonic()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def search(
+        self,
+        query,
+        has_images=False,
+        classification="",
+        offset=0,
+        limit=None,
+        sort=None,
+    ):
+        """Yields the records of matching objects in search order, starting at offset.
+        At most limit object IDs are fetched, fewer records if some do not match."""
+        object_ids = await self.search_object_ids(
+            query, has_images, classification, sort
+        )
+        if not object_ids:
+            return
+        end = offset + limit if limit is not None else None
+        plan = _fetch_planner().FetchPlan(
+            object_ids[offset:end], classification, has_images
+        )
+        async with aclosing(self.fetch_batches(plan, classification)) as batches:
+            async for batch in batches:
+                for data in batch:
+                    yield data
+
+
+async def write_json_lines(args, output=sys.stdout):
+    """Streams the records of a search to output as JSON Lines.  Returns the record count."""
+    count = 0
+    async with SearchClient(args.concurrency) as client:
+        async with aclosing(
+            client.search(
+                args.query, args.has_images, args.classification, args.offset, args.limit
+            )
+        ) as records:
+            async for data in records:
+                output.write(json.dumps(data, ensure_ascii=False) + "\n")
+                output.flush()
+                count += 1
+    return count
+
+
+def main():
+    """Searches the MET collection and writes matching object records as JSON Lines."""
+    parser = argparse.ArgumentParser(
+        description="Search the MET collection and write each matching object "
+        "as one line of JSON."
+    )
+    parser.add_argument("query", nargs="?", default="", help="Search term")
+    parser.add_argument("-c", "--classification", default="", help="Classification")
+    parser.add_argument(
+        "--has-images", action="store_true", help="Only objects with images"
+    )
+    parser.add_argument("--offset", type=int, default=0, help="Results to skip")
+    parser.add_argument("--limit", type=int, help="Maximum results to fetch")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=config.FETCH_WORKERS,
+        help="Objects fetched at once",
+    )
+    args = parser.parse_args()
+    if not args.query and not args.classification:
+        parser.error("give a query or a --classification")
+    try:
+        asyncio.run(write_json_lines(args))
+    except (KeyboardInterrupt, BrokenPipeError):
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,131 @@
 # Globals for the application
+import os
 
 # MET Collection API URL
 API_URL = "https://collectionapi.metmuseum.org/public/collection/v1"
 
-# Maximum number of search results to fetch
+# Number of search results fetched per page.  Further pages load as the list is scrolled.
 MAX_RESULTS = 80
 
-# Search results date ordering options
+# Results are shown in batches of this many objects, or whatever has arrived after this many seconds
+RESULT_BATCH_SIZE = 10
+RESULT_BATCH_INTERVAL = 0.25
+
+# Load the next page when the list is scrolled within this many rows of its end
+LOAD_MORE_THRESHOLD_ROWS = 10
+
+# Number of concurrent object fetches per search
+FETCH_WORKERS = 16
+
+# Classification-aware paging: most objects fetched to fill one page of a filtered search,
+# and how many object IDs ahead to look up what earlier fetches learned about them
+FETCH_PLAN_MAX_FETCHES = 4 * MAX_RESULTS
+FETCH_PLAN_LOOKAHEAD = 500
+
+# Number of concurrent thumbnail downloads
+IMAGE_DOWNLOAD_WORKERS = 6
+
+# Image decoding and scaling (decode_pool.py): decode threads, worker processes decoding
+# images of at least DECODE_PROCESS_MIN_BYTES (none on machines with few cores, where they
+# do not pay off), how many times worker processes that died are replaced before all
+# decodes move to the threads, and decoded thumbnails a download worker may leave
+# pending before it waits for them instead of downloading more
+DECODE_THREADS = os.cpu_count() or 1
+DECODE_PROCESSES = min(4, (os.cpu_count() or 1) // 2)
+DECODE_PROCESS_MIN_BYTES = 512 * 1024
+DECODE_PROCESS_MAX_RESTARTS = 3
+DECODE_MAX_PENDING = 2 * DECODE_THREADS
+
+# Shared rate limiter for all requests.  The MET API throttles clients above about
+# 80 requests per second, so the rate starts just under it.  Throttling responses cut
+# the rate and concurrency by the backoff factor, and the rate recovers to the ceiling
+# factor of where throttling began, probing one request per second higher every
+# probe interval (seconds).  Concurrency also shrinks while latency exceeds the
+# tolerance times the best latency seen.  Waiters check for cancellation every poll interval.
+RATE_LIMIT_REQUESTS_PER_SECOND = 72
+RATE_LIMIT_BURST = 10
+RATE_LIMIT_INITIAL_CONCURRENCY = 16
+RATE_LIMIT_MIN_CONCURRENCY = 2
+RATE_LIMIT_MAX_CONCURRENCY = 32
+RATE_LIMIT_BACKOFF_FACTOR = 0.5
+RATE_LIMIT_CEILING_FACTOR = 0.9
+RATE_LIMIT_PROBE_INTERVAL = 30
+RATE_LIMIT_LATENCY_TOLERANCE = 3.0
+RATE_LIMIT_POLL_INTERVAL = 0.05
+
+# Shared HTTP client: connections kept per host, hosts kept pooled, timeouts (seconds)
+# and streamed body chunk size (bytes).  The pool has room for every request the rate
+# limiter lets run at once, plus as many streamed downloads still reading their bodies
+# after giving their slot back.  A request waiting longer than HTTP_POOL_TIMEOUT for a
+# connection fails like a connection error rather than waiting forever.
+HTTP_POOL_SIZE = 2 * RATE_LIMIT_MAX_CONCURRENCY
+HTTP_POOL_HOSTS = 8
+HTTP_POOL_TIMEOUT = 10
+HTTP_CONNECT_TIMEOUT = 5
+HTTP_READ_TIMEOUT = 30
+HTTP_CHUNK_SIZE = 64 * 1024
+HTTP_USER_AGENT = "metexplorer/0.1.0"
+
+# Retries of failed requests: attempts in all, backoff delay bounds (seconds), and the
+# retry budget, which each request refills by the ratio, up to the maximum retries banked
+RETRY_MAX_ATTEMPTS = 4
+RETRY_BASE_DELAY = 0.25
+RETRY_MAX_DELAY = 8
+RETRY_BUDGET_RATIO = 0.1
+RETRY_BUDGET_MAX = 20
+
+# How often callers waiting for a request shared with others check for cancellation (seconds)
+SINGLE_FLIGHT_POLL_INTERVAL = 0.1
+
+# Overall time limits (seconds) for a search request and for fetching one object,
+# however slowly the server trickles its response
+SEARCH_DEADLINE = 30
+OBJECT_FETCH_DEADLINE = 20
+
+# Local storage for cached object data and images
+CACHE_DIR = os.environ.get(
+    "METEXPLORER_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".metexplorer")
+)
+
+# Object metadata cache location, entry lifetime (seconds) and maximum entry count
+METADATA_CACHE_PATH = os.path.join(CACHE_DIR, "metadata.sqlite3")
+METADATA_CACHE_TTL = 7 * 24 * 60 * 60
+METADATA_CACHE_MAX_ENTRIES = 20000
+
+# Search result cache location, lifetime (seconds) of a fresh entry, after which it is shown
+# while the search runs again, age (seconds) after which it is dropped, and entries kept
+QUERY_CACHE_PATH = os.path.join(CACHE_DIR, "queries.sqlite3")
+QUERY_CACHE_TTL = 10 * 60
+QUERY_CACHE_MAX_AGE = 7 * 24 * 60 * 60
+QUERY_CACHE_MAX_ENTRIES = 500
+QUERY_CACHE_MEMORY_ENTRIES = 32
+
+# Snapshot of the last search, its results and thumbnails (a thumbnail pack, see
+# thumbnail_pack.py), saved on exit and shown on the next start before any request is
+# made, and the most results it keeps
+SESSION_PATH = os.path.join(CACHE_DIR, "session.bin")
+SESSION_PACK_PATH = os.path.join(CACHE_DIR, "session.pack")
+RESTORE_SESSION = True
+SESSION_MAX_RESULTS = 4 * MAX_RESULTS
+
+# Local search index built from the MET open access CSV with `python local_index.py MetObjects.csv`.
+# Searches are answered from it when it exists.
+LOCAL_INDEX_PATH = os.path.join(CACHE_DIR, "local_index.sqlite3")
+USE_LOCAL_INDEX = True
+
+# Minimum interval (seconds) between asking the API for objects changed since the last check
+METADATA_SYNC_INTERVAL = 24 * 60 * 60
+
+# Search results sort options: label -> sort field
+SORT_OPTIONS = {
+    "End Date": "objectEndDate",
+    "Begin Date": "objectBeginDate",
+    "Title": "title",
+    "Artist": "artistDisplayName",
+    "Relevance": "relevance",
+}
+
+# Search results ordering options
 ORDER_ASCENDING = "Ascending"
 ORDER_DESCENDING = "Descending"
 
@@ -18,12 +137,80 @@ APPLICATION_DEFAULT_WIDTH = 800
 THUMBNAIL_MAX_HEIGHT = 200
 THUMBNAIL_MAX_WIDTH = THUMBNAIL_MAX_HEIGHT
 
+# Thumbnail cache location, disk and memory budgets (bytes) and JPEG quality.
+# Thumbnails shown are also held as pixmaps (PIXMAP_CACHE_MAX_BYTES), so the memory
+# tier only needs to cover thumbnails scrolled out of the pixmap cache recently.
+THUMBNAIL_CACHE_DIR = os.path.join(CACHE_DIR, "thumbnails")
+THUMBNAIL_CACHE_MAX_BYTES = 200 * 1024 * 1024
+THUMBNAIL_MEMORY_CACHE_MAX_BYTES = 16 * 1024 * 1024
+THUMBNAIL_CACHE_QUALITY = 85
+
+# Thumbnail pack location and disk budget (bytes).  Thumbnails are also kept decoded in
+# fixed-size frames of one memory-mapped file, so results shown again need no decoding.
+# Each frame takes THUMBNAIL_MAX_WIDTH x THUMBNAIL_MAX_HEIGHT x 4 bytes.
+THUMBNAIL_PACK_PATH = os.path.join(CACHE_DIR, "thumbnails.pack")
+THUMBNAIL_PACK_MAX_BYTES = 256 * 1024 * 1024
+
+# Original image cache location and disk budget (bytes).  Viewed images are kept
+# as downloaded so saving them is a file copy.
+IMAGE_CACHE_DIR = os.path.join(CACHE_DIR, "images")
+IMAGE_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+
+# "Download All Results": concurrent downloads and their combined bandwidth cap (bytes per second, 0 for unlimited)
+BULK_DOWNLOAD_WORKERS = 4
+BULK_DOWNLOAD_MAX_BYTES_PER_SECOND = 0
+
+# Objects fetched and saved at once by the headless mirror tool (mirror.py)
+MIRROR_WORKERS = 8
+
+# Prefetching of full images and the next page of results while the app is idle:
+# worker threads, budget of prefetched images not yet viewed (bytes), how often to
+# check whether foreground work has finished (seconds), full images of results
+# following the last one opened, and most full images queued at once
+PREFETCH_WORKERS = 2
+PREFETCH_MAX_BYTES = 100 * 1024 * 1024
+PREFETCH_IDLE_POLL_INTERVAL = 0.2
+PREFETCH_AHEAD_ROWS = 2
+PREFETCH_MAX_IMAGES = 6
+
+# Per-stage timing spans (instrumentation.py).  Set METEXPLORER_TRACE to a file name to
+# record from startup and write a Chrome trace there on exit; otherwise recording runs
+# while the performance overlay (F12) is shown.
+INSTRUMENTATION_TRACE_PATH = os.environ.get("METEXPLORER_TRACE", "")
+INSTRUMENTATION_ENABLED = bool(INSTRUMENTATION_TRACE_PATH)
+# Most spans kept for trace export, and recent spans per stage kept for percentiles
+TRACE_MAX_EVENTS = 200000
+INSTRUMENTATION_SAMPLES = 1000
+# Window for throughput (seconds), and how often the overlay refreshes (milliseconds)
+INSTRUMENTATION_RATE_WINDOW = 10
+INSTRUMENTATION_OVERLAY_INTERVAL = 500
+
+# Print how long each startup phase took when METEXPLORER_STARTUP_REPORT is set
+STARTUP_REPORT = bool(os.environ.get("METEXPLORER_STARTUP_REPORT"))
+
+# Results list: row margin and text width (pixels), and rows around the view whose
+# thumbnails are fetched ahead of scrolling
+RESULT_ROW_MARGIN = 6
+RESULT_TEXT_MAX_WIDTH = 800
+RESULTS_THUMBNAIL_MARGIN_ROWS = 5
+
+# Memory budget (bytes) of decoded pixmaps shown by the results list and the viewer
+PIXMAP_CACHE_MAX_BYTES = 128 * 1024 * 1024
+
 # Image Viewer UI default and minimum dimensions
 VIEWER_DEFAULT_HEIGHT = 400
 VIEWER_DEFAULT_WIDTH = 600
 VIEWER_MIN_HEIGHT = 200
 VIEWER_MIN_WIDTH = 300
 
+# Image Viewer smooth rescale delay after resizing (milliseconds) and scaled renditions kept
+VIEWER_RESIZE_SETTLE_MS = 150
+VIEWER_SCALED_CACHE_SIZE = 4
+
+# Most classification search options listed, the most common among the objects fetched
+# so far first, completed from the defaults below
+CLASSIFICATION_OPTIONS_MAX = 50
+
 # Default top 50 Classification search options
 CLASSIFICATION_OPTIONS = [
     "",
@@ -0,0 +1,260 @@
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context, shared_memory
+
+from PySide6.QtCore import Qt
+from PySide6.QtGui import QImage
+
+import config
+import instrumentation
+from decoding import decode_image
+
+# Pixel formats handed back from worker processes as decoded; others are converted first
+SHARED_FORMATS = {
+    QImage.Format_RGB32,
+    QImage.Format_ARGB32,
+    QImage.Format_ARGB32_Premultiplied,
+    QImage.Format_RGBA8888,
+}
+
+
+class _Segment(shared_memory.SharedMemory):
+    """A shared memory segment that QImages over its buffer may outlive.
+    close() then leaves the mapping to be unmapped when the last of them is freed."""
+
+    def close(self):
+        try:
+            super().close()
+        except BufferError:
+            self._mmap = None
+            if getattr(self, "_fd", -1) >= 0:
+                os.close(self._fd)
+                self._fd = -1
+
+
+def _decode_shared(content, max_width, max_height):
+    """Runs in a worker process: decodes content into a new shared memory segment.
+    Returns (segment name, width, height, bytes per line, pixel format, start, end),
+    start and end timing the decode, or None if it failed."""
+    start = time.perf_counter_ns()
+    image = decode_image(content, max_width, max_height)
+    if image is None:
+        return None
+    if image.format() not in SHARED_FORMATS:
+        image = image.convertToFormat(QImage.Format_ARGB32_Premultiplied)
+    size = image.sizeInBytes()
+    segment = shared_memory.SharedMemory(create=True, size=size)
+    segment.buf[:size] = image.constBits()
+    segment.close()
+    return (
+        segment.name,
+        image.width(),
+        image.height(),
+        image.bytesPerLine(),
+        image.format().value,
+        start,
+        time.perf_counter_ns(),
+    )
+
+
+def _attach(shared, url):
+    """Wraps the pixels a worker process decoded as a QImage, without copying them.
+    The segment is unlinked at once; its memory is freed with the last QImage over it."""
+    name, width, height, bytes_per_line, image_format, start, end = shared
+    segment = _Segment(name=name)
+    segment.unlink()
+    image = QImage(
+        segment.buf[: bytes_per_line * height],
+        width,
+        height,
+        bytes_per_line,
+        QImage.Format(image_format),
+    )
+    segment.close()
+    if instrumentation.enabled:
+        instrumentation.record(
+            "decode", start, end, {"url": url, "width": width, "height": height}
+        )
+    return image
+
+
+class DecodePool:
+    """Decodes and scales images off the GUI thread and off the threads downloading them.
+    Decodes run on a pool of threads, as Qt releases the GIL while decoding.  Images of
+    at least process_min_bytes are decoded by worker processes instead, when there are
+    any, so large decodes do not compete with the application's Python threads; their
+    pixels come back through shared memory.  Worker processes that die are replaced on
+    the next decode, until they have died max_process_restarts times, after which all
+    decodes run on the threads.
+    Every call returns a Future; callers bound how many they leave pending, see
+    downloader.ImageDownloadScheduler."""
+
+    def __init__(
+        self,
+        threads=config.DECODE_THREADS,
+        processes=config.DECODE_PROCESSES,
+        process_min_bytes=config.DECODE_PROCESS_MIN_BYTES,
+        max_process_restarts=config.DECODE_PROCESS_MAX_RESTARTS,
+    ):
+        """Starts threads decode threads.  The processes start on the first decode sent
+        to them."""
+        self.processes = processes
+        self.process_min_bytes = process_min_bytes
+        self.max_process_restarts = max_process_restarts
+        self._threads = ThreadPoolExecutor(threads, thread_name_prefix="decode")
+        self._thread_count = threads
+        self._processes = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.decoded = 0
+        self.decoded_in_processes = 0
+        self.process_restarts = 0
+        self.scaled = 0
+        self.failed = 0
+
+    def decode(self, content, max_width=None, max_height=None, url=None):
+        """Returns a Future of content decoded to fit within max_width x max_height, see
+        decoding.decode_image().  Its result is a QImage, or None if decoding failed,
+        including when the pool has been shut down."""
+        self._count(pending=1)
+        if self.processes and len(content) >= self.process_min_bytes:
+            processes = self._process_pool()
+            try:
+                shared = processes.submit(
+                    _decode_shared, content, max_width, max_height
+                )
+            except (BrokenProcessPool, OSError) as e:
+                # Decoded on a thread instead
+                self._drop_process_pool(processes, e)
+            else:
+                future = Future()
+                shared.add_done_callback(
+                    lambda done: self._attached(done, future, url, processes)
+                )
+                return future
+        try:
+            future = self._threads.submit(
+                decode_image, content, max_width, max_height, url
+            )
+        except RuntimeError as e:
+            print(f"Error decoding image: {e}")
+            future = Future()
+            future.set_result(None)
+        future.add_done_callback(lambda done: self._done(done, "decoded"))
+        return future
+
+    def scale(self, image, width, height):
+        """Returns a Future of image smoothly scaled to fit within width x height.  Its
+        result is None if the pool has been shut down."""
+        self._count(pending=1)
+        try:
+            future = self._threads.submit(self._scale, image, width, height)
+        except RuntimeError as e:
+            print(f"Error scaling image: {e}")
+            future = Future()
+            future.set_result(None)
+        future.add_done_callback(lambda done: self._done(done, "scaled"))
+        return future
+
+    def stats(self):
+        """Returns pool sizes, decodes and scales pending and completed, failures, and
+        how many times the worker processes were replaced."""
+        with self._lock:
+            return {
+                "threads": self._thread_count,
+                "processes": self.processes,
+                "pending": self.pending,
+                "decoded": self.decoded,
+                "decoded_in_processes": self.decoded_in_processes,
+                "process_restarts": self.process_restarts,
+                "scaled": self.scaled,
+                "failed": self.failed,
+            }
+
+    def shutdown(self):
+        """Drops pending work and stops the threads and processes."""
+        self._threads.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            processes, self._processes = self._processes, None
+        if processes is not None:
+            processes.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _scale(image, width, height):
+        with instrumentation.span("scale", width=width, height=height):
+            return image.scaled(
+                width, height, Qt.KeepAspectRatio, Qt.SmoothTransformation
+            )
+
+    def _process_pool(self):
+        """Returns the worker processes, starting them on first use.  They are spawned
+        rather than forked, as forking a process running Qt threads is unsafe."""
+        with self._lock:
+            if self._processes is None:
+                self._processes = ProcessPoolExecutor(
+                    self.processes, mp_context=get_context("spawn")
+                )
+            return self._processes
+
+    def _drop_process_pool(self, processes, error):
+        """Drops worker processes that died, for instance killed for lack of memory, so
+        that the next decode starts new ones, or gives up on processes after too many
+        restarts."""
+        with self._lock:
+            if self._processes is not processes:
+                return  # Already dropped
+            self._processes = None
+            self.process_restarts += 1
+            if self.process_restarts > self.max_process_restarts:
+                self.processes = 0
+        print(f"Error in decode processes: {error}")
+        processes.shutdown(wait=False, cancel_futures=True)
+
+    def _attached(self, shared, future, url, processes):
+        """Completes future with the QImage a worker process decoded."""
+        try:
+            result = shared.result()
+            image = _attach(result, url) if result is not None else None
+        except BrokenProcessPool as e:
+            self._drop_process_pool(processes, e)
+            image = None
+        except Exception as e:
+            print(f"Error decoding image: {e}")
+            image = None
+        if image is not None:
+            self._count(decoded_in_processes=1)
+        future.set_result(image)
+        self._done(future, "decoded")
+
+    def _done(self, future, kind):
+        """Counts a finished decode or scale."""
+        failed = future.cancelled() or future.exception() or future.result() is None
+        self._count(pending=-1, **{"failed" if failed else kind: 1})
+
+    def _count(self, **amounts):
+        with self._lock:
+            for name, amount in amounts.items():
+                setattr(self, name, getattr(self, name) + amount)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Returns the shared decode pool, starting it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = DecodePool()
+        return _pool
+
+
+def shutdown():
+    """Stops the shared decode pool, if it was started."""
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
@@ -0,0 +1,28 @@
+from PySide6.QtCore import QBuffer, QByteArray, QIODevice, QSize, Qt
+from PySide6.QtGui import QImageReader
+
+import instrumentation
+
+
+def decode_image(content, max_width=None, max_height=None, url=None):
+    """Decodes encoded image bytes into a QImage fitting within max_width x max_height,
+    keeping the aspect ratio.  The reader is asked for the target size directly, so
+    JPEGs are scaled during decoding and no full resolution buffer is allocated.
+    Returns None if the data cannot be decoded.  url only tags the instrumentation span."""
+    buffer = QBuffer()
+    buffer.setData(QByteArray(content))
+    buffer.open(QIODevice.ReadOnly)
+    reader = QImageReader(buffer)
+    reader.setAutoTransform(True)
+    with instrumentation.span("decode", url=url, bytes=len(content)) as span:
+        size = reader.size()
+        if max_width and max_height and size.isValid():
+            if size.width() > max_width or size.height() > max_height:
+                size = size.scaled(QSize(max_width, max_height), Qt.KeepAspectRatio)
+                reader.setScaledSize(size)
+        image = reader.read()
+        span.tag(width=image.width(), height=image.height())
+    if image.isNull():
+        print(f"Error decoding image: {reader.errorString()}")
+        return None
+    return image
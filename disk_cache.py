@@ -0,0 +1,129 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class DiskCache:
+    """Content-addressed file store with least recently used eviction against a byte budget."""
+
+    def __init__(self, directory, max_bytes):
+        """Indexes the files already present in directory."""
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # File name -> size, least recently used first
+        self._total_bytes = 0
+        os.makedirs(directory, exist_ok=True)
+        found = []
+        for entry in os.scandir(directory):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                stat = entry.stat()
+                found.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, name, size in sorted(found):
+            self._entries[name] = size
+            self._total_bytes += size
+
+    @staticmethod
+    def key_name(key):
+        """Returns the file name used to store key."""
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def __contains__(self, key):
+        """Checks for key without touching its file or refreshing its recency."""
+        name = self.key_name(key)
+        with self._lock:
+            return name in self._entries
+
+    def path(self, key):
+        """Returns the path of the cached file for key, or None if not cached."""
+        name = self.key_name(key)
+        with self._lock:
+            if name not in self._entries:
+                return None
+            self._touch(name)
+        return os.path.join(self.directory, name)
+
+    def get(self, key):
+        """Returns the cached bytes for key, or None if not cached."""
+        name = self.key_name(key)
+        with self._lock:
+            if name not in self._entries:
+                self.misses += 1
+                return None
+            self._touch(name)
+        try:
+            with open(os.path.join(self.directory, name), "rb") as file:
+                data = file.read()
+        except OSError:
+            with self._lock:
+                self._forget(name)
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key, data):
+        """Stores data for key, then evicts least recently used files over the budget."""
+        name = self.key_name(key)
+        path = os.path.join(self.directory, name)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, "wb") as file:
+                file.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Error writing cache file: {e}")
+            return
+        with self._lock:
+            self._forget(name)
+            self._entries[name] = len(data)
+            self._total_bytes += len(data)
+            evicted = self._evict()
+        # Deleted without the lock, so lookups are not held up by the disk
+        for name in evicted:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def stats(self):
+        """Returns hit/miss counters and disk usage."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+    def _touch(self, name):
+        """Marks a file as recently used.  Caller must hold the lock."""
+        self._entries.move_to_end(name)
+        now = time.time()
+        try:
+            os.utime(os.path.join(self.directory, name), (now, now))
+        except OSError:
+            pass
+
+    def _forget(self, name):
+        """Drops a file from the index.  Caller must hold the lock."""
+        size = self._entries.pop(name, None)
+        if size is not None:
+            self._total_bytes -= size
+
+    def _evict(self):
+        """Drops least recently used files from the index until under budget.
+        Returns their names, for the caller to delete.  Caller must hold the lock."""
+        evicted = []
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            name, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            evicted.append(name)
+        return evicted
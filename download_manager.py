@@ -0,0 +1,213 @@
+import json
+import os
+import shutil
+import threading
+import time
+from urllib.parse import urlparse
+
+import config
+import http_client
+import image_cache
+import renditions
+
+
+class BandwidthLimiter:
+    """Token bucket shared by concurrent downloads to cap their combined rate."""
+
+    def __init__(self, bytes_per_second):
+        """A rate of 0 or less means unlimited."""
+        self.bytes_per_second = bytes_per_second
+        self._allowance = bytes_per_second
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, byte_count):
+        """Blocks until byte_count bytes may be transferred."""
+        if self.bytes_per_second <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._allowance = min(
+                self.bytes_per_second,
+                self._allowance + (now - self._last) * self.bytes_per_second,
+            )
+            self._last = now
+            self._allowance -= byte_count
+            delay = -self._allowance / self.bytes_per_second
+        if delay > 0:
+            time.sleep(delay)
+
+
+def image_file_name(image_url):
+    """Returns the file name of an image URL, as served by the MET."""
+    return os.path.basename(urlparse(image_url).path)
+
+
+def stream_to_file(
+    image_url, path, is_running=lambda: True, progress=None, limiter=None
+):
+    """Saves the image at image_url to path without decoding or re-encoding it.
+    A copy in the local image cache is used if there is one.  Otherwise the body is
+    streamed to path + ".part", resuming a previous partial download, and renamed when complete.
+    A partial download is only resumed if the image is unchanged since it began, as told by
+    the ETag or Last-Modified validator kept next to it.
+    progress(received, total) is called as bytes arrive.  Returns True once path is complete."""
+    cached_path = image_cache.get_cache().path(image_url)
+    if cached_path:
+        shutil.copyfile(cached_path, path)
+        if progress:
+            size = os.path.getsize(path)
+            progress(size, size)
+        return True
+
+    part_path = f"{path}.part"
+    validator_path = f"{part_path}.validator"
+    if http_client.is_downloading(image_url):
+        # Share the download already running, e.g. in the viewer, rather than start another.
+        content = http_client.download(image_url, is_running, progress)
+        if content is not None:
+            with open(part_path, "wb") as file:
+                file.write(content)
+            _finish_part(part_path, path)
+            return True
+
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    validator = _read_validator(validator_path) if offset else None
+    while True:
+        headers = None
+        if offset and validator:
+            headers = {"Range": f"bytes={offset}-", "If-Range": validator}
+        else:
+            offset = 0  # Nothing to resume safely
+        response = http_client.get(image_url, stream=True, headers=headers)
+        with response:
+            content_range = _parse_content_range(response.headers.get("Content-Range"))
+            if response.status_code == 416 and headers:
+                if content_range and content_range[2] == offset:
+                    # The partial download was already complete
+                    _finish_part(part_path, path)
+                    return True
+                offset = 0  # The image is not the size it was, start over
+                continue
+            if response.status_code == 206:
+                if not content_range or content_range[0] != offset:
+                    if not headers:
+                        return False
+                    offset = 0  # Not the range asked for, start over
+                    continue
+                mode = "ab"
+                total = content_range[2] or 0
+            elif response.status_code == 200:
+                # A new download, or the image changed since the partial one began
+                mode = "wb"
+                offset = 0
+                total = int(response.headers.get("Content-Length") or 0)
+                _write_validator(validator_path, response)
+            else:
+                return False
+            received = offset
+            with open(part_path, mode) as file:
+                for chunk in response.iter_content(config.HTTP_CHUNK_SIZE):
+                    if not is_running():
+                        return False
+                    if limiter:
+                        limiter.consume(len(chunk))
+                    file.write(chunk)
+                    received += len(chunk)
+                    if progress:
+                        progress(received, total)
+        break
+    renditions.record_download(image_url, received - offset)
+    _finish_part(part_path, path)
+    return True
+
+
+def _parse_content_range(value):
+    """Returns (first byte, last byte, total size) of a Content-Range header, each None
+    if given as "*", or None if value is missing or malformed."""
+    try:
+        unit, _, rest = (value or "").partition(" ")
+        byte_range, _, total = rest.partition("/")
+        if unit != "bytes" or not total:
+            return None
+        first = last = None
+        if byte_range != "*":
+            first, last = (int(part) for part in byte_range.split("-"))
+        return first, last, None if total == "*" else int(total)
+    except ValueError:
+        return None
+
+
+def _read_validator(validator_path):
+    """Returns the validator saved for a partial download, or None."""
+    try:
+        with open(validator_path, encoding="utf-8") as file:
+            return file.read().strip() or None
+    except OSError:
+        return None
+
+
+def _write_validator(validator_path, response):
+    """Saves the strong ETag, or else the Last-Modified date, of a download starting, so
+    that it can be resumed with If-Range.  Weak ETags cannot be used for ranges."""
+    etag = response.headers.get("ETag")
+    validator = etag if etag and not etag.startswith("W/") else None
+    validator = validator or response.headers.get("Last-Modified")
+    try:
+        if validator:
+            with open(validator_path, "w", encoding="utf-8") as file:
+                file.write(validator)
+        elif os.path.exists(validator_path):
+            os.remove(validator_path)
+    except OSError as e:
+        print(f"Error saving download validator: {e}")
+
+
+def _finish_part(part_path, path):
+    """Renames a complete download into place and drops its validator."""
+    os.replace(part_path, path)
+    try:
+        os.remove(f"{part_path}.validator")
+    except FileNotFoundError:
+        pass
+
+
+def write_sidecar(data, path):
+    """Writes an object's metadata next to its image as JSON."""
+    temp_path = f"{path}.part"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump(data, file, indent=2, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+
+def save_result(
+    data,
+    directory,
+    is_running=lambda: True,
+    count_bytes=None,
+    limiter=None,
+    image=True,
+):
+    """Saves the original image of an object as {objectID}-{file name} and its metadata as
+    {objectID}.json in directory.  Files already complete are skipped and partial images resumed.
+    count_bytes(n) is called as n more image bytes arrive.  Pass image=False to save metadata only.
+    Returns whether the files are complete."""
+    object_id = data.get("objectID")
+    image_url = renditions.full_image_url(data) if image else None
+    if image_url:
+        path = os.path.join(directory, f"{object_id}-{image_file_name(image_url)}")
+        if not os.path.exists(path):
+            received_before = 0
+
+            def progress(received, total):
+                nonlocal received_before
+                if count_bytes:
+                    count_bytes(received - received_before)
+                received_before = received
+
+            if not stream_to_file(image_url, path, is_running, progress, limiter):
+                return False
+    sidecar_path = os.path.join(directory, f"{object_id}.json")
+    if not os.path.exists(sidecar_path):
+        write_sidecar(data, sidecar_path)
+    return True
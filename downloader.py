@@ -1,45 +1,225 @@
-import requests
-from PySide6.QtCore import QThread, Signal
-from PySide6.QtCore import Qt
-from PySide6.QtGui import QPixmap, QImage
+import heapq
+import itertools
+import threading
+
+from PySide6.QtCore import QObject, Signal
+from PySide6.QtGui import QImage
 
 import config
+import decode_pool
+import thumbnail_cache
+import thumbnail_pack
+
+
+def _http_client():
+    """Imports the HTTP stack on first use, so it does not delay the first window."""
+    import http_client
+
+    return http_client
+
+
+def download_thumbnail(url, is_running=lambda: True):
+    """Downloads the image at URL and decodes it at thumbnail size, unless a scaled copy is cached.
+    Returns a QImage, or None if the download failed or is_running() turned false."""
+    image = cached_thumbnail(url)
+    if image is not None:
+        return image
+    content = _http_client().download(url, is_running)
+    if content is None or not is_running():
+        return None
+    return cache_thumbnail(url, decode_thumbnail(url, content).result())
+
+
+def decode_thumbnail(url, content):
+    """Returns a Future of the thumbnail decoded from the downloaded content of url."""
+    return decode_pool.get_pool().decode(
+        content, config.THUMBNAIL_MAX_WIDTH, config.THUMBNAIL_MAX_HEIGHT, url
+    )
+
+
+def cached_thumbnail(url):
+    """Returns the thumbnail of url if cached, otherwise None.  The thumbnail pack is
+    looked up first, as its frames need no decoding; thumbnails only found encoded in
+    the thumbnail cache are decoded and added to it."""
+    pack = thumbnail_pack.get_pack()
+    image = pack.get(url) if pack is not None else None
+    if image is None:
+        image = thumbnail_cache.get_cache().get(url)
+        if image is not None and pack is not None:
+            pack.append(url, image)
+    return image
+
+
+def cache_thumbnail(url, image):
+    """Keeps a decoded thumbnail of url in the thumbnail cache and the thumbnail pack.
+    Returns image."""
+    if image is not None:
+        thumbnail_cache.get_cache().put(url, image)
+        pack = thumbnail_pack.get_pack()
+        if pack is not None:
+            pack.append(url, image)
+    return image
 
 
-class ImageDownloaderThread(QThread):
-    """Download images asynchronously."""
+class ImageDownloadScheduler(QObject):
+    """Downloads thumbnails on a fixed pool of worker threads.
+    Requests with the lowest priority value are downloaded first.
+    Downloaded thumbnails are decoded by the decode pool while the worker downloads the
+    next one.  Once decode_max_pending decodes are pending, workers wait for one to
+    finish, so downloads slow down to the pace of decoding."""
 
-    image_ready = Signal(QPixmap, object)
-    error_occurred = Signal(object)
+    image_ready = Signal(int, QImage)
+    error_occurred = Signal(int)
 
-    def __init__(self, url, layout, loading_label):
-        """Download and return images from URL."""
-        super().__init__()
-        self.url = url
-        self.layout = layout
-        self.loading_label = loading_label
+    def __init__(
+        self,
+        workers=config.IMAGE_DOWNLOAD_WORKERS,
+        decode_max_pending=config.DECODE_MAX_PENDING,
+        parent=None,
+    ):
+        """Starts the worker threads, which wait for requests."""
+        super().__init__(parent)
+        self._decode_slots = threading.Semaphore(decode_max_pending)
+        self._condition = threading.Condition()
+        self._queue = []  # Heap of (priority, sequence, request_id)
+        self._requests = {}  # Request ID -> pending or in-flight request
+        self._in_flight = 0
+        self._ids = itertools.count(1)
+        self._sequence = itertools.count()
         self._is_running = True
+        self._workers = [
+            threading.Thread(target=self._work, daemon=True) for _ in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
 
-    def run(self):
-        """Downloads the image from URL.  Emits a signal with the downloaded image or error."""
-        if self._is_running:
+    def submit(self, url, priority=0):
+        """Queues a thumbnail download and returns its request ID."""
+        request_id = next(self._ids)
+        with self._condition:
+            self._requests[request_id] = {
+                "url": url,
+                "priority": priority,
+                "cancelled": False,
+            }
+            heapq.heappush(self._queue, (priority, next(self._sequence), request_id))
+            self._condition.notify()
+        return request_id
+
+    def set_priority(self, request_id, priority):
+        """Moves a queued request ahead of or behind others.  Has no effect once started."""
+        with self._condition:
+            request = self._requests.get(request_id)
+            if request and request["priority"] != priority and "started" not in request:
+                # The old heap entry is skipped when popped, as its priority no longer matches.
+                request["priority"] = priority
+                heapq.heappush(
+                    self._queue, (priority, next(self._sequence), request_id)
+                )
+
+    def cancel(self, request_id):
+        """Drops a queued request, or aborts it if it is already downloading."""
+        with self._condition:
+            request = self._requests.pop(request_id, None)
+            if request:
+                request["cancelled"] = True
+
+    def cancel_all(self):
+        """Drops every queued and in-flight request."""
+        with self._condition:
+            for request in self._requests.values():
+                request["cancelled"] = True
+            self._requests.clear()
+            self._queue.clear()
+
+    def queue_depth(self):
+        """Returns the number of requests waiting for a worker."""
+        with self._condition:
+            return sum(
+                1 for request in self._requests.values() if "started" not in request
+            )
+
+    def in_flight(self):
+        """Returns the number of requests currently downloading or decoding."""
+        return self._in_flight
+
+    def stats(self):
+        """Returns queue depth, in-flight count and pool size."""
+        return {
+            "queued": self.queue_depth(),
+            "in_flight": self._in_flight,
+            "workers": len(self._workers),
+        }
+
+    def shutdown(self):
+        """Cancels all requests and stops the worker threads."""
+        self.cancel_all()
+        with self._condition:
+            self._is_running = False
+            self._condition.notify_all()
+
+    def _next_request(self):
+        """Blocks until a request is available and claims it.  Returns None on shutdown."""
+        with self._condition:
+            while self._is_running:
+                while self._queue:
+                    priority, _, request_id = heapq.heappop(self._queue)
+                    request = self._requests.get(request_id)
+                    if request and request["priority"] == priority and "started" not in request:
+                        request["started"] = True
+                        self._in_flight += 1
+                        return request_id, request
+                self._condition.wait()
+        return None
+
+    def _work(self):
+        """Worker thread loop downloading one thumbnail at a time."""
+        while (claimed := self._next_request()) is not None:
+            request_id, request = claimed
+            image = content = None
             try:
-                response = requests.get(self.url)
-                if response.status_code == 200 and self._is_running:
-                    image = QImage()
-                    image.loadFromData(response.content)
-                    pixmap = QPixmap(image).scaled(
-                        config.THUMBNAIL_MAX_WIDTH,
-                        config.THUMBNAIL_MAX_HEIGHT,
-                        Qt.KeepAspectRatio,
-                        Qt.SmoothTransformation,
+                image = cached_thumbnail(request["url"])
+                if image is None:
+                    content = _http_client().download(
+                        request["url"], lambda: not request["cancelled"]
                     )
-                    self.image_ready.emit(pixmap, self.layout)
-                else:
-                    self.error_occurred.emit(self.layout)
             except Exception as e:
-                self.error_occurred.emit(self.layout)
+                print(f"Error downloading image: {e}")
+            if content is None or request["cancelled"]:
+                self._finish(request_id, request, image)
+                continue
+            self._decode_slots.acquire()
+            try:
+                decoding = decode_thumbnail(request["url"], content)
+            except Exception as e:
+                print(f"Error decoding image: {e}")
+                self._decode_slots.release()
+                self._finish(request_id, request, None)
+                continue
+            decoding.add_done_callback(
+                lambda future, request_id=request_id, request=request: self._decoded(
+                    request_id, request, future
+                )
+            )
+
+    def _decoded(self, request_id, request, future):
+        """Caches and delivers a decoded thumbnail.  Called on a decode pool thread."""
+        self._decode_slots.release()
+        try:
+            image = cache_thumbnail(request["url"], future.result())
+        except Exception as e:
+            print(f"Error decoding image: {e}")
+            image = None
+        self._finish(request_id, request, image)
 
-    def stop(self):
-        """Terminates download thread."""
-        self._is_running = False
+    def _finish(self, request_id, request, image):
+        """Ends a request, delivering image unless it was cancelled."""
+        with self._condition:
+            self._in_flight -= 1
+            self._requests.pop(request_id, None)
+        if request["cancelled"]:
+            return
+        if image is not None:
+            self.image_ready.emit(request_id, image)
+        else:
+            self.error_occurred.emit(request_id)
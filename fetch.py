@@ -1,24 +1,59 @@
-import requests
+import asyncio
+from contextlib import aclosing
+
 from PySide6.QtCore import QThread, Signal
-from concurrent.futures import as_completed, ThreadPoolExecutor
 
 import config
+import instrumentation
+from cancellation import CancelToken, Cancelled
+from client import SearchClient
+from fetch_planner import FetchPlan
 
 
 class FetchDataThread(QThread):
-    """Fetching search results from MET API thread."""
+    """Fetching search results from MET API thread.
+    Results of one page are emitted in batches, in the API's relevance order.  A page is
+    filled with MAX_RESULTS matching objects, or as many as FETCH_PLAN_MAX_FETCHES fetches
+    find, see fetch_planner.FetchPlan.
+    The object IDs of a search repeated within QUERY_CACHE_TTL come from query_cache.
+    Older cached IDs are shown at once while the search runs again, after which only
+    objects it newly found are fetched, see revalidate().
+    The work is done by client.SearchClient; this thread adapts it to Qt signals."""
 
-    result_ready = Signal(list)
-    no_results = Signal()
+    # Signals carry the generation of the search they belong to
+    result_ready = Signal(int, list)
+    no_results = Signal(int)
+    ids_ready = Signal(int, list)
+    page_end = Signal(int, int)  # Offset in the object IDs where the next page starts
+    results_removed = Signal(int, list)  # IDs of shown objects no longer found
 
-    def __init__(self, query, has_images, classification):
-        """Queries the MET API for artworks based in user input."""
+    def __init__(
+        self,
+        query,
+        has_images,
+        classification,
+        object_ids=None,
+        offset=0,
+        sort=None,
+        generation=0,
+    ):
+        """Queries the MET API for artworks based in user input.
+        Pass the object_ids of an earlier search to fetch the page starting at offset.
+        sort is a (field, descending) pair applied by the local index, if there is one.
+        generation identifies the search, so results arriving after a newer search started
+        can be told apart."""
 
         super().__init__()
         self.query = query
         self.has_images = has_images
         self.classification = classification
-        self._is_running = True
+        self.object_ids = object_ids
+        self.offset = offset
+        self.sort = sort
+        self.generation = generation
+        self.token = CancelToken()
+        self._loop = None  # Event loop running fetch(), and its task, while running
+        self._task = None
 
     def run(self):
         """Query and fetch object data from MET API."""
@@ -28,67 +63,128 @@ class FetchDataThread(QThread):
         # 2) Different results given diff query order
         #       https://github.com/metmuseum/openaccess/issues/51
 
-        if self.has_images:
-            params = {
-                "hasImages": str(self.has_images).lower(),
-            }
-        else:
-            params = {}
+        try:
+            asyncio.run(self.fetch())
+        except (asyncio.CancelledError, Cancelled):
+            pass
 
-        if self.query:
-            params["q"] = self.query
-        else:
-            params["q"] = self.classification
+    async def fetch(self):
+        """Searches unless object_ids were given, then streams the page at offset as signals."""
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.current_task()
+        self.token.check()
+        with instrumentation.span(
+            "fetch_page", search=self.generation, offset=self.offset
+        ):
+            await self.fetch_page()
 
-        response = requests.get(f"{config.API_URL}/search", params=params)
-        if response.status_code == 200 and self._is_running:
-            object_ids = response.json().get("objectIDs")
-            if object_ids:
-                object_ids = object_ids[: config.MAX_RESULTS]
-                objects_data = self.fetch_objects_data(object_ids)
-                if self._is_running:
-                    # Filter results by classification if provided
-                    if self.classification:
-                        objects_data = [
-                            obj
-                            for obj in objects_data
-                            if obj.get("classification").lower()
-                            == self.classification.lower()
-                        ]
-                    if objects_data:
-                        self.result_ready.emit(objects_data)
-                    else:
-                        self.no_results.emit()
-            else:
-                self.no_results.emit()
+    async def fetch_page(self):
+        """Streams the page at offset, searching first unless object_ids were given."""
+        async with SearchClient(
+            token=self.token, tags={"search": self.generation}
+        ) as client:
+            refresh = None  # Search running again for stale cached object IDs
+            if self.object_ids is None:
+                cached = client.cached_object_ids(
+                    self.query, self.has_images, self.classification
+                )
+                if cached is not None and (cached[0] or cached[1]):
+                    self.object_ids, fresh = cached
+                    if not fresh:
+                        refresh = asyncio.ensure_future(
+                            client.search_object_ids(
+                                self.query,
+                                self.has_images,
+                                self.classification,
+                                self.sort,
+                            )
+                        )
+                else:
+                    self.object_ids = await client.search_object_ids(
+                        self.query, self.has_images, self.classification, self.sort
+                    )
+                if self.object_ids is None or self.token.cancelled:
+                    return
+                if not self.object_ids:
+                    self.no_results.emit(self.generation)
+                    return
+                self.ids_ready.emit(self.generation, self.object_ids)
 
-    def fetch_objects_data(self, object_ids):
-        """Fetch object details concurrently."""
-        with ThreadPoolExecutor() as executor:
-            futures = [
-                executor.submit(self.fetch_object_data, object_id)
-                for object_id in object_ids
-            ]
-            return [
-                result
-                for future in as_completed(futures)
-                if self._is_running and (result := future.result())
-            ]
+            plan = FetchPlan(
+                self.object_ids,
+                self.classification,
+                self.has_images,
+                config.MAX_RESULTS,
+                config.FETCH_PLAN_MAX_FETCHES,
+                self.offset,
+            )
+            try:
+                async with aclosing(
+                    client.fetch_batches(plan, self.classification)
+                ) as batches:
+                    async for objects_data in batches:
+                        if self.token.cancelled:
+                            return
+                        self.result_ready.emit(self.generation, objects_data)
+            finally:
+                self.page_end.emit(self.generation, plan.position)
+            if refresh is not None:
+                await self.revalidate(client, refresh, plan.position)
 
-    @staticmethod
-    def fetch_object_data(object_id):
-        """Fetch data for a single object."""
-        try:
-            url = f"{config.API_URL}/objects/{object_id}"
-            response = requests.get(url)
-            if response.status_code == 200:
-                data = response.json()
-                data["url"] = url
-                return data
-        except Exception as e:
-            print(f"Error fetching object data: {e}")
-        return None
+    async def revalidate(self, client, refresh, position):
+        """Brings the page shown from stale cached object IDs, up to position, in line
+        with the search run again.  Objects it newly found among those shown are fetched
+        and added, shown objects it no longer found removed, and the page and later
+        pages follow its order, see ResultsModel.set_order()."""
+        object_ids = await refresh
+        if object_ids is None or self.token.cancelled:
+            return
+        shown = self.object_ids[:position]
+        shown_set = set(shown)
+        cached = set(self.object_ids)
+        found = set(object_ids)
+        removed = [object_id for object_id in shown if object_id not in found]
+        # Objects found for the first time, ranked among those shown
+        last = max(
+            (
+                rank
+                for rank, object_id in enumerate(object_ids)
+                if object_id in shown_set
+            ),
+            default=-1,
+        )
+        added = [
+            object_id for object_id in object_ids[: last + 1] if object_id not in cached
+        ]
+        if added:
+            async with aclosing(
+                client.fetch_batches(
+                    FetchPlan(added, self.classification, self.has_images),
+                    self.classification,
+                )
+            ) as batches:
+                async for objects_data in batches:
+                    if self.token.cancelled:
+                        return
+                    self.result_ready.emit(self.generation, objects_data)
+        if removed:
+            self.results_removed.emit(self.generation, removed)
+        # The page in the order of the search run again, then the objects after it
+        page_set = shown_set.union(added)
+        page = [object_id for object_id in object_ids if object_id in page_set]
+        rest = [object_id for object_id in object_ids if object_id not in page_set]
+        if page + rest != self.object_ids:
+            self.object_ids = page + rest
+            self.ids_ready.emit(self.generation, self.object_ids)
+            self.page_end.emit(self.generation, len(page))
 
     def stop(self):
-        """Terminate a thread."""
-        self._is_running = False
+        """Cancels the fetch without waiting for it.  Requests not yet made are dropped,
+        requests in flight abandoned, and the thread finishes shortly after."""
+        self.token.cancel()
+        loop, task = self._loop, self._task
+        if loop is not None and task is not None:
+            try:
+                loop.call_soon_threadsafe(task.cancel)
+            except RuntimeError:
+                pass  # The loop has already finished
@@ -0,0 +1,150 @@
+import threading
+
+import config
+import metadata_cache
+
+_totals = {"fetched": 0, "matched": 0, "failed": 0, "skipped": 0}
+_totals_lock = threading.Lock()
+
+
+class FetchPlan:
+    """Chooses which object IDs of a search to fetch, in search order, to fill a page.
+    IDs whose classification or image availability, learned from earlier fetches, rules
+    them out are skipped without a request.  Further IDs are pulled until page_size objects
+    match or max_fetches objects have been fetched; fetches are started ahead only as far
+    as the share of matching objects so far suggests is needed.
+    Object records must be passed to record() as they arrive.  Thread safe."""
+
+    def __init__(
+        self,
+        object_ids,
+        classification="",
+        has_images=False,
+        page_size=None,
+        max_fetches=None,
+        offset=0,
+    ):
+        """Plans fetches of object_ids from offset.  Without page_size every ID not
+        ruled out is fetched; without max_fetches there is no fetch budget."""
+        self.object_ids = object_ids
+        self.classification = classification.lower()
+        self.has_images = has_images
+        self.page_size = page_size
+        self.max_fetches = max_fetches
+        self.position = offset  # Index in object_ids of the next ID to consider
+        self.fetched = 0
+        self.matched = 0
+        self.failed = 0
+        self.skipped = 0  # Ruled out by what was learned, without a request
+        self.pending = 0
+        self._facts = {}
+        self._facts_end = offset  # object_ids up to here have been looked up
+        self._lock = threading.Lock()
+
+    def next_id(self):
+        """Returns the next object ID worth fetching now, or None if the page is expected
+        to be filled by the fetches in progress, the budget is spent or no IDs are left.
+        After None, it may be called again once more records have arrived."""
+        with self._lock:
+            if self.is_full() or self._budget_spent():
+                return None
+            # Matching share so far, counting an unknown first object as matching
+            expected = (self.matched + 1) / (self.fetched + 1)
+            if self.page_size and self.matched + self.pending * expected >= self.page_size:
+                return None
+            while self.position < len(self.object_ids):
+                object_id = self.object_ids[self.position]
+                self.position += 1
+                if self._ruled_out(object_id):
+                    self.skipped += 1
+                    _count(skipped=1)
+                    continue
+                self.pending += 1
+                return object_id
+            return None
+
+    def record(self, data):
+        """Accounts for the record of an object returned by next_id(), None if it failed.
+        Returns whether it matches the search."""
+        matched = data is not None and self.matches(data)
+        with self._lock:
+            self.pending -= 1
+            if data is None:
+                self.failed += 1
+            else:
+                self.fetched += 1
+                self.matched += matched
+        _count(fetched=data is not None, matched=matched, failed=data is None)
+        return matched
+
+    def matches(self, data):
+        """Returns whether an object record fills a place on the page."""
+        return (
+            not self.classification
+            or (data.get("classification") or "").lower() == self.classification
+        ) and (not self.has_images or bool(data.get("primaryImageSmall")))
+
+    def is_full(self):
+        """Returns whether page_size objects have matched."""
+        return bool(self.page_size) and self.matched >= self.page_size
+
+    def is_exhausted(self):
+        """Returns whether every ID has been considered."""
+        return self.position >= len(self.object_ids)
+
+    def stats(self):
+        """Returns fetch counts and the share of fetched objects that did not match."""
+        with self._lock:
+            return _stats(self.fetched, self.matched, self.failed, self.skipped)
+
+    def _budget_spent(self):
+        """Called with the lock held."""
+        return (
+            self.max_fetches is not None
+            and self.fetched + self.failed + self.pending >= self.max_fetches
+        )
+
+    def _ruled_out(self, object_id):
+        """Returns whether what was learned about an object rules it out.
+        Facts are looked up for config.FETCH_PLAN_LOOKAHEAD IDs at a time.
+        Called with the lock held."""
+        if not self.classification and not self.has_images:
+            return False
+        if self.position > self._facts_end:
+            end = self.position - 1 + config.FETCH_PLAN_LOOKAHEAD
+            self._facts = metadata_cache.get_cache().facts(
+                self.object_ids[self.position - 1 : end]
+            )
+            self._facts_end = end
+        facts = self._facts.get(object_id)
+        if facts is None:
+            return False
+        classification, has_image = facts
+        if self.classification and classification.lower() != self.classification:
+            return True
+        return self.has_images and not has_image
+
+
+def _count(**amounts):
+    """Adds to the totals of every plan."""
+    with _totals_lock:
+        for name, amount in amounts.items():
+            _totals[name] += amount
+
+
+def _stats(fetched, matched, failed, skipped):
+    return {
+        "fetched": fetched,
+        "matched": matched,
+        "wasted": fetched - matched,
+        "failed": failed,
+        "skipped": skipped,
+        "wasted_ratio": (fetched - matched) / fetched if fetched else 0.0,
+    }
+
+
+def stats():
+    """Returns the fetch counts of every plan so far.  wasted_ratio is the share of
+    fetched objects that did not match the search they were fetched for."""
+    with _totals_lock:
+        return _stats(**_totals)
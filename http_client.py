@@ -0,0 +1,201 @@
+import itertools
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import EmptyPoolError
+
+import config
+import instrumentation
+import rate_limit
+import renditions
+from cancellation import Cancelled
+from singleflight import SingleFlight
+
+_session = None
+_adapter = None
+_session_lock = threading.Lock()
+_downloads = SingleFlight("downloads")
+
+
+class _PoolTimeout:
+    """Makes requests wait at most HTTP_POOL_TIMEOUT seconds for a pooled connection,
+    then raise EmptyPoolError.  requests itself would wait forever."""
+
+    def urlopen(self, *args, **kwargs):
+        kwargs.setdefault("pool_timeout", config.HTTP_POOL_TIMEOUT)
+        return super().urlopen(*args, **kwargs)
+
+
+class _HTTPConnectionPool(_PoolTimeout, HTTPConnectionPool):
+    pass
+
+
+class _HTTPSConnectionPool(_PoolTimeout, HTTPSConnectionPool):
+    pass
+
+
+class _PoolAdapter(HTTPAdapter):
+    """HTTPAdapter whose connection pools wait a bounded time for a connection."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _HTTPConnectionPool,
+            "https": _HTTPSConnectionPool,
+        }
+
+
+def get_session():
+    """Returns the shared HTTP session, creating it on first use.
+    Connections are pooled per host and kept alive between requests."""
+    global _session, _adapter
+    with _session_lock:
+        if _session is None:
+            _adapter = _PoolAdapter(
+                pool_connections=config.HTTP_POOL_HOSTS,
+                pool_maxsize=config.HTTP_POOL_SIZE,
+                pool_block=True,  # Never exceed HTTP_POOL_SIZE connections to one host
+            )
+            _session = requests.Session()
+            _session.headers["User-Agent"] = config.HTTP_USER_AGENT
+            _session.mount("https://", _adapter)
+            _session.mount("http://", _adapter)
+        return _session
+
+
+def get(url, params=None, stream=False, timeout=None, headers=None, token=None):
+    """Issues a GET request over the shared session with connect/read timeouts.
+    Pass stream=True to read large bodies incrementally.
+    Requests are paced by the shared rate limiter.  Connection errors, timeouts, waits
+    for a pooled connection exceeding HTTP_POOL_TIMEOUT and throttling or server error
+    responses are retried with jittered exponential backoff while the retry budget
+    allows; the last response is returned if retries run out.
+    If a cancellation token is given, its deadline caps the timeouts and Cancelled is
+    raised if it is cancelled before or while the request is made."""
+    timeout = timeout or (config.HTTP_CONNECT_TIMEOUT, config.HTTP_READ_TIMEOUT)
+    if token is not None:
+        token.check()
+        remaining = token.remaining()
+        if remaining is not None:
+            # A zero timeout means non-blocking to requests, so keep a sliver of time.
+            remaining = max(remaining, 0.001)
+            if not isinstance(timeout, tuple):
+                timeout = (timeout, timeout)
+            timeout = tuple(min(part, remaining) for part in timeout)
+    limiter = rate_limit.get_limiter()
+    for attempt in itertools.count():
+        with instrumentation.span("rate_limit_wait"):
+            limiter.acquire(token)
+        started = time.monotonic()
+        try:
+            with instrumentation.span("http", url=url, attempt=attempt) as span:
+                response = get_session().get(
+                    url,
+                    params=params,
+                    headers=headers,
+                    stream=stream,
+                    timeout=timeout,
+                )
+                span.tag(status=response.status_code)
+        except (requests.ConnectionError, requests.Timeout, EmptyPoolError):
+            limiter.release()
+            if attempt + 1 >= config.RETRY_MAX_ATTEMPTS or not limiter.allow_retry():
+                limiter.record_failure()
+                raise
+            retry_after = None
+        except BaseException:
+            # Any other failure is not retried, but must give its slot back too
+            limiter.release()
+            limiter.record_failure()
+            raise
+        else:
+            limiter.release(response.status_code, time.monotonic() - started)
+            if response.status_code not in rate_limit.RETRY_STATUSES:
+                break
+            if attempt + 1 >= config.RETRY_MAX_ATTEMPTS or not limiter.allow_retry():
+                limiter.record_failure()
+                break
+            retry_after = response.headers.get("Retry-After")
+            response.close()
+        delay = rate_limit.backoff_delay(attempt, retry_after)
+        if token is not None:
+            if not token.sleep(delay):
+                raise Cancelled()
+        else:
+            time.sleep(delay)
+    if token is not None and token.cancelled:
+        response.close()
+        raise Cancelled()
+    return response
+
+
+def download(url, is_running=lambda: True, progress=None):
+    """Downloads the body of url in chunks, calling progress(received, total) as they arrive.
+    Returns None if the request failed or is_running() turned false.
+    Concurrent downloads of the same URL share one request."""
+    return _downloads.do(
+        url,
+        lambda shared_is_running, shared_progress: _download(
+            url, shared_is_running, shared_progress
+        ),
+        is_running,
+        progress,
+    )
+
+
+def is_downloading(url):
+    """Returns whether url is being downloaded, so that another download would be shared."""
+    return _downloads.in_flight(url)
+
+
+def _download(url, is_running, progress):
+    """Streams the body of url, releasing the connection if is_running() turns false."""
+    with instrumentation.span("download", url=url) as span:
+        response = get(url, stream=True)
+        with response:
+            if response.status_code != 200:
+                return None
+            total = int(response.headers.get("Content-Length") or 0)
+            chunks = []
+            received = 0
+            for chunk in response.iter_content(config.HTTP_CHUNK_SIZE):
+                if not is_running():
+                    return None
+                chunks.append(chunk)
+                received += len(chunk)
+                progress(received, total)
+        content = b"".join(chunks)
+        span.tag(bytes=len(content))
+    renditions.record_download(url, len(content))
+    return content
+
+
+def stats():
+    """Returns connection pool statistics for every host contacted so far."""
+    hosts = {}
+    if _adapter is not None:
+        pools = _adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            idle = sum(1 for conn in list(pool.pool.queue) if conn) if pool.pool else 0
+            in_use = pool.pool.maxsize - pool.pool.qsize() if pool.pool else 0
+            hosts[f"{key.key_scheme}://{key.key_host}:{key.key_port}"] = {
+                "requests": pool.num_requests,
+                "connections_opened": pool.num_connections,
+                "open_connections": idle + in_use,
+                "in_use": in_use,
+            }
+    requests_made = sum(host["requests"] for host in hosts.values())
+    opened = sum(host["connections_opened"] for host in hosts.values())
+    return {
+        "requests": requests_made,
+        "connections_opened": opened,
+        "open_connections": sum(host["open_connections"] for host in hosts.values()),
+        "reuse_ratio": 1 - opened / requests_made if requests_made else 0.0,
+        "hosts": hosts,
+    }
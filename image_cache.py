@@ -0,0 +1,26 @@
+import os
+import tempfile
+import threading
+
+import config
+from disk_cache import DiskCache
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Returns the shared disk cache of downloaded image renditions, keyed by URL.
+    Files hold the original bytes as served, so they can be copied out without re-encoding."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = DiskCache(config.IMAGE_CACHE_DIR, config.IMAGE_CACHE_MAX_BYTES)
+            except OSError as e:
+                print(f"Error opening image cache: {e}")
+                _cache = DiskCache(
+                    os.path.join(tempfile.gettempdir(), "metexplorer-images"),
+                    config.IMAGE_CACHE_MAX_BYTES,
+                )
+        return _cache
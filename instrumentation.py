@@ -0,0 +1,151 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import config
+
+# Whether spans are recorded.  When off, span() returns a shared no-op object.
+enabled = config.INSTRUMENTATION_ENABLED
+
+_events = deque(maxlen=config.TRACE_MAX_EVENTS)  # (name, start, end, thread ID, tags)
+_samples = {}  # Stage name -> deque of (end, duration), in nanoseconds
+_thread_names = {}  # Thread ID -> name, for the trace
+_lock = threading.Lock()
+
+
+class _Span:
+    """A timed stage, recorded when it exits."""
+
+    __slots__ = ("name", "tags", "start")
+
+    def __init__(self, name, tags):
+        self.name = name
+        self.tags = tags
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.name, self.start, time.perf_counter_ns(), self.tags)
+
+    def tag(self, **tags):
+        """Adds tags known only once the stage has run, e.g. a response status."""
+        self.tags.update(tags)
+
+
+class _NoSpan:
+    """Stands in for a span while instrumentation is disabled."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def tag(self, **tags):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name, **tags):
+    """Returns a context manager timing a stage, e.g.
+        with instrumentation.span("decode", url=url):
+    Tags such as search and object IDs are kept with the span in the trace."""
+    if not enabled:
+        return _NO_SPAN
+    return _Span(name, tags)
+
+
+def record(name, start, end, tags=None):
+    """Records a stage that ran from start to end (perf_counter_ns values)."""
+    thread = threading.current_thread()
+    with _lock:
+        _events.append((name, start, end, thread.ident, tags))
+        _thread_names[thread.ident] = thread.name
+        samples = _samples.get(name)
+        if samples is None:
+            samples = _samples[name] = deque(maxlen=config.INSTRUMENTATION_SAMPLES)
+        samples.append((end, end - start))
+
+
+def set_enabled(value):
+    """Turns recording on or off.  Recorded spans are kept."""
+    global enabled
+    enabled = value
+
+
+def clear():
+    """Forgets every recorded span."""
+    with _lock:
+        _events.clear()
+        _samples.clear()
+
+
+def percentile(sorted_values, fraction):
+    """Returns the value below which fraction of sorted_values lie."""
+    index = min(int(fraction * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def stats():
+    """Returns latency percentiles (milliseconds) of each stage's recent spans, and
+    their throughput (spans per second) over the last INSTRUMENTATION_RATE_WINDOW seconds."""
+    now = time.perf_counter_ns()
+    window = config.INSTRUMENTATION_RATE_WINDOW * 1_000_000_000
+    with _lock:
+        samples = {name: list(values) for name, values in _samples.items()}
+    result = {}
+    for name, values in sorted(samples.items()):
+        durations = sorted(duration / 1_000_000 for _, duration in values)
+        result[name] = {
+            "count": len(durations),
+            "p50": percentile(durations, 0.5),
+            "p90": percentile(durations, 0.9),
+            "p99": percentile(durations, 0.99),
+            "per_second": sum(1 for end, _ in values if now - end <= window)
+            / config.INSTRUMENTATION_RATE_WINDOW,
+        }
+    return result
+
+
+def export_chrome_trace(path):
+    """Writes recorded spans as Chrome trace event JSON, viewable in chrome://tracing
+    or Perfetto.  Returns the number of spans written."""
+    pid = os.getpid()
+    with _lock:
+        events = list(_events)
+        thread_names = dict(_thread_names)
+    trace_events = [
+        {
+            "name": "thread_name",
+            "ph": "M",
+            "pid": pid,
+            "tid": tid,
+            "args": {"name": name},
+        }
+        for tid, name in thread_names.items()
+    ]
+    for name, start, end, tid, tags in events:
+        trace_events.append(
+            {
+                "name": name,
+                "cat": name.split(".")[0],
+                "ph": "X",
+                "ts": start / 1000,
+                "dur": (end - start) / 1000,
+                "pid": pid,
+                "tid": tid,
+                "args": {key: str(value) for key, value in (tags or {}).items()},
+            }
+        )
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, file)
+    return len(events)
@@ -0,0 +1,262 @@
+import argparse
+import csv
+import os
+import sqlite3
+import threading
+
+import config
+
+# MET open access CSV column -> API object field.
+# "Primary Image" and "Primary Image Small" are not in the MET dump, but are read if a dump has them.
+CSV_FIELDS = {
+    "Object ID": "objectID",
+    "Title": "title",
+    "Artist Display Name": "artistDisplayName",
+    "Object Date": "objectDate",
+    "Object Begin Date": "objectBeginDate",
+    "Object End Date": "objectEndDate",
+    "Medium": "medium",
+    "Classification": "classification",
+    "Department": "department",
+    "Culture": "culture",
+    "Link Resource": "objectURL",
+    "Metadata Date": "metadataDate",
+    "Is Public Domain": "isPublicDomain",
+    "Tags": "tags",
+    "Primary Image": "primaryImage",
+    "Primary Image Small": "primaryImageSmall",
+}
+
+# Index column for each API object field
+COLUMNS = {
+    "objectID": "object_id",
+    "title": "title",
+    "artistDisplayName": "artist",
+    "objectDate": "object_date",
+    "objectBeginDate": "begin_date",
+    "objectEndDate": "end_date",
+    "medium": "medium",
+    "classification": "classification",
+    "department": "department",
+    "culture": "culture",
+    "objectURL": "object_url",
+    "metadataDate": "metadata_date",
+    "isPublicDomain": "is_public_domain",
+    "tags": "tags",
+    "primaryImage": "primary_image",
+    "primaryImageSmall": "primary_image_small",
+}
+
+# Sortable API fields
+SORT_COLUMNS = {
+    "objectEndDate": "objects.end_date",
+    "objectBeginDate": "objects.begin_date",
+    "title": "objects.title COLLATE NOCASE",
+    "artistDisplayName": "objects.artist COLLATE NOCASE",
+}
+
+
+class LocalIndex:
+    """Full text index of a local dump of the MET collection, answering searches without the API."""
+
+    def __init__(self, path=config.LOCAL_INDEX_PATH):
+        """Opens (or creates) the index database at path."""
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS objects ("
+            "object_id INTEGER PRIMARY KEY, title TEXT, artist TEXT, object_date TEXT, "
+            "begin_date INTEGER, end_date INTEGER, medium TEXT, classification TEXT, "
+            "department TEXT, culture TEXT, object_url TEXT, metadata_date TEXT, "
+            "is_public_domain INTEGER, tags TEXT, primary_image TEXT, "
+            "primary_image_small TEXT, "
+            "has_image INTEGER)"  # NULL when the dump has no image columns
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS objects_classification "
+            "ON objects (classification COLLATE NOCASE)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS objects_end_date ON objects (end_date)"
+        )
+        self._connection.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS objects_fts USING fts5("
+            "title, artist, medium, classification, culture, department, tags, "
+            "content='objects', content_rowid='object_id')"
+        )
+
+    def ingest_csv(self, csv_path, batch_size=5000):
+        """Loads a MET open access CSV dump into the index.  Returns the number of objects read."""
+        count = 0
+        with open(csv_path, newline="", encoding="utf-8-sig") as file:
+            reader = csv.DictReader(file)
+            has_image_columns = "Primary Image" in (reader.fieldnames or [])
+            batch = []
+            for row in reader:
+                batch.append(self._row_values(row, has_image_columns))
+                if len(batch) >= batch_size:
+                    self._insert(batch)
+                    count += len(batch)
+                    batch = []
+            self._insert(batch)
+            count += len(batch)
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO objects_fts (objects_fts) VALUES ('rebuild')"
+            )
+        return count
+
+    def search(self, query, has_images=False, classification="", sort=None):
+        """Returns the IDs of matching objects, by relevance unless sort is a
+        (field, descending) pair naming one of SORT_COLUMNS."""
+        conditions = []
+        params = []
+        expression = self.match_expression(query or "")
+        if expression:
+            source = "objects_fts JOIN objects ON objects.object_id = objects_fts.rowid"
+            conditions.append("objects_fts MATCH ?")
+            params.append(expression)
+            relevance = "objects_fts.rank"
+        else:
+            source = "objects"
+            relevance = "objects.object_id"
+        if classification:
+            conditions.append("objects.classification = ? COLLATE NOCASE")
+            params.append(classification)
+        if has_images:
+            # Objects whose image availability is unknown are kept for the API to settle.
+            conditions.append("objects.has_image IS NOT 0")
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        if sort and sort[0] in SORT_COLUMNS:
+            order = f"{SORT_COLUMNS[sort[0]]} {'DESC' if sort[1] else 'ASC'}, {relevance}"
+        else:
+            order = relevance
+        try:
+            with self._lock:
+                rows = self._connection.execute(
+                    f"SELECT objects.object_id FROM {source} {where} ORDER BY {order}",
+                    params,
+                ).fetchall()
+        except sqlite3.OperationalError as e:
+            # Text FTS5 cannot parse matches nothing
+            print(f"Error searching local index: {e}")
+            return []
+        return [row[0] for row in rows]
+
+    def get(self, object_id):
+        """Returns the indexed fields of an object in API form, or None if not indexed.
+        The "localIndexComplete" key is true if the dump had every field the app shows."""
+        with self._lock:
+            cursor = self._connection.cursor()
+            cursor.row_factory = sqlite3.Row
+            row = cursor.execute(
+                "SELECT * FROM objects WHERE object_id = ?", (object_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        data = {
+            field: row[column] for field, column in COLUMNS.items() if field != "tags"
+        }
+        data["isPublicDomain"] = bool(data["isPublicDomain"])
+        data["metadataDate"] = data["metadataDate"] or None
+        data["localIndexComplete"] = row["has_image"] is not None
+        return data
+
+    def classifications(self, limit=None):
+        """Returns classifications in the index, most common first."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT classification FROM objects WHERE classification != '' "
+                "GROUP BY classification ORDER BY COUNT(*) DESC LIMIT ?",
+                (limit or -1,),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def count(self):
+        """Returns the number of indexed objects."""
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM objects").fetchone()[0]
+
+    @staticmethod
+    def match_expression(query):
+        """Turns free text into an FTS5 expression matching every word as a prefix, so
+        that "cypress" also finds "Cypresses".  Returns "" for blank text."""
+        words = query.split()
+        return " ".join('"{}"*'.format(word.replace('"', '""')) for word in words)
+
+    @staticmethod
+    def _row_values(row, has_image_columns):
+        """Converts a CSV row into index column values."""
+        values = {}
+        for csv_column, field in CSV_FIELDS.items():
+            values[COLUMNS[field]] = (row.get(csv_column) or "").strip()
+        values["object_id"] = int(values["object_id"])
+        for column in ("begin_date", "end_date"):
+            try:
+                values[column] = int(values[column])
+            except ValueError:
+                values[column] = None
+        values["is_public_domain"] = int(values["is_public_domain"].lower() == "true")
+        values["has_image"] = (
+            int(bool(values["primary_image"] or values["primary_image_small"]))
+            if has_image_columns
+            else None
+        )
+        return values
+
+    def _insert(self, batch):
+        """Inserts or replaces a batch of rows."""
+        if not batch:
+            return
+        columns = list(batch[0])
+        with self._lock:
+            self._connection.execute("BEGIN")
+            self._connection.executemany(
+                f"INSERT OR REPLACE INTO objects ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' * len(columns))})",
+                [tuple(values[column] for column in columns) for values in batch],
+            )
+            self._connection.execute("COMMIT")
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """Returns the local index if one has been built, otherwise None."""
+    global _index
+    with _index_lock:
+        if _index is None and config.USE_LOCAL_INDEX:
+            if os.path.exists(config.LOCAL_INDEX_PATH):
+                try:
+                    _index = LocalIndex()
+                except sqlite3.Error as e:
+                    print(f"Error opening local index: {e}")
+        return _index
+
+
+def main():
+    """Builds the local index from MET open access CSV dumps."""
+    parser = argparse.ArgumentParser(
+        description="Build a local search index from the MET open access CSV "
+        "(https://github.com/metmuseum/openaccess)."
+    )
+    parser.add_argument("csv", nargs="+", help="MetObjects.csv or a dump in its schema")
+    parser.add_argument(
+        "--index", default=config.LOCAL_INDEX_PATH, help="Index database to write"
+    )
+    args = parser.parse_args()
+    index = LocalIndex(args.index)
+    for csv_path in args.csv:
+        print(f"{csv_path}: {index.ingest_csv(csv_path)} objects")
+    print(f"{args.index}: {index.count()} objects indexed")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,34 @@
+import startup  # First, so that startup phases are timed from the start
+
+import multiprocessing
 import sys
 
+from PySide6.QtCore import QTimer
 from PySide6.QtWidgets import QApplication
 
+startup.mark("import Qt")
+
 from app import App
 
+startup.mark("import app")
+
+
+def first_paint():
+    """Ends startup once the event loop has painted the window, then imports what the
+    first search needs in the background."""
+    startup.mark("first paint")
+    startup.print_report()
+    startup.warm_up()
+
+
 # Initialize the main window
 if __name__ == "__main__":
+    # Lets the decode worker processes start from a frozen application bundle
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
+    startup.mark("create application")
     main_window = App()
     main_window.show()
+    startup.mark("show window")
+    QTimer.singleShot(0, first_paint)
     sys.exit(app.exec())
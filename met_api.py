@@ -0,0 +1,119 @@
+import time
+from datetime import datetime, timezone
+
+import config
+import http_client
+import local_index
+import metadata_cache
+from cancellation import CancelToken, Cancelled
+from singleflight import SingleFlight
+
+_object_fetches = SingleFlight("objects")
+
+
+def search_object_ids(query, has_images, classification, sort=None, token=None):
+    """Returns the IDs of all objects matching a search, in relevance order.
+    Answered by the local index if one has been built.  Returns None if the search failed.
+    sort is a (field, descending) pair applied by the local index, if there is one.
+    Raises Cancelled if the cancellation token is cancelled first."""
+    index = local_index.get_index()
+    if index is not None:
+        return index.search(query, has_images, classification, sort)
+
+    if has_images:
+        params = {
+            "hasImages": str(has_images).lower(),
+        }
+    else:
+        params = {}
+
+    if query:
+        params["q"] = query
+    else:
+        params["q"] = classification
+
+    sync_metadata_cache(token)
+    response = http_client.get(
+        f"{config.API_URL}/search",
+        params=params,
+        token=CancelToken(config.SEARCH_DEADLINE, token),
+    )
+    if response.status_code != 200:
+        return None
+    return response.json().get("objectIDs") or []
+
+
+def matches_classification(data, classification):
+    """Returns whether an object has the classification, ignoring case.  An empty one matches all."""
+    return (
+        not classification
+        or (data.get("classification") or "").lower() == classification.lower()
+    )
+
+
+def fetch_object_data(object_id, token=None):
+    """Fetch data for a single object, consulting the local metadata cache first.
+    Objects fully described by the local index need no request.  If the request fails,
+    whatever the local index knows is returned.  Returns None at once if the cancellation
+    token is cancelled before the object is fetched."""
+    if token is not None and token.cancelled:
+        return None
+    cache = metadata_cache.get_cache()
+    data = cache.get(object_id)
+    if data is not None:
+        return data
+    index = local_index.get_index()
+    local_data = index.get(object_id) if index else None
+    if local_data and local_data.pop("localIndexComplete"):
+        return local_data
+    is_running = token.is_running if token is not None else lambda: True
+    data = _object_fetches.do(
+        object_id, lambda *_: _request_object_data(object_id), is_running
+    )
+    if data is None and token is not None and token.cancelled:
+        return None
+    return data or local_data
+
+
+def _request_object_data(object_id):
+    """Requests an object from the API and caches it.  Returns None on failure.
+    The request is shared by concurrent callers, so only its own deadline applies."""
+    try:
+        url = f"{config.API_URL}/objects/{object_id}"
+        response = http_client.get(url, token=CancelToken(config.OBJECT_FETCH_DEADLINE))
+        if response.status_code == 200:
+            data = response.json()
+            data["url"] = url
+            metadata_cache.get_cache().put(data)
+            return data
+    except Cancelled:
+        print(f"Error fetching object data: object {object_id} timed out")
+    except Exception as e:
+        print(f"Error fetching object data: {e}")
+    return None
+
+
+def sync_metadata_cache(token=None):
+    """Invalidate cached objects the API reports as updated since the last check."""
+    cache = metadata_cache.get_cache()
+    last_sync = float(cache.get_meta("last_sync", 0))
+    now = time.time()
+    if now - last_sync < config.METADATA_SYNC_INTERVAL:
+        return
+    if last_sync:
+        since = datetime.fromtimestamp(last_sync, timezone.utc).strftime("%Y-%m-%d")
+        try:
+            response = http_client.get(
+                f"{config.API_URL}/objects",
+                params={"metadataDate": since},
+                token=CancelToken(config.SEARCH_DEADLINE, token),
+            )
+            if response.status_code != 200:
+                return
+            cache.invalidate(response.json().get("objectIDs") or [], since)
+        except Cancelled:
+            return
+        except Exception as e:
+            print(f"Error syncing metadata cache: {e}")
+            return
+    cache.set_meta("last_sync", now)
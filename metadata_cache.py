@@ -0,0 +1,270 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import config
+
+
+class MetadataCache:
+    """Persistent store of MET object records keyed by object ID.
+    The classification and image availability of every object ever stored are also kept,
+    without expiry or eviction, so searches can skip objects known not to match."""
+
+    def __init__(
+        self,
+        path=config.METADATA_CACHE_PATH,
+        ttl=config.METADATA_CACHE_TTL,
+        max_entries=config.METADATA_CACHE_MAX_ENTRIES,
+    ):
+        """Opens (or creates) the SQLite cache database at path."""
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS objects ("
+            "object_id INTEGER PRIMARY KEY, "
+            "data TEXT NOT NULL, "
+            "metadata_date TEXT, "
+            "fetched_at REAL NOT NULL, "
+            "accessed_at REAL NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS objects_accessed_at ON objects (accessed_at)"
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)"
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS facts ("
+            "object_id INTEGER PRIMARY KEY, classification TEXT, has_image INTEGER)"
+        )
+        self._learn_cached_objects()
+        self._size = self._connection.execute(
+            "SELECT COUNT(*) FROM objects"
+        ).fetchone()[0]
+
+    def get(self, object_id):
+        """Returns the cached record for object_id, or None if missing or expired."""
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT data, fetched_at FROM objects WHERE object_id = ?",
+                (object_id,),
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._delete([object_id])
+                self.misses += 1
+                return None
+            self._connection.execute(
+                "UPDATE objects SET accessed_at = ? WHERE object_id = ?",
+                (now, object_id),
+            )
+            self.hits += 1
+        return json.loads(row[0])
+
+    def __contains__(self, object_id):
+        """Checks for an unexpired record of object_id without counting a hit or miss or
+        refreshing its recency."""
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT fetched_at FROM objects WHERE object_id = ?", (object_id,)
+            ).fetchone()
+        return row is not None and now - row[0] <= self.ttl
+
+    def put(self, data):
+        """Stores an object record, evicting the least recently used entries if full."""
+        now = time.time()
+        with self._lock:
+            exists = self._connection.execute(
+                "SELECT 1 FROM objects WHERE object_id = ?", (data["objectID"],)
+            ).fetchone()
+            self._connection.execute(
+                "INSERT OR REPLACE INTO objects "
+                "(object_id, data, metadata_date, fetched_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (
+                    data["objectID"],
+                    json.dumps(data),
+                    data.get("metadataDate"),
+                    now,
+                    now,
+                ),
+            )
+            self._connection.execute(
+                "INSERT OR REPLACE INTO facts (object_id, classification, has_image) "
+                "VALUES (?, ?, ?)",
+                (
+                    data["objectID"],
+                    data.get("classification") or "",
+                    bool(data.get("primaryImageSmall")),
+                ),
+            )
+            if not exists:
+                self._size += 1
+            if self._size > self.max_entries:
+                self._evict(self._size - self.max_entries)
+
+    def invalidate(self, object_ids, updated_since=None):
+        """Drops cached records for object_ids.
+        If updated_since is given, records whose metadataDate is already newer are kept."""
+        object_ids = list(object_ids)
+        with self._lock:
+            if updated_since is None:
+                self._delete(object_ids)
+                self._forget(object_ids)
+                return
+            for start in range(0, len(object_ids), 500):
+                chunk = object_ids[start : start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                self._connection.execute(
+                    f"DELETE FROM objects WHERE object_id IN ({placeholders}) "
+                    "AND (metadata_date IS NULL OR metadata_date < ?)",
+                    (*chunk, updated_since),
+                )
+            self._forget(object_ids)
+            self._refresh_size()
+
+    def facts(self, object_ids):
+        """Returns {object ID: (classification, has_image)} for the objects of object_ids
+        ever stored.  has_image tells whether the object has a small image rendition."""
+        object_ids = list(object_ids)
+        facts = {}
+        with self._lock:
+            for start in range(0, len(object_ids), 500):
+                chunk = object_ids[start : start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                for object_id, classification, has_image in self._connection.execute(
+                    "SELECT object_id, classification, has_image FROM facts "
+                    f"WHERE object_id IN ({placeholders})",
+                    chunk,
+                ):
+                    facts[object_id] = (classification, bool(has_image))
+        return facts
+
+    def classification_counts(self, limit=None):
+        """Returns (classification, object count) pairs of the objects ever stored,
+        most common first, at most limit of them."""
+        with self._lock:
+            return self._connection.execute(
+                "SELECT classification, COUNT(*) AS count FROM facts "
+                "WHERE classification != '' GROUP BY classification "
+                "ORDER BY count DESC, classification LIMIT ?",
+                (-1 if limit is None else limit,),
+            ).fetchall()
+
+    def get_meta(self, key, default=None):
+        """Returns a bookkeeping value stored alongside the cache."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value FROM meta WHERE key = ?", (key,)
+            ).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        """Stores a bookkeeping value alongside the cache."""
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                (key, str(value)),
+            )
+
+    def stats(self):
+        """Returns hit/miss counters and the current entry count."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+    def clear(self):
+        """Removes every cached record and everything learned from them."""
+        with self._lock:
+            self._connection.execute("DELETE FROM objects")
+            self._connection.execute("DELETE FROM facts")
+            self._size = 0
+
+    def _delete(self, object_ids):
+        """Deletes records by ID.  Caller must hold the lock."""
+        for start in range(0, len(object_ids), 500):
+            chunk = object_ids[start : start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            self._connection.execute(
+                f"DELETE FROM objects WHERE object_id IN ({placeholders})", chunk
+            )
+        self._refresh_size()
+
+    def _learn_cached_objects(self):
+        """Fills an empty facts table from the records already cached, e.g. by a version
+        of the application that did not keep facts."""
+        if self._connection.execute("SELECT 1 FROM facts LIMIT 1").fetchone():
+            return
+        try:
+            self._connection.execute(
+                "INSERT OR IGNORE INTO facts (object_id, classification, has_image) "
+                "SELECT object_id, COALESCE(json_extract(data, '$.classification'), ''), "
+                "COALESCE(json_extract(data, '$.primaryImageSmall'), '') != '' "
+                "FROM objects"
+            )
+        except sqlite3.OperationalError as e:
+            print(f"Error learning from cached objects: {e}")  # SQLite without JSON
+
+    def _forget(self, object_ids):
+        """Deletes what was learned from objects no longer cached, as their classification
+        may have changed.  It is learned again when they are refetched.
+        Caller must hold the lock."""
+        for start in range(0, len(object_ids), 500):
+            chunk = object_ids[start : start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            self._connection.execute(
+                f"DELETE FROM facts WHERE object_id IN ({placeholders}) "
+                "AND object_id NOT IN (SELECT object_id FROM objects)",
+                chunk,
+            )
+
+    def _evict(self, count):
+        """Deletes the count least recently used records.  Caller must hold the lock."""
+        self._connection.execute(
+            "DELETE FROM objects WHERE object_id IN "
+            "(SELECT object_id FROM objects ORDER BY accessed_at LIMIT ?)",
+            (count,),
+        )
+        self._refresh_size()
+
+    def _refresh_size(self):
+        """Recounts cached records.  Caller must hold the lock."""
+        self._size = self._connection.execute(
+            "SELECT COUNT(*) FROM objects"
+        ).fetchone()[0]
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Returns the shared metadata cache, opening it on first use.
+    Falls back to an in-memory cache if the cache directory is not writable."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = MetadataCache()
+            except (OSError, sqlite3.Error) as e:
+                print(f"Error opening metadata cache: {e}")
+                _cache = MetadataCache(":memory:")
+        return _cache
@@ -0,0 +1,230 @@
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import config
+import download_manager
+import met_api
+
+# Log of mirrored object IDs in the output directory, one JSON line per object
+CHECKPOINT_FILE_NAME = "checkpoint.jsonl"
+
+
+class Mirror:
+    """Copies the metadata and original images of every object matching a set of
+    searches into a directory, without the UI.
+    Objects are saved as download_manager.save_result() lays them out and recorded in
+    a checkpoint, so an interrupted mirror resumes where it stopped."""
+
+    def __init__(
+        self,
+        directory,
+        workers=config.MIRROR_WORKERS,
+        images=True,
+        bytes_per_second=config.BULK_DOWNLOAD_MAX_BYTES_PER_SECOND,
+    ):
+        """Mirrors into directory with at most workers objects in flight.
+        Metadata only is saved unless images is set."""
+        self.directory = directory
+        self.workers = workers
+        self.images = images
+        self.limiter = download_manager.BandwidthLimiter(bytes_per_second)
+        self.checkpoint_path = os.path.join(directory, CHECKPOINT_FILE_NAME)
+        self.completed = set()  # Object IDs mirrored, including by earlier runs
+        self.seen = set()  # (Object ID, classification) pairs queued by this run
+        self.objects = 0
+        self.skipped = 0  # Already mirrored or matched by an earlier search
+        self.filtered = 0  # Not of the searched classification
+        self.errors = 0
+        self.bytes_downloaded = 0
+        self.started = None
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.load_checkpoint()
+
+    def load_checkpoint(self):
+        """Reads the IDs mirrored by earlier runs.  A line cut short by a crash is ignored."""
+        if not os.path.exists(self.checkpoint_path):
+            return
+        with open(self.checkpoint_path, encoding="utf-8") as file:
+            for line in file:
+                try:
+                    self.completed.add(json.loads(line)["objectID"])
+                except (ValueError, KeyError):
+                    continue
+
+    def run(self, searches, has_images=False, report_interval=5):
+        """Mirrors the objects of each (query, classification) search.
+        Progress is printed every report_interval seconds.  Returns the summary()."""
+        self.started = time.monotonic()
+        last_report = self.started
+        with open(self.checkpoint_path, "a", encoding="utf-8") as checkpoint:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                pending = set()
+                for query, classification in searches:
+                    name = " in ".join(filter(None, [query, classification])) or "all"
+                    object_ids = met_api.search_object_ids(
+                        query, has_images, classification
+                    )
+                    if object_ids is None:
+                        print(f"Error searching {name!r}")
+                        self.errors += 1
+                        continue
+                    print(f"{name!r}: {len(object_ids)} objects")
+                    for object_id in object_ids:
+                        # An object found again under another classification is refetched
+                        # from the metadata cache, as it was filtered out the first time.
+                        key = (object_id, classification.lower())
+                        if object_id in self.completed or key in self.seen:
+                            self.skipped += 1
+                            continue
+                        self.seen.add(key)
+                        # Keep a bounded number of objects queued to bound memory use.
+                        while len(pending) >= 2 * self.workers:
+                            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                            self.record(done, checkpoint)
+                        pending.add(
+                            executor.submit(self.mirror_object, object_id, classification)
+                        )
+                        if time.monotonic() - last_report >= report_interval:
+                            self.print_summary()
+                            last_report = time.monotonic()
+                done, _ = wait(pending)
+                self.record(done, checkpoint)
+        return self.summary()
+
+    def mirror_object(self, object_id, classification):
+        """Fetches and saves one object.  Returns its ID once saved, otherwise
+        None if it is not of the classification or False if it failed."""
+        data = met_api.fetch_object_data(object_id)
+        if data is None:
+            return False
+        if not met_api.matches_classification(data, classification):
+            return None
+        if not download_manager.save_result(
+            data,
+            self.directory,
+            count_bytes=self.count_bytes,
+            limiter=self.limiter,
+            image=self.images,
+        ):
+            return False
+        return object_id
+
+    def count_bytes(self, byte_count):
+        """Adds to the image bytes downloaded.  Called from worker threads."""
+        with self._lock:
+            self.bytes_downloaded += byte_count
+
+    def record(self, futures, checkpoint):
+        """Counts finished objects and appends the mirrored ones to the checkpoint."""
+        for future in futures:
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"Error mirroring object: {e}")
+                result = False
+            if result is None:
+                self.filtered += 1
+            elif result is False:
+                self.errors += 1
+            else:
+                self.objects += 1
+                self.completed.add(result)
+                checkpoint.write(json.dumps({"objectID": result}) + "\n")
+        checkpoint.flush()
+
+    def summary(self):
+        """Returns counts and throughput of the run so far."""
+        elapsed = time.monotonic() - self.started if self.started else 0
+        return {
+            "objects": self.objects,
+            "skipped": self.skipped,
+            "filtered": self.filtered,
+            "errors": self.errors,
+            "bytes": self.bytes_downloaded,
+            "seconds": round(elapsed, 2),
+            "objects_per_second": round(self.objects / elapsed, 2) if elapsed else 0,
+            "megabytes_per_second": (
+                round(self.bytes_downloaded / elapsed / 1024 / 1024, 2) if elapsed else 0
+            ),
+        }
+
+    def print_summary(self):
+        """Prints the summary on one line."""
+        summary = self.summary()
+        print(
+            f"{summary['objects']} objects, {summary['skipped']} skipped, "
+            f"{summary['filtered']} filtered, {summary['errors']} errors in "
+            f"{summary['seconds']}s: {summary['objects_per_second']} objects/s, "
+            f"{summary['megabytes_per_second']} MB/s"
+        )
+
+
+def main():
+    """Mirrors searches of the MET collection into a local directory."""
+    parser = argparse.ArgumentParser(
+        description="Mirror the metadata and images of MET objects matching searches "
+        "into a directory, without the UI.  Rerun to resume."
+    )
+    parser.add_argument("output", help="Directory to mirror into")
+    parser.add_argument(
+        "-q", "--query", action="append", default=[], help="Search term (repeatable)"
+    )
+    parser.add_argument(
+        "-c",
+        "--classification",
+        action="append",
+        default=[],
+        help="Classification to mirror or to filter queries by (repeatable)",
+    )
+    parser.add_argument(
+        "--all-classifications",
+        action="store_true",
+        help="Use every entry of the Classification dropdown",
+    )
+    parser.add_argument(
+        "--has-images", action="store_true", help="Only objects with images"
+    )
+    parser.add_argument("--no-images", action="store_true", help="Save metadata only")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=config.MIRROR_WORKERS,
+        help="Objects fetched at once",
+    )
+    parser.add_argument(
+        "--max-bytes-per-second",
+        type=int,
+        default=config.BULK_DOWNLOAD_MAX_BYTES_PER_SECOND,
+        help="Combined image bandwidth cap, 0 for unlimited",
+    )
+    args = parser.parse_args()
+    classifications = args.classification
+    if args.all_classifications:
+        classifications = classifications + [
+            option for option in config.CLASSIFICATION_OPTIONS if option
+        ]
+    if not args.query and not classifications:
+        parser.error("give at least one --query or --classification")
+    searches = [
+        (query, classification)
+        for query in args.query or [""]
+        for classification in dict.fromkeys(classifications or [""])
+    ]
+
+    mirror = Mirror(
+        args.output, args.workers, not args.no_images, args.max_bytes_per_second
+    )
+    try:
+        mirror.run(searches, args.has_images)
+    except KeyboardInterrupt:
+        print("Interrupted, rerun to resume")
+    mirror.print_summary()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import os
+
+from PySide6.QtCore import QEvent, Qt, QTimer
+from PySide6.QtGui import QFontDatabase
+from PySide6.QtWidgets import (
+    QFileDialog,
+    QFrame,
+    QHBoxLayout,
+    QLabel,
+    QPushButton,
+    QVBoxLayout,
+)
+
+import config
+import instrumentation
+
+
+class PerformanceOverlay(QFrame):
+    """Panel floating over the top right of its parent, showing latency percentiles and
+    throughput of each instrumented stage, and the depth of the work queues.
+    Spans are recorded while it is shown."""
+
+    def __init__(self, queue_depths, parent):
+        """queue_depths() returns a dict of queue name -> current depth."""
+        super().__init__(parent)
+        self.queue_depths = queue_depths
+        self.setFrameShape(QFrame.StyledPanel)
+        self.setAutoFillBackground(True)
+
+        layout = QVBoxLayout()
+        self.label = QLabel()
+        self.label.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+        self.label.setTextInteractionFlags(Qt.TextSelectableByMouse)
+        layout.addWidget(self.label)
+        buttons = QHBoxLayout()
+        export_button = QPushButton("Export Trace...")
+        export_button.clicked.connect(self.export_trace)
+        buttons.addWidget(export_button)
+        clear_button = QPushButton("Clear")
+        clear_button.clicked.connect(self.clear)
+        buttons.addWidget(clear_button)
+        layout.addLayout(buttons)
+        self.setLayout(layout)
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(config.INSTRUMENTATION_OVERLAY_INTERVAL)
+        self.timer.timeout.connect(self.refresh)
+        parent.installEventFilter(self)
+        self.hide()
+
+    def set_shown(self, shown):
+        """Shows or hides the overlay, recording spans only while shown
+        unless recording was turned on at startup."""
+        instrumentation.set_enabled(shown or config.INSTRUMENTATION_ENABLED)
+        if shown:
+            self.refresh()
+            self.show()
+            self.raise_()
+            self.timer.start()
+        else:
+            self.timer.stop()
+            self.hide()
+
+    def refresh(self):
+        """Redraws the statistics and keeps the panel in the parent's top right corner."""
+        lines = [f"{'stage':<16}{'n':>6}{'p50':>9}{'p90':>9}{'p99':>9}{'/s':>7}"]
+        for name, stage in instrumentation.stats().items():
+            lines.append(
+                f"{name:<16}{stage['count']:>6}{stage['p50']:>9.1f}"
+                f"{stage['p90']:>9.1f}{stage['p99']:>9.1f}{stage['per_second']:>7.1f}"
+            )
+        if len(lines) == 1:
+            lines.append("(no spans yet)")
+        lines.append("")
+        lines.extend(
+            f"{name:<28}{depth:>6}" for name, depth in self.queue_depths().items()
+        )
+        self.label.setText("\n".join(lines))
+        self.adjustSize()
+        self.move(self.parentWidget().width() - self.width() - 8, 8)
+
+    def clear(self):
+        """Forgets the spans recorded so far."""
+        instrumentation.clear()
+        self.refresh()
+
+    def export_trace(self):
+        """Writes the recorded spans to a chosen file as a Chrome trace."""
+        path, _ = QFileDialog.getSaveFileName(
+            self,
+            "Export Trace",
+            os.path.join(os.path.expanduser("~"), "metexplorer-trace.json"),
+            "Trace files (*.json)",
+        )
+        if not path:
+            return
+        try:
+            count = instrumentation.export_chrome_trace(path)
+            self.label.setText(self.label.text() + f"\n\nExported {count} spans")
+        except OSError as e:
+            print(f"Error exporting trace: {e}")
+
+    def eventFilter(self, watched, event):
+        """Follows the parent's top right corner as it is resized."""
+        if event.type() == QEvent.Resize and self.isVisible():
+            self.move(watched.width() - self.width() - 8, 8)
+        return False
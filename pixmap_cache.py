@@ -0,0 +1,88 @@
+from collections import OrderedDict
+
+import config
+
+
+def pixmap_bytes(pixmap):
+    """Returns the memory held by a pixmap's pixels."""
+    return pixmap.width() * pixmap.height() * pixmap.depth() // 8
+
+
+class PixmapCache:
+    """Decoded pixmaps shared by the whole application, bounded by their total size.
+    Least recently used pixmaps are evicted first.  Keys are (URL, width, height) of
+    the size an image was decoded at, see key() and thumbnail_key().
+    Pixmaps belong to the GUI thread, so the cache must only be used from it."""
+
+    def __init__(self, max_bytes=config.PIXMAP_CACHE_MAX_BYTES):
+        """Holds at most max_bytes of pixels."""
+        self.max_bytes = max_bytes
+        self._pixmaps = OrderedDict()  # Key -> QPixmap, least recently used first
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(url, width, height):
+        """Returns the key of url decoded to fit within width x height."""
+        return url, width, height
+
+    def get(self, key):
+        """Returns the cached pixmap for key, or None."""
+        pixmap = self._pixmaps.get(key)
+        if pixmap is None:
+            self.misses += 1
+            return None
+        self._pixmaps.move_to_end(key)
+        self.hits += 1
+        return pixmap
+
+    def __contains__(self, key):
+        """Checks for key without counting a hit or refreshing its recency."""
+        return key in self._pixmaps
+
+    def put(self, key, pixmap):
+        """Caches pixmap under key, evicting least recently used pixmaps over budget."""
+        self.remove(key)
+        self._pixmaps[key] = pixmap
+        self._bytes += pixmap_bytes(pixmap)
+        while self._bytes > self.max_bytes and len(self._pixmaps) > 1:
+            _, evicted = self._pixmaps.popitem(last=False)
+            self._bytes -= pixmap_bytes(evicted)
+            self.evictions += 1
+
+    def remove(self, key):
+        """Drops key from the cache if present."""
+        pixmap = self._pixmaps.pop(key, None)
+        if pixmap is not None:
+            self._bytes -= pixmap_bytes(pixmap)
+
+    def stats(self):
+        """Returns entry count, memory use and hit counts."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._pixmaps),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+def thumbnail_key(url):
+    """Returns the key of the thumbnail of url."""
+    return PixmapCache.key(url, config.THUMBNAIL_MAX_WIDTH, config.THUMBNAIL_MAX_HEIGHT)
+
+
+_cache = None
+
+
+def get_cache():
+    """Returns the shared pixmap cache.  GUI thread only."""
+    global _cache
+    if _cache is None:
+        _cache = PixmapCache()
+    return _cache
@@ -0,0 +1,232 @@
+import threading
+
+import config
+import image_cache
+import metadata_cache
+
+
+def _http_client():
+    """Imports the HTTP stack on first use, so it does not delay the first window."""
+    import http_client
+
+    return http_client
+
+
+def _met_api():
+    """Imports the request layer on first use, see _http_client()."""
+    import met_api
+
+    return met_api
+
+
+class Prefetcher:
+    """Warms the image and metadata caches with what the user is likely to open next.
+    Work is done on a few background threads, and only while is_idle() is true, so
+    prefetching uses bandwidth the foreground leaves unused.  Prefetched images not yet
+    viewed are held within a byte budget."""
+
+    def __init__(
+        self,
+        is_idle=lambda: True,
+        workers=config.PREFETCH_WORKERS,
+        max_bytes=config.PREFETCH_MAX_BYTES,
+    ):
+        """is_idle() is polled from the worker threads to check for foreground work."""
+        self.is_idle = is_idle
+        self.workers = workers
+        self.max_bytes = max_bytes
+        self._condition = threading.Condition()
+        self._images = []  # Image URLs to prefetch, most likely to be viewed first
+        self._objects = []  # Object IDs whose metadata to prefetch
+        self._in_flight = set()
+        self._unused = {}  # Prefetched image URL not viewed yet -> size
+        self._prefetched_objects = set()
+        self._threads = []
+        self._is_running = True
+        self.image_hits = 0
+        self.image_misses = 0
+        self.images_prefetched = 0
+        self.images_wasted = 0  # Prefetched, then no longer wanted before being viewed
+        self.bytes_prefetched = 0
+        self.object_hits = 0
+        self.object_misses = 0
+
+    def set_images(self, urls):
+        """Replaces the images to prefetch, most likely first.  Prefetched images no
+        longer wanted are counted as wasted and released from the budget."""
+        wanted = [url for url in dict.fromkeys(urls) if url]
+        with self._condition:
+            for url in [url for url in self._unused if url not in wanted]:
+                del self._unused[url]
+                self.images_wasted += 1
+            cache = image_cache.get_cache()
+            self._images = [
+                url
+                for url in wanted
+                if url not in self._unused
+                and url not in self._in_flight
+                and url not in cache
+            ]
+            self._start()
+
+    def set_objects(self, object_ids):
+        """Replaces the objects whose metadata to prefetch, e.g. the next page of results."""
+        with self._condition:
+            self._objects = [
+                object_id
+                for object_id in object_ids
+                if object_id not in self._prefetched_objects
+            ]
+            self._start()
+
+    def record_view(self, url, cached):
+        """Counts an image opened by the viewer as a hit if it was served from the cache
+        thanks to prefetching, or as a miss if it had to be downloaded."""
+        with self._condition:
+            prefetched = self._unused.pop(url, None) is not None
+            if prefetched and cached:
+                self.image_hits += 1
+            elif not cached:
+                self.image_misses += 1
+            self._condition.notify_all()  # Budget may have been released
+
+    def record_objects(self, object_ids):
+        """Counts objects of a page being fetched as hits if their metadata was prefetched."""
+        with self._condition:
+            for object_id in object_ids:
+                if object_id in self._prefetched_objects:
+                    self.object_hits += 1
+                    self._prefetched_objects.discard(object_id)
+                else:
+                    self.object_misses += 1
+            self._objects = [
+                object_id for object_id in self._objects if object_id not in object_ids
+            ]
+
+    def stats(self):
+        """Returns prefetch counts and hit rates."""
+        with self._condition:
+            image_views = self.image_hits + self.image_misses
+            object_uses = self.object_hits + self.object_misses
+            return {
+                "images": {
+                    "prefetched": self.images_prefetched,
+                    "bytes": self.bytes_prefetched,
+                    "hits": self.image_hits,
+                    "misses": self.image_misses,
+                    "wasted": self.images_wasted,
+                    "hit_rate": self.image_hits / image_views if image_views else 0.0,
+                    "unused_bytes": sum(self._unused.values()),
+                    "queued": len(self._images),
+                },
+                "objects": {
+                    "prefetched": len(self._prefetched_objects) + self.object_hits,
+                    "hits": self.object_hits,
+                    "misses": self.object_misses,
+                    "hit_rate": self.object_hits / object_uses if object_uses else 0.0,
+                    "queued": len(self._objects),
+                },
+            }
+
+    def shutdown(self):
+        """Stops the workers.  Downloads in progress are abandoned."""
+        with self._condition:
+            self._is_running = False
+            self._images = []
+            self._objects = []
+            self._condition.notify_all()
+
+    def _start(self):
+        """Starts the workers on first use and wakes them.  Called with the lock held."""
+        if not self._threads:
+            self._threads = [
+                threading.Thread(target=self._work, daemon=True)
+                for _ in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+        self._condition.notify_all()
+
+    def _wait_for_idle(self):
+        """Blocks while foreground work is running.  Returns False on shutdown."""
+        while self._is_running and not self.is_idle():
+            with self._condition:
+                self._condition.wait(config.PREFETCH_IDLE_POLL_INTERVAL)
+        return self._is_running
+
+    def _next_job(self):
+        """Blocks until there is something to prefetch within the budget and claims it.
+        Metadata goes first, as it is small and needed to show the next page.
+        Returns ("object", ID), ("image", URL) or None on shutdown."""
+        with self._condition:
+            while self._is_running:
+                if self._objects:
+                    return "object", self._objects.pop(0)
+                if self._images and sum(self._unused.values()) < self.max_bytes:
+                    url = self._images.pop(0)
+                    self._in_flight.add(url)
+                    return "image", url
+                self._condition.wait()
+        return None
+
+    def _work(self):
+        """Worker thread: prefetches jobs while the foreground is idle."""
+        while True:
+            if not self._wait_for_idle():
+                return
+            job = self._next_job()
+            if job is None:
+                return
+            kind, key = job
+            try:
+                if kind == "object":
+                    self._prefetch_object(key)
+                else:
+                    self._prefetch_image(key)
+            except Exception as e:
+                print(f"Error prefetching {kind}: {e}")
+            finally:
+                with self._condition:
+                    self._in_flight.discard(key)
+
+    def _prefetch_object(self, object_id):
+        """Loads an object's metadata into the metadata cache.  Only objects requested
+        for it count as prefetched, not those already cached or fully described by the
+        local index."""
+        cache = metadata_cache.get_cache()
+        if object_id in cache:
+            return
+        if _met_api().fetch_object_data(object_id) is not None and object_id in cache:
+            with self._condition:
+                self._prefetched_objects.add(object_id)
+
+    def _prefetch_image(self, url):
+        """Downloads an image into the image cache.  The download is abandoned, and the
+        image queued again, if foreground work starts, unless the foreground joined it."""
+        content = _http_client().download(
+            url, lambda: self._is_running and self.is_idle()
+        )
+        if content is None:
+            if not self.is_idle():
+                with self._condition:
+                    if self._is_running and url not in self._images:
+                        self._images.insert(0, url)
+            return
+        image_cache.get_cache().put(url, content)
+        with self._condition:
+            self._unused[url] = len(content)
+            self.images_prefetched += 1
+            self.bytes_prefetched += len(content)
+
+
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+
+def get_prefetcher():
+    """Returns the shared prefetcher.  Its workers start on the first request."""
+    global _prefetcher
+    with _prefetcher_lock:
+        if _prefetcher is None:
+            _prefetcher = Prefetcher()
+        return _prefetcher
@@ -0,0 +1,152 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import config
+
+
+def normalize(query, has_images, classification):
+    """Returns the cache key of a search.  Case and surrounding or repeated whitespace
+    do not change the results of a search, so they do not change its key."""
+    return (
+        " ".join(query.split()).lower(),
+        bool(has_images),
+        " ".join(classification.split()).lower(),
+    )
+
+
+class QueryCache:
+    """Ordered object IDs returned by earlier searches, in memory and on disk.
+    An entry younger than ttl is fresh and answers a search without asking the API.
+    An older one is stale: it is shown at once while the search runs again, see
+    fetch.FetchDataThread.  Entries older than max_age are dropped.  Thread safe."""
+
+    def __init__(
+        self,
+        path=config.QUERY_CACHE_PATH,
+        ttl=config.QUERY_CACHE_TTL,
+        max_age=config.QUERY_CACHE_MAX_AGE,
+        max_entries=config.QUERY_CACHE_MAX_ENTRIES,
+        memory_entries=config.QUERY_CACHE_MEMORY_ENTRIES,
+    ):
+        """Opens (or creates) the SQLite cache database at path.  At most max_entries
+        searches are kept on disk and memory_entries of them in memory."""
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.ttl = ttl
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()  # Key -> (object IDs, stored_at), most recent last
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS queries ("
+            "key TEXT PRIMARY KEY, "
+            "object_ids TEXT NOT NULL, "
+            "stored_at REAL NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS queries_stored_at ON queries (stored_at)"
+        )
+
+    def get(self, query, has_images, classification):
+        """Returns (object IDs, fresh) cached for a search, or None if it is not cached
+        or older than max_age."""
+        key = normalize(query, has_images, classification)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                row = self._connection.execute(
+                    "SELECT object_ids, stored_at FROM queries WHERE key = ?",
+                    (json.dumps(key),),
+                ).fetchone()
+                if row is not None:
+                    entry = json.loads(row[0]), row[1]
+                    self._remember(key, entry)
+            else:
+                self._memory.move_to_end(key)
+            if entry is None or now - entry[1] > self.max_age:
+                self.misses += 1
+                return None
+            fresh = now - entry[1] <= self.ttl
+            if fresh:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+            return entry[0], fresh
+
+    def put(self, query, has_images, classification, object_ids):
+        """Stores the object IDs a search returned, evicting the oldest searches if full."""
+        key = normalize(query, has_images, classification)
+        entry = list(object_ids), time.time()
+        with self._lock:
+            self._remember(key, entry)
+            self._connection.execute(
+                "INSERT OR REPLACE INTO queries (key, object_ids, stored_at) "
+                "VALUES (?, ?, ?)",
+                (json.dumps(key), json.dumps(entry[0]), entry[1]),
+            )
+            self._connection.execute(
+                "DELETE FROM queries WHERE key NOT IN "
+                "(SELECT key FROM queries ORDER BY stored_at DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+
+    def stats(self):
+        """Returns hit counters and the entry count.  Stale hits count as hits in hit_ratio."""
+        lookups = self.hits + self.stale_hits + self.misses
+        with self._lock:
+            entries = self._connection.execute(
+                "SELECT COUNT(*) FROM queries"
+            ).fetchone()[0]
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+        }
+
+    def clear(self):
+        """Removes every cached search."""
+        with self._lock:
+            self._memory.clear()
+            self._connection.execute("DELETE FROM queries")
+
+    def _remember(self, key, entry):
+        """Keeps an entry in memory, dropping the least recently used ones.
+        Caller must hold the lock."""
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Returns the shared query cache, opening it on first use.
+    Falls back to an in-memory cache if the cache directory is not writable."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = QueryCache()
+            except (OSError, sqlite3.Error) as e:
+                print(f"Error opening query cache: {e}")
+                _cache = QueryCache(":memory:")
+        return _cache
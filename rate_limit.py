@@ -0,0 +1,199 @@
+import random
+import threading
+import time
+
+import config
+
+# Responses meaning the server is overloaded or throttling us.  The MET API answers 403 when throttling.
+THROTTLE_STATUSES = {403, 429, 503}
+# Responses worth retrying
+RETRY_STATUSES = THROTTLE_STATUSES | {500, 502, 504}
+
+
+class RateLimiter:
+    """Paces requests with a token bucket and bounds how many are in flight.
+    Both limits adapt to the server: throttling responses cut the rate and concurrency,
+    and the rate then recovers towards the rate at which throttling began, so sustained
+    throughput settles just under the server's limit.  Concurrency also backs off when
+    latency rises well above the best seen, and grows slowly while it stays low."""
+
+    def __init__(
+        self,
+        max_rate=config.RATE_LIMIT_REQUESTS_PER_SECOND,
+        burst=config.RATE_LIMIT_BURST,
+        concurrency=config.RATE_LIMIT_INITIAL_CONCURRENCY,
+        min_concurrency=config.RATE_LIMIT_MIN_CONCURRENCY,
+        max_concurrency=config.RATE_LIMIT_MAX_CONCURRENCY,
+    ):
+        """Starts at max_rate requests per second with bursts of up to burst requests."""
+        self.max_rate = max_rate
+        self.rate = max_rate
+        self.ceiling = max_rate  # Rate the rate recovers to after throttling
+        self.burst = burst
+        self.concurrency = float(concurrency)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self._tokens = burst
+        self._last_refill = time.monotonic()
+        self._last_throttle = None
+        self._in_flight = 0
+        self._best_latency = None
+        self._average_latency = None
+        self._retry_budget = config.RETRY_BUDGET_MAX
+        self._condition = threading.Condition()
+        self.requests = 0
+        self.throttled = 0
+        self.retried = 0
+        self.retries_denied = 0  # Retries skipped because the retry budget was spent
+        self.failed = 0
+
+    def acquire(self, token=None):
+        """Blocks until a request may start, then claims a concurrency slot.
+        Raises Cancelled if the cancellation token is cancelled while waiting."""
+        with self._condition:
+            while True:
+                if token is not None:
+                    token.check()
+                self._refill()
+                if self._in_flight < int(self.concurrency) and self._tokens >= 1:
+                    self._tokens -= 1
+                    self._in_flight += 1
+                    self.requests += 1
+                    self._retry_budget = min(
+                        config.RETRY_BUDGET_MAX,
+                        self._retry_budget + config.RETRY_BUDGET_RATIO,
+                    )
+                    return
+                # Wait for the next token, or for a slot to be released, waking
+                # at least periodically to notice cancellation.
+                timeout = config.RATE_LIMIT_POLL_INTERVAL
+                if self._in_flight < int(self.concurrency):
+                    timeout = min(timeout, (1 - self._tokens) / self.rate)
+                self._condition.wait(timeout)
+
+    def release(self, status=None, latency=None):
+        """Frees the slot of a finished request and adapts the limits to its outcome.
+        status is the HTTP status, or None if the request failed without a response."""
+        with self._condition:
+            self._in_flight -= 1
+            if status in THROTTLE_STATUSES:
+                self._throttle()
+            elif status is None or status >= 500:
+                self.concurrency = max(self.min_concurrency, self.concurrency * 0.75)
+            else:
+                self._recover(latency)
+            self._condition.notify_all()
+
+    def allow_retry(self):
+        """Spends one retry from the budget, which refills by a fraction of every request.
+        Returns False, and counts a denied retry, once the budget is spent."""
+        with self._condition:
+            if self._retry_budget >= 1:
+                self._retry_budget -= 1
+                self.retried += 1
+                return True
+            self.retries_denied += 1
+            return False
+
+    def record_failure(self):
+        """Counts a request that failed for good, after any retries."""
+        with self._condition:
+            self.failed += 1
+
+    def stats(self):
+        """Returns the current limits and request outcome counts."""
+        with self._condition:
+            return {
+                "rate": round(self.rate, 2),
+                "ceiling": round(self.ceiling, 2),
+                "concurrency": int(self.concurrency),
+                "in_flight": self._in_flight,
+                "requests": self.requests,
+                "throttled": self.throttled,
+                "retried": self.retried,
+                "retries_denied": self.retries_denied,
+                "failed": self.failed,
+                "retry_budget": round(self._retry_budget, 2),
+                "best_latency": self._best_latency,
+                "average_latency": self._average_latency,
+            }
+
+    def _refill(self):
+        """Adds the tokens earned since the last refill.  Called with the lock held."""
+        now = time.monotonic()
+        self._tokens = min(
+            self.burst, self._tokens + (now - self._last_refill) * self.rate
+        )
+        self._last_refill = now
+
+    def _throttle(self):
+        """Backs off after a throttling response.  Called with the lock held."""
+        self.throttled += 1
+        now = time.monotonic()
+        # Responses to requests sent before the last cut are not a reason to cut again.
+        if self._last_throttle is not None and now - self._last_throttle < 1:
+            return
+        self._last_throttle = now
+        self.ceiling = max(1.0, self.rate * config.RATE_LIMIT_CEILING_FACTOR)
+        self.rate = max(1.0, self.rate * config.RATE_LIMIT_BACKOFF_FACTOR)
+        self.concurrency = max(self.min_concurrency, self.concurrency / 2)
+        self._tokens = 0
+
+    def _recover(self, latency):
+        """Grows the limits after a successful request.  Called with the lock held."""
+        # About one request per second more each second, up to the ceiling.
+        self.rate = min(self.ceiling, self.rate + 1 / self.rate)
+        if (
+            self.rate >= self.ceiling
+            and self.ceiling < self.max_rate
+            and time.monotonic() - (self._last_throttle or 0)
+            >= config.RATE_LIMIT_PROBE_INTERVAL
+        ):
+            # Probe whether the server allows more again.
+            self.ceiling = min(self.max_rate, self.ceiling + 1)
+            self._last_throttle = time.monotonic()
+        if latency is None:
+            return
+        self._average_latency = (
+            latency
+            if self._average_latency is None
+            else 0.9 * self._average_latency + 0.1 * latency
+        )
+        # Let the best latency drift up slowly, so a route change is eventually forgotten.
+        self._best_latency = (
+            latency
+            if self._best_latency is None
+            else min(latency, self._best_latency * 1.01)
+        )
+        if latency > self._best_latency * config.RATE_LIMIT_LATENCY_TOLERANCE:
+            self.concurrency = max(self.min_concurrency, self.concurrency * 0.95)
+        else:
+            self.concurrency = min(
+                self.max_concurrency, self.concurrency + 1 / self.concurrency
+            )
+
+
+def backoff_delay(attempt, retry_after=None):
+    """Returns a jittered exponential delay before retry number attempt (from 0).
+    A Retry-After value given by the server in seconds is respected."""
+    delay = random.uniform(
+        0, min(config.RETRY_MAX_DELAY, config.RETRY_BASE_DELAY * 2**attempt)
+    )
+    try:
+        delay = max(delay, float(retry_after)) if retry_after else delay
+    except ValueError:
+        pass  # An HTTP date, rare enough to fall back to the computed delay
+    return min(delay, config.RETRY_MAX_DELAY)
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter():
+    """Returns the rate limiter shared by all requests."""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter()
+        return _limiter
@@ -0,0 +1,56 @@
+import threading
+
+# Image resolution tiers offered by the MET API, smallest first
+SMALL = "small"  # primaryImageSmall, a web-large rendition of a few hundred pixels
+ORIGINAL = "original"  # primaryImage, the full resolution original
+TIERS = [SMALL, ORIGINAL]
+
+_bytes_by_tier = {tier: 0 for tier in TIERS}
+_downloads_by_tier = {tier: 0 for tier in TIERS}
+_lock = threading.Lock()
+
+
+def rendition_urls(data):
+    """Returns the (tier, URL) pairs available for an object, smallest first.
+    Called for every painted row, so it only reads data."""
+    urls = []
+    for tier, field in ((SMALL, "primaryImageSmall"), (ORIGINAL, "primaryImage")):
+        url = data.get(field)
+        if url and url not in (existing for _, existing in urls):
+            urls.append((tier, url))
+    return urls
+
+
+def thumbnail_url(data):
+    """Returns the smallest rendition adequate for a thumbnail, or None if there is no image."""
+    urls = rendition_urls(data)
+    return urls[0][1] if urls else None
+
+
+def full_image_url(data):
+    """Returns the largest rendition, used by the viewer and for downloads."""
+    urls = rendition_urls(data)
+    return urls[-1][1] if urls else None
+
+
+def tier_of(url):
+    """Returns the resolution tier of an image URL, from the MET image path layout:
+    renditions are under web-large/ or web-additional/, originals under original/."""
+    return SMALL if "/web-large/" in url or "/web-additional/" in url else ORIGINAL
+
+
+def record_download(url, byte_count):
+    """Accounts downloaded bytes against the tier of url."""
+    tier = tier_of(url)
+    with _lock:
+        _bytes_by_tier[tier] += byte_count
+        _downloads_by_tier[tier] += 1
+
+
+def stats():
+    """Returns bytes and download counts per resolution tier."""
+    with _lock:
+        return {
+            tier: {"bytes": _bytes_by_tier[tier], "downloads": _downloads_by_tier[tier]}
+            for tier in TIERS
+        }
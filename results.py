@@ -0,0 +1,396 @@
+from PySide6.QtCore import (
+    QAbstractListModel,
+    QModelIndex,
+    QRect,
+    QSize,
+    QSortFilterProxyModel,
+    Qt,
+    Signal,
+)
+from PySide6.QtGui import QPixmap
+from PySide6.QtWidgets import QListView, QStyle, QStyledItemDelegate
+
+import config
+import instrumentation
+import pixmap_cache
+import renditions
+import utils
+
+# Custom item data roles
+ResultDataRole = Qt.UserRole + 1  # The object record dict
+ThumbnailUrlRole = Qt.UserRole + 2  # URL of the thumbnail rendition, or None
+ThumbnailRole = Qt.UserRole + 3  # QPixmap once downloaded, otherwise None
+ThumbnailStateRole = Qt.UserRole + 4  # One of the THUMBNAIL_* states below
+SortKeysRole = Qt.UserRole + 5  # Precomputed sort keys, see sort_keys()
+
+# Thumbnail states
+THUMBNAIL_NONE = "none"  # The object has no image
+THUMBNAIL_PENDING = "pending"  # Not downloaded yet
+THUMBNAIL_READY = "ready"
+THUMBNAIL_ERROR = "error"
+
+
+# Sort fields
+SORT_RELEVANCE = "relevance"  # Order returned by the search
+
+
+def _thumbnail_pack():
+    """Imports the thumbnail pack on first use.  Startup does without it unless there
+    are restored results to show."""
+    import thumbnail_pack
+
+    return thumbnail_pack
+
+
+def sort_keys(data, position):
+    """Precomputes the sort key of every sort field for a result found at position in the search."""
+    return {
+        SORT_RELEVANCE: position,
+        "objectEndDate": data.get("objectEndDate") or 0,
+        "objectBeginDate": data.get("objectBeginDate") or 0,
+        "title": (data.get("title") or "").casefold(),
+        "artistDisplayName": (data.get("artistDisplayName") or "").casefold(),
+    }
+
+
+class ResultsModel(QAbstractListModel):
+    """List model of search results.
+    Thumbnails are held in the shared pixmap cache; rows whose thumbnail was evicted
+    show it again from the thumbnail pack, or as pending if it is not there either, so
+    it is re-requested when needed."""
+
+    def __init__(self, parent=None):
+        """Creates an empty model."""
+        super().__init__(parent)
+        self.results = []
+        self.keys = []  # Sort keys of each result
+        self.rows_by_url = {}  # Thumbnail URL -> rows showing it
+        self.failed_urls = set()
+
+    def rowCount(self, parent=QModelIndex()):
+        """Returns the number of results."""
+        return 0 if parent.isValid() else len(self.results)
+
+    def data(self, index, role=Qt.DisplayRole):
+        """Returns result text, record, or thumbnail data for a row."""
+        if not index.isValid() or index.row() >= len(self.results):
+            return None
+        data = self.results[index.row()]
+        if role == Qt.DisplayRole:
+            return utils.result_text(data)
+        if role == ResultDataRole:
+            return data
+        if role == SortKeysRole:
+            return self.keys[index.row()]
+        url = renditions.thumbnail_url(data)
+        if role == ThumbnailUrlRole:
+            return url
+        if role == ThumbnailRole:
+            if not url:
+                return None
+            return self.thumbnail(url)
+        if role == ThumbnailStateRole:
+            if not url:
+                return THUMBNAIL_NONE
+            if pixmap_cache.thumbnail_key(url) in pixmap_cache.get_cache():
+                return THUMBNAIL_READY
+            pack = _thumbnail_pack().get_pack()
+            if pack is not None and url in pack:
+                return THUMBNAIL_READY
+            if url in self.failed_urls:
+                return THUMBNAIL_ERROR
+            return THUMBNAIL_PENDING
+        return None
+
+    def clear(self):
+        """Removes all rows.  Already downloaded thumbnails are kept."""
+        self.beginResetModel()
+        self.results = []
+        self.keys = []
+        self.rows_by_url = {}
+        self.endResetModel()
+
+    def append_results(self, results):
+        """Adds rows after the existing ones, in search order."""
+        if not results:
+            return
+        first = len(self.results)
+        with instrumentation.span("insert_rows", rows=len(results)):
+            self.beginInsertRows(QModelIndex(), first, first + len(results) - 1)
+            for row, data in enumerate(results, first):
+                self.results.append(data)
+                self.keys.append(sort_keys(data, row))
+                url = renditions.thumbnail_url(data)
+                if url:
+                    self.rows_by_url.setdefault(url, []).append(row)
+            self.endInsertRows()
+
+    def remove_objects(self, object_ids):
+        """Removes the rows of the objects with these IDs."""
+        object_ids = set(object_ids)
+        rows = [
+            row
+            for row, data in enumerate(self.results)
+            if data.get("objectID") in object_ids
+        ]
+        if not rows:
+            return
+        for row in reversed(rows):
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self.results[row]
+            del self.keys[row]
+            self.endRemoveRows()
+        # Renumbered in the same order, so rows appended later sort after them
+        for row, keys in enumerate(self.keys):
+            keys[SORT_RELEVANCE] = row
+        self._index_urls()
+
+    def set_order(self, object_ids):
+        """Moves rows into the order of object_ids, the search run again, as their new
+        search order.  Rows of objects not in object_ids stay after the others."""
+        if not self.results:
+            return
+        ranks = {object_id: rank for rank, object_id in enumerate(object_ids)}
+        order = sorted(
+            range(len(self.results)),
+            key=lambda row: ranks.get(self.results[row].get("objectID"), len(ranks)),
+        )
+        if order == list(range(len(order))):
+            return
+        self.layoutAboutToBeChanged.emit()
+        new_rows = {old: new for new, old in enumerate(order)}
+        indexes = self.persistentIndexList()
+        self.results = [self.results[row] for row in order]
+        self.keys = [self.keys[row] for row in order]
+        for row, keys in enumerate(self.keys):
+            keys[SORT_RELEVANCE] = row
+        self.changePersistentIndexList(
+            indexes, [self.index(new_rows[index.row()]) for index in indexes]
+        )
+        self._index_urls()
+        self.layoutChanged.emit()
+
+    def _index_urls(self):
+        """Rebuilds the rows showing each thumbnail URL after rows moved."""
+        self.rows_by_url = {}
+        for row, data in enumerate(self.results):
+            url = renditions.thumbnail_url(data)
+            if url:
+                self.rows_by_url.setdefault(url, []).append(row)
+
+    def result(self, row):
+        """Returns the object record shown in row."""
+        return self.results[row]
+
+    def thumbnail(self, url):
+        """Returns the thumbnail pixmap of url, or None if it is not downloaded yet.
+        Thumbnails in the thumbnail pack but no longer in the pixmap cache are copied
+        back into it from the mapped frame, without decoding."""
+        cache = pixmap_cache.get_cache()
+        key = pixmap_cache.thumbnail_key(url)
+        if key in cache:
+            return cache.get(key)
+        pack = _thumbnail_pack().get_pack()
+        image = pack.get(url) if pack is not None else None
+        if image is None:
+            return None
+        pixmap = QPixmap.fromImage(image)
+        cache.put(key, pixmap)
+        return pixmap
+
+    def set_thumbnail(self, url, pixmap):
+        """Stores a downloaded thumbnail and repaints the rows showing it."""
+        pixmap_cache.get_cache().put(pixmap_cache.thumbnail_key(url), pixmap)
+        self.failed_urls.discard(url)
+        self.thumbnail_changed(url)
+
+    def set_thumbnail_error(self, url):
+        """Marks a thumbnail as failed and repaints the rows showing it."""
+        self.failed_urls.add(url)
+        self.thumbnail_changed(url)
+
+    def thumbnail_changed(self, url):
+        """Emits dataChanged for every row whose thumbnail is url."""
+        for row in self.rows_by_url.get(url, []):
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [ThumbnailRole, ThumbnailStateRole])
+
+
+class ResultsProxyModel(QSortFilterProxyModel):
+    """Sorts and filters results in place using the model's precomputed sort keys.
+    Rows arriving later are inserted at their sorted position."""
+
+    def __init__(self, parent=None):
+        """Starts in search order with no filtering."""
+        super().__init__(parent)
+        self.sort_field = SORT_RELEVANCE
+        self.require_image = False
+        self.setSortRole(SortKeysRole)
+        self.setDynamicSortFilter(True)
+
+    def set_sort(self, field, order):
+        """Orders rows by a field of sort_keys()."""
+        self.sort_field = field
+        self.invalidate()
+        self.sort(0, order)
+
+    def set_require_image(self, require_image):
+        """Hides results without an image if require_image is set."""
+        self.require_image = require_image
+        self.invalidateFilter()
+
+    def lessThan(self, left, right):
+        """Compares precomputed keys of the current sort field."""
+        model = self.sourceModel()
+        return (
+            model.keys[left.row()][self.sort_field]
+            < model.keys[right.row()][self.sort_field]
+        )
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        """Accepts results with a small image rendition when images are required."""
+        if not self.require_image:
+            return True
+        return bool(self.sourceModel().results[source_row].get("primaryImageSmall"))
+
+
+class ResultDelegate(QStyledItemDelegate):
+    """Paints a result row: description text on the left, thumbnail on the right."""
+
+    def sizeHint(self, option, index):
+        """Every row has the height of a thumbnail plus margins."""
+        return QSize(
+            option.rect.width(),
+            config.THUMBNAIL_MAX_HEIGHT + 2 * config.RESULT_ROW_MARGIN,
+        )
+
+    @staticmethod
+    def thumbnail_rect(rect):
+        """Returns the thumbnail area within a row rectangle."""
+        return QRect(
+            rect.right() - config.RESULT_ROW_MARGIN - config.THUMBNAIL_MAX_WIDTH,
+            rect.top() + config.RESULT_ROW_MARGIN,
+            config.THUMBNAIL_MAX_WIDTH,
+            config.THUMBNAIL_MAX_HEIGHT,
+        )
+
+    def paint(self, painter, option, index):
+        """Draws the row panel, text and thumbnail or its placeholder text."""
+        with instrumentation.span("paint_row"):
+            self.paint_row(painter, option, index)
+
+    def paint_row(self, painter, option, index):
+        """Draws one row.  See paint()."""
+        style = option.widget.style() if option.widget else None
+        painter.save()
+        if style:
+            style.drawPrimitive(QStyle.PE_PanelItemViewItem, option, painter, option.widget)
+        painter.setPen(option.palette.mid().color())
+        painter.drawRect(option.rect.adjusted(0, 0, -1, -1))
+
+        thumbnail_rect = self.thumbnail_rect(option.rect)
+        text_rect = QRect(
+            option.rect.left() + config.RESULT_ROW_MARGIN,
+            thumbnail_rect.top(),
+            min(
+                thumbnail_rect.left() - option.rect.left() - 2 * config.RESULT_ROW_MARGIN,
+                config.RESULT_TEXT_MAX_WIDTH,
+            ),
+            thumbnail_rect.height(),
+        )
+        painter.setPen(option.palette.text().color())
+        painter.drawText(
+            text_rect,
+            Qt.AlignLeft | Qt.AlignVCenter | Qt.TextWordWrap,
+            index.data(Qt.DisplayRole),
+        )
+
+        state = index.data(ThumbnailStateRole)
+        pixmap = index.data(ThumbnailRole)
+        if state == THUMBNAIL_READY and pixmap is not None:
+            size = pixmap.size().scaled(thumbnail_rect.size(), Qt.KeepAspectRatio)
+            target = QRect(0, 0, size.width(), size.height())
+            target.moveCenter(thumbnail_rect.center())
+            target.moveRight(thumbnail_rect.right())
+            painter.drawPixmap(target, pixmap)
+        else:
+            placeholder = {
+                THUMBNAIL_NONE: "No Image Found",
+                THUMBNAIL_ERROR: "Image failed to load",
+            }.get(state, "Loading...")
+            painter.drawText(thumbnail_rect, Qt.AlignCenter, placeholder)
+        painter.restore()
+
+
+class ResultsView(QListView):
+    """Virtualized list of results.  Only rows in view are painted."""
+
+    thumbnail_clicked = Signal(QModelIndex)
+    visible_rows_changed = Signal()
+    hovered_row_changed = Signal(int)  # Row under the mouse, or -1
+
+    def __init__(self, parent=None):
+        """Sets up a uniform row height list with per pixel scrolling."""
+        super().__init__(parent)
+        self.setUniformItemSizes(True)
+        self.setVerticalScrollMode(QListView.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.setSpacing(2)
+        self.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.setItemDelegate(ResultDelegate(self))
+        self.setMouseTracking(True)
+        self.hovered_row = -1
+        self.verticalScrollBar().valueChanged.connect(self.visible_rows_changed)
+
+    def setModel(self, model):
+        """Tracks changes to the model's rows as visibility changes."""
+        super().setModel(model)
+        model.modelReset.connect(self.visible_rows_changed)
+        model.rowsInserted.connect(self.visible_rows_changed)
+
+    def visible_row_range(self):
+        """Returns the first and last row currently in view, or None if empty."""
+        model = self.model()
+        if model is None or model.rowCount() == 0:
+            return None
+        # Rows have a uniform height, so the visible range follows from the scroll offset.
+        row_height = self.sizeHintForRow(0) + 2 * self.spacing()
+        top = self.verticalScrollBar().value()
+        first_row = min(top // row_height, model.rowCount() - 1)
+        last_row = min(
+            (top + self.viewport().height()) // row_height, model.rowCount() - 1
+        )
+        return first_row, last_row
+
+    def mouseReleaseEvent(self, event):
+        """Emits thumbnail_clicked when a row's thumbnail is clicked."""
+        position = event.position().toPoint()
+        index = self.indexAt(position)
+        if (
+            event.button() == Qt.LeftButton
+            and index.isValid()
+            and ResultDelegate.thumbnail_rect(self.visualRect(index)).contains(position)
+        ):
+            self.thumbnail_clicked.emit(index)
+        super().mouseReleaseEvent(event)
+
+    def mouseMoveEvent(self, event):
+        """Emits hovered_row_changed when the mouse moves onto another row."""
+        self.set_hovered_row(self.indexAt(event.position().toPoint()).row())
+        super().mouseMoveEvent(event)
+
+    def leaveEvent(self, event):
+        """No row is hovered once the mouse leaves the list."""
+        self.set_hovered_row(-1)
+        super().leaveEvent(event)
+
+    def set_hovered_row(self, row):
+        """Records the row under the mouse."""
+        if row != self.hovered_row:
+            self.hovered_row = row
+            self.hovered_row_changed.emit(row)
+
+    def resizeEvent(self, event):
+        """Resizing can bring more rows into view."""
+        super().resizeEvent(event)
+        self.visible_rows_changed.emit()
@@ -0,0 +1,152 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from PySide6.QtCore import QThread, Signal
+
+import config
+import download_manager
+import utils
+
+# Save threads still running, kept referenced until they finish even if their window is gone
+running_threads = set()
+
+
+class SaveImageThread(QThread):
+    """Saves one original image to disk in the background."""
+
+    progress = Signal(int, int)  # Bytes received, total bytes (0 if unknown)
+    saved = Signal(str)
+    failed = Signal(str)
+
+    def __init__(self, image_url, path):
+        """Saves image_url to path."""
+        super().__init__()
+        self.image_url = image_url
+        self.path = path
+        self._is_running = True
+
+    def run(self):
+        """Streams the image to disk.  Emits saved or failed with the path."""
+        try:
+            saved = download_manager.stream_to_file(
+                self.image_url, self.path, lambda: self._is_running, self.progress.emit
+            )
+        except Exception as e:
+            print(f"Error saving image: {e}")
+            saved = False
+        if self._is_running:
+            (self.saved if saved else self.failed).emit(self.path)
+
+    def stop(self):
+        """Abandons the download.  The partial file is kept for resuming."""
+        self._is_running = False
+
+
+class BulkDownloadThread(QThread):
+    """Saves the original image and a JSON metadata sidecar of every result to a directory.
+    Files already complete are skipped and partial files resumed, so an interrupted run can be repeated."""
+
+    progress = Signal(int, int, int)  # Results done, total results, bytes downloaded
+    completed = Signal(int, int)  # Results saved, results failed
+
+    def __init__(
+        self,
+        results,
+        directory,
+        bytes_per_second=config.BULK_DOWNLOAD_MAX_BYTES_PER_SECOND,
+    ):
+        """Saves results into directory within a combined bandwidth cap."""
+        super().__init__()
+        self.results = results
+        self.directory = directory
+        self.limiter = download_manager.BandwidthLimiter(bytes_per_second)
+        self.bytes_downloaded = 0
+        self._lock = threading.Lock()
+        self._is_running = True
+
+    def run(self):
+        """Saves results concurrently and reports progress as each one completes."""
+        saved = failed = 0
+        with ThreadPoolExecutor(max_workers=config.BULK_DOWNLOAD_WORKERS) as executor:
+            futures = [
+                executor.submit(self.save_result, data) for data in self.results
+            ]
+            for future in as_completed(futures):
+                if not self._is_running:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    return
+                try:
+                    ok = future.result()
+                except Exception as e:
+                    print(f"Error saving result: {e}")
+                    ok = False
+                saved += ok
+                failed += not ok
+                self.progress.emit(
+                    saved + failed, len(self.results), self.bytes_downloaded
+                )
+        self.completed.emit(saved, failed)
+
+    def save_result(self, data):
+        """Saves the image and sidecar of one result.  Returns whether both are complete."""
+        if not self._is_running:
+            return False
+        return download_manager.save_result(
+            data,
+            self.directory,
+            lambda: self._is_running,
+            self.count_bytes,
+            self.limiter,
+        )
+
+    def count_bytes(self, byte_count):
+        """Adds to the bytes downloaded by all workers."""
+        with self._lock:
+            self.bytes_downloaded += byte_count
+
+    def stop(self):
+        """Abandons the remaining downloads."""
+        self._is_running = False
+
+
+def start(thread):
+    """Starts a save thread, keeping it referenced until it finishes."""
+    running_threads.add(thread)
+    thread.finished.connect(lambda: running_threads.discard(thread))
+    thread.start()
+
+
+def stop_all():
+    """Stops every running save thread and waits for it to release its files."""
+    for thread in list(running_threads):
+        thread.stop()
+        thread.wait()
+
+
+def save_image(image_url, report, parent=None):
+    """Asks where to save image_url, then saves it in the background.
+    Status messages are passed to report(text)."""
+    path = utils.ask_save_path(image_url, parent)
+    if not path:
+        return None
+    name = os.path.basename(path)
+
+    def safe_report(text):
+        try:
+            report(text)
+        except RuntimeError:
+            pass  # The window showing the status has been closed
+
+    thread = SaveImageThread(image_url, path)
+    thread.progress.connect(
+        lambda received, total: safe_report(
+            f"Saving {name}: {received * 100 // total}%"
+            if total
+            else f"Saving {name}: {received // 1024} KB"
+        )
+    )
+    thread.saved.connect(lambda saved_path: safe_report(f"Saved {saved_path}"))
+    thread.failed.connect(lambda _: safe_report(f"Failed to save {name}"))
+    start(thread)
+    return thread
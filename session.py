@@ -0,0 +1,98 @@
+import json
+import os
+import struct
+import threading
+from array import array
+
+import config
+
+# File signature and version.  Snapshots of another version are ignored.
+MAGIC = b"METSESS2"
+
+# Header length following the signature
+HEADER_LENGTH = struct.Struct("<I")
+
+
+def _thumbnail_pack():
+    """Imports the thumbnail pack on first use, so that starting without a saved
+    session does not import it."""
+    import thumbnail_pack
+
+    return thumbnail_pack
+
+
+def save(
+    state,
+    object_ids,
+    thumbnails,
+    path=config.SESSION_PATH,
+    pack_path=config.SESSION_PACK_PATH,
+):
+    """Writes a snapshot of the last search: state, a JSON serializable dict such as the
+    search fields and ordered result records, every object ID of the search, and
+    {URL: QImage} thumbnails.  Object IDs are stored packed after a JSON header, and
+    thumbnails decoded in a thumbnail pack at pack_path.
+    Returns whether it was written."""
+    ids = array("I", object_ids or [])
+    header = json.dumps({"state": state, "object_ids": len(ids)}).encode("utf-8")
+    temp_path = f"{path}.{threading.get_ident()}.tmp"
+    temp_pack_path = f"{pack_path}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        pack = _thumbnail_pack().ThumbnailPack(temp_pack_path)
+        for url, image in thumbnails.items():
+            pack.append(url, image)
+        pack.close()
+        with open(temp_path, "wb") as file:
+            file.write(MAGIC)
+            file.write(HEADER_LENGTH.pack(len(header)))
+            file.write(header)
+            file.write(ids.tobytes())
+        os.replace(temp_pack_path, pack_path)
+        os.replace(temp_path, path)
+    except (OSError, OverflowError, ValueError) as e:
+        print(f"Error saving session: {e}")
+        return False
+    return True
+
+
+def load(path=config.SESSION_PATH, pack_path=config.SESSION_PACK_PATH):
+    """Returns (state, object IDs, thumbnail pack) of the snapshot at path, or None if
+    there is none or it cannot be read.  Thumbnails are read from the pack with
+    ThumbnailPack.get(), without decoding."""
+    try:
+        with open(path, "rb") as file:
+            content = file.read()
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        print(f"Error loading session: {e}")
+        return None
+    try:
+        if content[: len(MAGIC)] != MAGIC:
+            return None
+        position = len(MAGIC) + HEADER_LENGTH.size
+        (header_length,) = HEADER_LENGTH.unpack_from(content, len(MAGIC))
+        header = json.loads(content[position : position + header_length])
+        position += header_length
+        ids = array("I")
+        ids_end = position + header["object_ids"] * ids.itemsize
+        ids.frombytes(content[position:ids_end])
+        if ids_end != len(content):
+            raise ValueError("snapshot is truncated")
+        pack = _thumbnail_pack().ThumbnailPack(pack_path)
+    except (OSError, ValueError, KeyError, TypeError, struct.error) as e:
+        print(f"Error loading session: {e}")
+        return None
+    return header["state"], ids.tolist(), pack
+
+
+def clear(path=config.SESSION_PATH, pack_path=config.SESSION_PACK_PATH):
+    """Deletes the snapshot, if any."""
+    for file_path in (path, pack_path):
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Error deleting session: {e}")
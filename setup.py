@@ -40,5 +40,6 @@ setup(
     app=APP,
     data_files=DATA_FILES,
     options={"py2app": OPTIONS},
+    python_requires=">=3.10",
     setup_requires=["py2app"],
 )
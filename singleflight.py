@@ -0,0 +1,113 @@
+import threading
+
+import config
+
+_groups = {}  # Name -> SingleFlight, for stats()
+_groups_lock = threading.Lock()
+
+
+class _Flight:
+    """One call in progress and the callers waiting for its result."""
+
+    def __init__(self):
+        self.waiters = []  # (is_running, progress) of every caller still interested
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.lock = threading.Lock()
+
+    def is_running(self):
+        """The call continues while any caller still wants its result."""
+        with self.lock:
+            waiters = list(self.waiters)
+        return any(is_running() for is_running, _ in waiters)
+
+    def progress(self, *args):
+        """Passes progress on to every caller that asked for it."""
+        with self.lock:
+            waiters = list(self.waiters)
+        for _, progress in waiters:
+            if progress:
+                progress(*args)
+
+    def leave(self, waiter):
+        """Removes a caller that is no longer interested."""
+        with self.lock:
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+
+
+class SingleFlight:
+    """Merges concurrent calls with the same key into one, whose result every caller receives.
+    Calls made after it completes start a new one."""
+
+    def __init__(self, name):
+        """Registers the group under name for stats()."""
+        self.name = name
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.executions = 0
+        self.shared = 0  # Calls answered by another caller's execution
+        with _groups_lock:
+            _groups[name] = self
+
+    def do(self, key, function, is_running=lambda: True, progress=None):
+        """Returns function(is_running, progress), sharing one execution among concurrent callers.
+        The function sees is_running() true while any caller's is_running() is true, and its
+        progress calls reach every caller.  A caller whose is_running() turns false stops
+        waiting and gets None.  Exceptions are raised to every caller."""
+        waiter = (is_running, progress)
+        with self._lock:
+            self.calls += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._flights[key] = flight
+                self.executions += 1
+            else:
+                self.shared += 1
+            with flight.lock:
+                flight.waiters.append(waiter)
+
+        if leader:
+            try:
+                flight.result = function(flight.is_running, flight.progress)
+            except Exception as e:
+                flight.error = e
+            finally:
+                with self._lock:
+                    del self._flights[key]
+                flight.done.set()
+        else:
+            while not flight.done.wait(config.SINGLE_FLIGHT_POLL_INTERVAL):
+                if not is_running():
+                    flight.leave(waiter)
+                    return None
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def in_flight(self, key):
+        """Returns whether a call for key is in progress."""
+        with self._lock:
+            return key in self._flights
+
+    def stats(self):
+        """Returns call counts, and the share of calls that needed no execution of their own."""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "executions": self.executions,
+                "shared": self.shared,
+                "shared_ratio": self.shared / self.calls if self.calls else 0.0,
+                "in_flight": len(self._flights),
+            }
+
+
+def stats():
+    """Returns the stats of every single flight group by name."""
+    with _groups_lock:
+        groups = dict(_groups)
+    return {name: group.stats() for name, group in groups.items()}
@@ -0,0 +1,60 @@
+import importlib
+import threading
+import time
+
+import config
+import instrumentation
+
+# Imported first by main.py, so timings start close to the start of the process
+_started = time.perf_counter_ns()
+_last = _started
+phases = []  # (phase name, duration in nanoseconds), in order
+
+# Modules the first window does without, imported by warm_up() once it is painted:
+# searching, with asyncio and the HTTP stack, thumbnail downloads and decoding
+DEFERRED_MODULES = ["fetch", "http_client", "downloader", "thumbnail_pack"]
+
+
+def mark(phase):
+    """Ends a startup phase, begun at the previous mark or at the start.
+    The phase is also recorded as a "startup" span in the trace."""
+    global _last
+    now = time.perf_counter_ns()
+    phases.append((phase, now - _last))
+    if instrumentation.enabled:
+        instrumentation.record("startup", _last, now, {"phase": phase})
+    _last = now
+
+
+def elapsed():
+    """Returns the seconds since startup began."""
+    return (time.perf_counter_ns() - _started) / 1e9
+
+
+def report():
+    """Returns the duration of each phase, and the total, as text."""
+    lines = [f"{phase:<28}{duration / 1e6:>9.1f} ms" for phase, duration in phases]
+    lines.append(f"{'total':<28}{(_last - _started) / 1e6:>9.1f} ms")
+    return "\n".join(lines)
+
+
+def warm_up(modules=DEFERRED_MODULES):
+    """Imports modules on a background thread, so that the first search does not wait
+    for them.  Returns the thread."""
+
+    def run():
+        for module in modules:
+            try:
+                importlib.import_module(module)
+            except Exception as e:
+                print(f"Error importing {module}: {e}")
+
+    thread = threading.Thread(target=run, name="warm up", daemon=True)
+    thread.start()
+    return thread
+
+
+def print_report():
+    """Prints the report if config.STARTUP_REPORT is set."""
+    if config.STARTUP_REPORT:
+        print(f"Startup:\n{report()}")
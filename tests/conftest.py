@@ -0,0 +1,100 @@
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+
+# Tests never touch the user's caches, and Qt runs without a display.  Set before any
+# application module reads config.
+os.environ["METEXPLORER_CACHE_DIR"] = tempfile.mkdtemp(prefix="metexplorer-tests-")
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Serves the routes of the test server, see http_server()."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        route = self.server.routes.get(self.path.split("?")[0])
+        if route is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.server.requests.append((self.path, dict(self.headers)))
+        status, headers, body = route(self)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def http_server():
+    """A local HTTP server.  Add routes as server.routes[path] = handler, where
+    handler(request) returns (status, headers, body); requests made are recorded in
+    server.requests as (path, headers).  server.url(path) is the URL of a path."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    server.routes = {}
+    server.requests = []
+    server.url = lambda path: f"http://127.0.0.1:{server.server_port}{path}"
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+    )
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def fresh_http_client(monkeypatch):
+    """Gives a test its own HTTP session and rate limiter."""
+    import http_client
+    import rate_limit
+
+    monkeypatch.setattr(http_client, "_session", None)
+    monkeypatch.setattr(http_client, "_adapter", None)
+    monkeypatch.setattr(rate_limit, "_limiter", None)
+
+
+@pytest.fixture(scope="session")
+def qapp():
+    """The QApplication widgets under test need."""
+    from PySide6.QtWidgets import QApplication
+
+    return QApplication.instance() or QApplication([])
+
+
+def wait_until(app, condition, timeout=10):
+    """Processes Qt events until condition() is true.  Returns whether it became true."""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        app.processEvents()
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replaces the time seen by the caches with one the test moves forward."""
+    import metadata_cache
+    import query_cache
+
+    clock = SimpleNamespace(now=1000.0)
+    clock.time = lambda: clock.now
+    for module in (metadata_cache, query_cache):
+        monkeypatch.setattr(module, "time", clock)
+    return clock
@@ -0,0 +1,33 @@
+import threading
+
+import config
+import metadata_cache
+from app import App
+from metadata_cache import MetadataCache
+from tests.conftest import wait_until
+
+
+def test_classifications_are_counted_off_the_gui_thread(qapp, monkeypatch):
+    cache = MetadataCache(":memory:")
+    monkeypatch.setattr(metadata_cache, "_cache", cache)
+    cache.put({"objectID": 1, "classification": "Netsuke"})
+    counting_threads = []
+    classification_counts = cache.classification_counts
+
+    def record_thread(limit=None):
+        counting_threads.append(threading.current_thread())
+        return classification_counts(limit)
+
+    monkeypatch.setattr(cache, "classification_counts", record_thread)
+    window = App()
+    try:
+        options = [
+            window.classification.itemText(row)
+            for row in range(window.classification.count())
+        ]
+        assert options == config.CLASSIFICATION_OPTIONS[: len(options)]
+        assert wait_until(qapp, lambda: window.classification.itemText(1) == "Netsuke")
+        assert counting_threads
+        assert threading.main_thread() not in counting_threads
+    finally:
+        window.close()
@@ -0,0 +1,65 @@
+import threading
+import time
+
+import pytest
+
+from cancellation import CancelToken, Cancelled
+
+
+def test_cancel_stops_the_work():
+    token = CancelToken()
+    assert token.is_running()
+    token.check()
+    token.cancel()
+    assert token.cancelled
+    assert not token.is_running()
+    with pytest.raises(Cancelled):
+        token.check()
+
+
+def test_deadline_cancels():
+    token = CancelToken(timeout=0.05)
+    assert not token.cancelled
+    assert 0 < token.remaining() <= 0.05
+    time.sleep(0.06)
+    assert token.cancelled
+    assert token.remaining() == 0
+
+
+def test_no_deadline():
+    token = CancelToken()
+    assert token.deadline is None
+    assert token.remaining() is None
+
+
+def test_child_is_cancelled_with_its_parent():
+    parent = CancelToken()
+    child = CancelToken(parent=parent)
+    child.cancel()
+    assert not parent.cancelled
+    other = CancelToken(parent=parent)
+    parent.cancel()
+    assert other.cancelled
+
+
+def test_child_never_outlives_the_parent_deadline():
+    parent = CancelToken(timeout=1)
+    assert CancelToken(timeout=60, parent=parent).deadline == parent.deadline
+    assert CancelToken(parent=parent).deadline == parent.deadline
+    assert CancelToken(timeout=0.5, parent=parent).deadline < parent.deadline
+
+
+def test_sleep_wakes_on_cancel():
+    token = CancelToken()
+    threading.Timer(0.05, token.cancel).start()
+    started = time.monotonic()
+    assert not token.sleep(10)
+    assert time.monotonic() - started < 5
+
+
+def test_sleep_stops_at_the_deadline():
+    token = CancelToken(timeout=0.05)
+    started = time.monotonic()
+    assert not token.sleep(10)
+    assert time.monotonic() - started < 5
+    assert CancelToken().sleep(0.01)
@@ -0,0 +1,118 @@
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+from PySide6.QtCore import QBuffer, QByteArray, QIODevice
+from PySide6.QtGui import QColor, QImage
+
+import downloader
+from decode_pool import DecodePool
+from tests.conftest import wait_until
+
+
+def png(width, height):
+    image = QImage(width, height, QImage.Format_RGB32)
+    image.fill(QColor(40, 90, 160))
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.WriteOnly)
+    image.save(buffer, "PNG")
+    return bytes(data)
+
+
+class BrokenProcesses:
+    """Stands in for worker processes that died, either before or after taking work."""
+
+    def __init__(self, broken_on_submit):
+        self.broken_on_submit = broken_on_submit
+        self.shut_down = False
+
+    def submit(self, *args):
+        if self.broken_on_submit:
+            raise BrokenProcessPool("A worker process died")
+        future = Future()
+        future.set_exception(BrokenProcessPool("A worker process died"))
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut_down = True
+
+
+def pool_with(processes, max_process_restarts=3):
+    pool = DecodePool(
+        threads=1,
+        processes=1,
+        process_min_bytes=0,
+        max_process_restarts=max_process_restarts,
+    )
+    pool._processes = processes
+    return pool
+
+
+def test_decodes_on_a_thread_when_the_processes_died_before_taking_work():
+    processes = BrokenProcesses(broken_on_submit=True)
+    pool = pool_with(processes)
+    try:
+        image = pool.decode(png(40, 30)).result(timeout=10)
+        assert image.size().toTuple() == (40, 30)
+        assert processes.shut_down
+        assert pool._processes is None  # Restarted by the next decode
+        assert pool.stats()["process_restarts"] == 1
+    finally:
+        pool.shutdown()
+
+
+def test_decodes_fail_when_the_processes_die_while_decoding():
+    processes = BrokenProcesses(broken_on_submit=False)
+    pool = pool_with(processes)
+    try:
+        assert pool.decode(png(40, 30)).result(timeout=10) is None
+        assert processes.shut_down
+        stats = pool.stats()
+        assert stats["failed"] == 1 and stats["pending"] == 0
+        assert stats["process_restarts"] == 1
+    finally:
+        pool.shutdown()
+
+
+def test_processes_are_given_up_after_too_many_restarts():
+    pool = pool_with(BrokenProcesses(broken_on_submit=True), max_process_restarts=1)
+    try:
+        pool.decode(png(40, 30)).result(timeout=10)
+        assert pool.processes == 1
+        pool._processes = BrokenProcesses(broken_on_submit=True)
+        pool.decode(png(40, 30)).result(timeout=10)
+        assert pool.processes == 0
+        assert pool.decode(png(40, 30)).result(timeout=10) is not None
+    finally:
+        pool.shutdown()
+
+
+def test_decodes_after_shutdown_fail():
+    pool = DecodePool(threads=1, processes=0)
+    pool.shutdown()
+    assert pool.decode(png(40, 30)).result() is None
+    assert pool.scale(QImage(4, 4, QImage.Format_RGB32), 2, 2).result() is None
+    assert pool.stats()["failed"] == 2
+
+
+def test_scheduler_finishes_requests_whose_decode_could_not_start(
+    qapp, http_server, fresh_http_client, monkeypatch
+):
+    def broken_decode(url, content):
+        raise RuntimeError("cannot schedule new futures after shutdown")
+
+    monkeypatch.setattr(downloader, "decode_thumbnail", broken_decode)
+    http_server.routes["/a.png"] = lambda request: (200, {}, png(40, 30))
+    http_server.routes["/b.png"] = lambda request: (200, {}, png(40, 30))
+    scheduler = downloader.ImageDownloadScheduler(workers=1, decode_max_pending=1)
+    failed = []
+    scheduler.error_occurred.connect(failed.append)
+    try:
+        requests = [
+            scheduler.submit(http_server.url("/a.png")),
+            scheduler.submit(http_server.url("/b.png")),
+        ]
+        # The second request only gets a decode slot if the first released it
+        assert wait_until(qapp, lambda: sorted(failed) == requests)
+    finally:
+        scheduler.shutdown()
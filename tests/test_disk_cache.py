@@ -0,0 +1,61 @@
+import os
+
+from disk_cache import DiskCache
+
+
+def test_put_get_round_trip(tmp_path):
+    cache = DiskCache(str(tmp_path), 1024)
+    cache.put("a", b"alpha")
+    assert cache.get("a") == b"alpha"
+    assert cache.get("missing") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = DiskCache(str(tmp_path), 30)
+    cache.put("a", b"a" * 10)
+    cache.put("b", b"b" * 10)
+    cache.put("c", b"c" * 10)
+    cache.get("a")  # "b" is now the least recently used
+    cache.put("d", b"d" * 10)
+    assert cache.get("b") is None
+    assert cache.get("a") == b"a" * 10
+    assert cache.get("d") == b"d" * 10
+    assert cache.stats()["bytes"] <= 30
+    assert not os.path.exists(os.path.join(str(tmp_path), DiskCache.key_name("b")))
+
+
+def test_replacing_a_key_counts_its_size_once(tmp_path):
+    cache = DiskCache(str(tmp_path), 100)
+    cache.put("a", b"x" * 40)
+    cache.put("a", b"y" * 20)
+    assert cache.stats()["bytes"] == 20
+    assert cache.stats()["entries"] == 1
+
+
+def test_reopening_keeps_recency_order(tmp_path):
+    cache = DiskCache(str(tmp_path), 30)
+    cache.put("old", b"o" * 10)
+    cache.put("new", b"n" * 10)
+    os.utime(os.path.join(str(tmp_path), DiskCache.key_name("old")), (1, 1))
+    reopened = DiskCache(str(tmp_path), 30)
+    assert reopened.stats()["bytes"] == 20
+    reopened.put("third", b"t" * 15)
+    assert reopened.get("old") is None
+    assert reopened.get("new") == b"n" * 10
+
+
+def test_membership_does_not_refresh_recency(tmp_path):
+    cache = DiskCache(str(tmp_path), 20)
+    cache.put("a", b"a" * 10)
+    cache.put("b", b"b" * 10)
+    mtime = os.path.getmtime(os.path.join(str(tmp_path), DiskCache.key_name("a")))
+    assert "a" in cache
+    assert "missing" not in cache
+    assert (
+        os.path.getmtime(os.path.join(str(tmp_path), DiskCache.key_name("a"))) == mtime
+    )
+    cache.put("c", b"c" * 10)  # "a" is still the least recently used
+    assert "a" not in cache
+    assert "b" in cache
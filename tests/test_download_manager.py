@@ -0,0 +1,114 @@
+import os
+
+import pytest
+
+import download_manager
+
+pytestmark = pytest.mark.usefixtures("fresh_http_client")
+
+CONTENT = bytes(range(256)) * 40
+
+
+def image_route(content, etag='"v1"', range_start=None):
+    """Serves content with ranges honoured while If-Range matches etag.
+    range_start forces the first byte of partial responses."""
+
+    def handle(request):
+        requested = request.headers.get("Range")
+        if_range = request.headers.get("If-Range")
+        if requested and if_range in (None, etag):
+            start = int(requested[len("bytes=") : -1])
+            if start >= len(content):
+                return 416, {"Content-Range": f"bytes */{len(content)}"}, b""
+            if range_start is not None:
+                start = range_start
+            content_range = f"bytes {start}-{len(content) - 1}/{len(content)}"
+            return 206, {"ETag": etag, "Content-Range": content_range}, content[start:]
+        return 200, {"ETag": etag}, content
+
+    return handle
+
+
+def write_part(path, data, validator=None):
+    with open(f"{path}.part", "wb") as file:
+        file.write(data)
+    if validator:
+        with open(f"{path}.part.validator", "w") as file:
+            file.write(validator)
+
+
+def read(path):
+    with open(path, "rb") as file:
+        return file.read()
+
+
+def range_headers(server):
+    return [headers.get("Range") for _, headers in server.requests]
+
+
+def test_downloads_whole_image(http_server, tmp_path):
+    http_server.routes["/a.jpg"] = image_route(CONTENT)
+    path = str(tmp_path / "a.jpg")
+    progress = []
+    assert download_manager.stream_to_file(
+        http_server.url("/a.jpg"), path, progress=lambda *args: progress.append(args)
+    )
+    assert read(path) == CONTENT
+    assert progress[-1] == (len(CONTENT), len(CONTENT))
+    assert not os.path.exists(f"{path}.part")
+    assert not os.path.exists(f"{path}.part.validator")
+
+
+def test_resumes_unchanged_image(http_server, tmp_path):
+    http_server.routes["/b.jpg"] = image_route(CONTENT)
+    path = str(tmp_path / "b.jpg")
+    write_part(path, CONTENT[:1000], '"v1"')
+    assert download_manager.stream_to_file(http_server.url("/b.jpg"), path)
+    assert read(path) == CONTENT
+    assert range_headers(http_server) == ["bytes=1000-"]
+    assert http_server.requests[0][1]["If-Range"] == '"v1"'
+
+
+def test_restarts_when_image_changed(http_server, tmp_path):
+    http_server.routes["/c.jpg"] = image_route(CONTENT, etag='"v2"')
+    path = str(tmp_path / "c.jpg")
+    write_part(path, b"x" * 1000, '"v1"')
+    assert download_manager.stream_to_file(http_server.url("/c.jpg"), path)
+    assert read(path) == CONTENT
+
+
+def test_does_not_resume_without_validator(http_server, tmp_path):
+    http_server.routes["/d.jpg"] = image_route(CONTENT)
+    path = str(tmp_path / "d.jpg")
+    write_part(path, CONTENT[:1000])
+    assert download_manager.stream_to_file(http_server.url("/d.jpg"), path)
+    assert read(path) == CONTENT
+    assert range_headers(http_server) == [None]
+
+
+def test_finishes_complete_partial_download(http_server, tmp_path):
+    http_server.routes["/e.jpg"] = image_route(CONTENT)
+    path = str(tmp_path / "e.jpg")
+    write_part(path, CONTENT, '"v1"')
+    assert download_manager.stream_to_file(http_server.url("/e.jpg"), path)
+    assert read(path) == CONTENT
+    assert not os.path.exists(f"{path}.part.validator")
+
+
+def test_restarts_on_unexpected_range(http_server, tmp_path):
+    http_server.routes["/f.jpg"] = image_route(CONTENT, range_start=500)
+    path = str(tmp_path / "f.jpg")
+    write_part(path, CONTENT[:1000], '"v1"')
+    assert download_manager.stream_to_file(http_server.url("/f.jpg"), path)
+    assert read(path) == CONTENT
+    assert range_headers(http_server) == ["bytes=1000-", None]
+
+
+def test_parse_content_range():
+    parse = download_manager._parse_content_range
+    assert parse("bytes 10-19/20") == (10, 19, 20)
+    assert parse("bytes */20") == (None, None, 20)
+    assert parse("bytes 0-9/*") == (0, 9, None)
+    assert parse(None) is None
+    assert parse("items 0-1/2") is None
+    assert parse("bytes x-y/z") is None
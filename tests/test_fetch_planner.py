@@ -0,0 +1,111 @@
+import sqlite3
+
+import pytest
+
+import fetch_planner
+import metadata_cache
+from fetch_planner import FetchPlan
+from metadata_cache import MetadataCache
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    """An empty shared metadata cache."""
+    cache = MetadataCache(":memory:")
+    monkeypatch.setattr(metadata_cache, "_cache", cache)
+    return cache
+
+
+def record(object_id, classification="Paintings", image=True):
+    return {
+        "objectID": object_id,
+        "classification": classification,
+        "primaryImageSmall": f"https://images.example/{object_id}.jpg" if image else "",
+    }
+
+
+def fetch_all(plan, records):
+    """Fetches as a search does, one ID at a time.  Returns the IDs fetched."""
+    fetched = []
+    while (object_id := plan.next_id()) is not None:
+        fetched.append(object_id)
+        plan.record(records.get(object_id))
+    return fetched
+
+
+def test_facts_are_kept_for_every_object_ever_stored(cache):
+    cache.max_entries = 1
+    cache.put(record(1, "Coins"))
+    cache.put(record(2, "Paintings", image=False))
+    assert cache.get(1) is None  # Evicted
+    assert cache.facts([1, 2, 3]) == {1: ("Coins", True), 2: ("Paintings", False)}
+    assert cache.classification_counts() == [("Coins", 1), ("Paintings", 1)]
+
+
+def test_facts_are_forgotten_with_invalidated_records(cache):
+    cache.put(record(1))
+    cache.invalidate([1])
+    assert cache.facts([1]) == {}
+
+
+def test_facts_are_learned_from_records_cached_without_them(tmp_path):
+    path = str(tmp_path / "metadata.db")
+    MetadataCache(path).put(record(1, "Coins"))
+    connection = sqlite3.connect(path)
+    connection.execute("DROP TABLE facts")
+    connection.commit()
+    connection.close()
+    assert MetadataCache(path).facts([1]) == {1: ("Coins", True)}
+
+
+def test_plan_without_filters_fetches_every_id(cache):
+    plan = FetchPlan([1, 2, 3])
+    assert fetch_all(plan, {n: record(n) for n in (1, 2, 3)}) == [1, 2, 3]
+    assert plan.is_exhausted()
+    assert plan.stats()["wasted"] == 0
+
+
+def test_plan_skips_objects_known_not_to_match(cache):
+    cache.put(record(2, "Coins"))
+    cache.put(record(3, "Paintings", image=False))
+    plan = FetchPlan([1, 2, 3, 4], classification="paintings", has_images=True)
+    records = {n: record(n) for n in (1, 4)}
+    assert fetch_all(plan, records) == [1, 4]
+    assert plan.stats()["skipped"] == 2
+
+
+def test_plan_fetches_ahead_only_as_far_as_the_page_needs(cache):
+    plan = FetchPlan(list(range(1, 11)), classification="Coins", page_size=2)
+    first, second = plan.next_id(), plan.next_id()
+    assert (first, second) == (1, 2)
+    assert plan.next_id() is None  # Two pending fetches could fill the page
+    plan.record(record(1, "Paintings"))
+    plan.record(record(2, "Coins"))
+    # One match out of two so far: two more are expected to fill the last place
+    assert [plan.next_id(), plan.next_id(), plan.next_id()] == [3, 4, None]
+    assert not plan.record(record(3, "Paintings"))
+    assert plan.record(record(4, "Coins"))
+    assert plan.is_full()
+    assert plan.next_id() is None
+    assert plan.stats()["wasted_ratio"] == 0.5
+
+
+def test_plan_stops_at_the_fetch_budget(cache):
+    plan = FetchPlan(list(range(1, 11)), classification="Coins", max_fetches=3)
+    assert fetch_all(plan, {}) == [1, 2, 3]
+    assert plan.stats()["failed"] == 3
+    assert not plan.is_exhausted()
+
+
+def test_plan_continues_from_an_offset(cache):
+    plan = FetchPlan([1, 2, 3, 4], offset=2)
+    assert fetch_all(plan, {3: record(3), 4: record(4)}) == [3, 4]
+
+
+def test_totals_of_every_plan(cache):
+    before = fetch_planner.stats()
+    plan = FetchPlan([1, 2], classification="Coins")
+    fetch_all(plan, {1: record(1, "Coins"), 2: record(2)})
+    after = fetch_planner.stats()
+    assert after["fetched"] - before["fetched"] == 2
+    assert after["matched"] - before["matched"] == 1
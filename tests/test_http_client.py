@@ -0,0 +1,83 @@
+import time
+
+import pytest
+import requests
+from urllib3.exceptions import EmptyPoolError
+
+import config
+import http_client
+import rate_limit
+from cancellation import CancelToken
+
+
+pytestmark = pytest.mark.usefixtures("fresh_http_client")
+
+
+def ok(request):
+    return 200, {}, b"ok"
+
+
+def test_get_returns_response(http_server):
+    http_server.routes["/ok"] = ok
+    response = http_client.get(http_server.url("/ok"))
+    assert response.status_code == 200
+    assert response.content == b"ok"
+    assert rate_limit.get_limiter().stats()["in_flight"] == 0
+
+
+def test_pool_wait_is_bounded(http_server, monkeypatch):
+    monkeypatch.setattr(config, "HTTP_POOL_SIZE", 1)
+    monkeypatch.setattr(config, "HTTP_POOL_TIMEOUT", 0.2)
+    http_server.routes["/ok"] = ok
+    # A streamed response holds the only connection until it is closed
+    held = http_client.get_session().get(http_server.url("/ok"), stream=True)
+    started = time.monotonic()
+    with pytest.raises(EmptyPoolError):
+        http_client.get_session().get(http_server.url("/ok"))
+    assert time.monotonic() - started < 2
+    held.close()
+    assert http_client.get_session().get(http_server.url("/ok")).status_code == 200
+
+
+class FailingSession:
+    """Stands in for the shared session, failing every request with error."""
+
+    def __init__(self, error):
+        self.error = error
+
+    def get(self, *args, **kwargs):
+        raise self.error
+
+
+def test_unexpected_errors_release_their_slot(http_server, monkeypatch):
+    limiter = rate_limit.RateLimiter(
+        concurrency=1, min_concurrency=1, max_concurrency=1
+    )
+    monkeypatch.setattr(rate_limit, "_limiter", limiter)
+    http_server.routes["/ok"] = ok
+    with monkeypatch.context() as patch:
+        patch.setattr(
+            http_client,
+            "get_session",
+            lambda: FailingSession(requests.TooManyRedirects()),
+        )
+        for _ in range(3):
+            # A leaked slot would block the next request until the token cancels it
+            with pytest.raises(requests.TooManyRedirects):
+                http_client.get(http_server.url("/ok"), token=CancelToken(timeout=5))
+    assert limiter.stats()["in_flight"] == 0
+    assert limiter.stats()["failed"] == 3
+    response = http_client.get(http_server.url("/ok"), token=CancelToken(timeout=5))
+    assert response.status_code == 200
+
+
+def test_throttled_requests_are_retried(http_server, monkeypatch):
+    monkeypatch.setattr(config, "RETRY_BASE_DELAY", 0.01)
+    statuses = [429, 200]
+    http_server.routes["/busy"] = lambda request: (statuses.pop(0), {}, b"done")
+    response = http_client.get(http_server.url("/busy"))
+    assert response.status_code == 200
+    stats = rate_limit.get_limiter().stats()
+    assert stats["throttled"] == 1
+    assert stats["retried"] == 1
+    assert stats["in_flight"] == 0
@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+from local_index import LocalIndex
+
+SAMPLE = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)),
+    "resources",
+    "fixtures",
+    "MetObjects-sample.csv",
+)
+
+
+@pytest.fixture(scope="module")
+def index(tmp_path_factory):
+    """An index built from the sample dump shipped for tests."""
+    index = LocalIndex(str(tmp_path_factory.mktemp("index") / "index.sqlite3"))
+    assert index.ingest_csv(SAMPLE) == 24
+    return index
+
+
+def test_indexes_every_row(index):
+    assert index.count() == 24
+    data = index.get(436535)
+    assert data["title"] == "Wheat Field with Cypresses"
+    assert data["artistDisplayName"] == "Vincent van Gogh"
+    assert data["classification"] == "Paintings"
+    assert data["isPublicDomain"] is True
+    # The MET dump has no image columns, so the API is still asked for images
+    assert data["localIndexComplete"] is False
+    assert index.get(1) is None
+
+
+def test_words_match_as_prefixes(index):
+    assert index.search("cypress") == [436535]
+    assert set(index.search("sunflower")) == {437133, 207785}
+    assert index.search("wheat cyp") == [436535]
+    assert index.search("cypresses nowhere") == []
+
+
+def test_blank_query_matches_everything(index):
+    assert sorted(index.search("   ")) == sorted(index.search(""))
+    assert len(index.search(" \t ")) == 24
+
+
+def test_unsearchable_text_matches_nothing(index):
+    assert index.search('"') == []
+    assert index.search("-") == []
+
+
+def test_classification_filter(index):
+    assert set(index.search("gogh")) == {436535, 437133, 459110}
+    assert set(index.search("gogh", classification="paintings")) == {436535, 437133}
+    assert set(index.search(" ", classification="Coins")) == {199318, 247983}
+    assert index.search("gogh", classification="Coins") == []
+
+
+def test_has_images_keeps_objects_of_unknown_availability(index):
+    assert set(index.search("gogh", has_images=True)) == set(index.search("gogh"))
+
+
+def test_sorts_by_date(index):
+    ids = index.search("gogh", sort=("objectEndDate", True))
+    assert ids == [436535, 437133, 459110]
+    ids = index.search("", classification="Paintings", sort=("objectEndDate", False))
+    assert ids[0] == 437881  # Vermeer, 1662
+    assert ids[-1] == 483462  # Rothko, 1950
+
+
+def test_classifications_most_common_first(index):
+    assert index.classifications(limit=1) == ["Paintings"]
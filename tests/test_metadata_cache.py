@@ -0,0 +1,94 @@
+from metadata_cache import MetadataCache
+
+
+def record(object_id, **fields):
+    return {"objectID": object_id, "title": f"Object {object_id}", **fields}
+
+
+def test_get_returns_stored_records(tmp_path, clock):
+    cache = MetadataCache(str(tmp_path / "metadata.db"))
+    assert cache.get(1) is None
+    cache.put(record(1))
+    assert cache.get(1) == record(1)
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 1, "hit_ratio": 0.5}
+
+
+def test_records_persist(tmp_path, clock):
+    path = str(tmp_path / "metadata.db")
+    MetadataCache(path).put(record(1))
+    cache = MetadataCache(path)
+    assert cache.get(1) == record(1)
+    assert cache.stats()["entries"] == 1
+
+
+def test_records_expire(clock):
+    cache = MetadataCache(":memory:", ttl=60)
+    cache.put(record(1))
+    clock.now += 61
+    assert cache.get(1) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_records_are_evicted(clock):
+    cache = MetadataCache(":memory:", max_entries=2)
+    cache.put(record(1))
+    clock.now += 1
+    cache.put(record(2))
+    clock.now += 1
+    cache.get(1)
+    clock.now += 1
+    cache.put(record(3))
+    assert cache.get(2) is None
+    assert cache.get(1) is not None and cache.get(3) is not None
+    assert cache.stats()["entries"] == 2
+
+
+def test_replacing_a_record_does_not_grow_the_cache(clock):
+    cache = MetadataCache(":memory:")
+    cache.put(record(1))
+    cache.put(record(1, title="Renamed"))
+    assert cache.get(1)["title"] == "Renamed"
+    assert cache.stats()["entries"] == 1
+
+
+def test_invalidate_keeps_records_updated_since(clock):
+    cache = MetadataCache(":memory:")
+    cache.put(record(1, metadataDate="2024-01-01T00:00:00"))
+    cache.put(record(2, metadataDate="2024-06-01T00:00:00"))
+    cache.put(record(3))
+    cache.invalidate([1, 2, 3], updated_since="2024-03-01T00:00:00")
+    assert cache.get(1) is None
+    assert cache.get(2) is not None
+    assert cache.get(3) is None
+    cache.invalidate([2])
+    assert cache.get(2) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_meta_values(clock):
+    cache = MetadataCache(":memory:")
+    assert cache.get_meta("last_sync", "never") == "never"
+    cache.set_meta("last_sync", 5)
+    assert cache.get_meta("last_sync") == "5"
+
+
+def test_clear(clock):
+    cache = MetadataCache(":memory:")
+    cache.put(record(1))
+    cache.clear()
+    assert cache.get(1) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_contains_does_not_count_or_refresh(clock):
+    cache = MetadataCache(":memory:", ttl=60, max_entries=2)
+    cache.put(record(1))
+    clock.now += 1
+    cache.put(record(2))
+    clock.now += 1
+    assert 1 in cache and 3 not in cache
+    assert cache.stats()["hits"] == cache.stats()["misses"] == 0
+    cache.put(record(3))
+    assert 1 not in cache  # Still the least recently used
+    clock.now += 60
+    assert 2 not in cache and 3 in cache
@@ -0,0 +1,35 @@
+from types import SimpleNamespace
+
+import metadata_cache
+import prefetch
+from metadata_cache import MetadataCache
+
+
+def test_only_objects_fetched_count_as_prefetched(monkeypatch):
+    cache = MetadataCache(":memory:")
+    monkeypatch.setattr(metadata_cache, "_cache", cache)
+    cache.put({"objectID": 1})
+    fetched = []
+
+    def fetch_object_data(object_id):
+        fetched.append(object_id)
+        if object_id == 2:
+            cache.put({"objectID": 2})
+            return {"objectID": 2}
+        if object_id == 3:
+            return {"objectID": 3}  # Described by the local index, not cached
+        return None
+
+    monkeypatch.setattr(
+        prefetch,
+        "_met_api",
+        lambda: SimpleNamespace(fetch_object_data=fetch_object_data),
+    )
+    prefetcher = prefetch.Prefetcher()
+    for object_id in (1, 2, 3, 4):
+        prefetcher._prefetch_object(object_id)
+    assert fetched == [2, 3, 4]
+    assert cache.stats()["hits"] == 0  # The cached object was not read
+    prefetcher.record_objects([1, 2, 3, 4])
+    stats = prefetcher.stats()["objects"]
+    assert (stats["prefetched"], stats["hits"], stats["misses"]) == (1, 1, 3)
@@ -0,0 +1,62 @@
+from query_cache import QueryCache, normalize
+
+
+def test_case_and_whitespace_do_not_change_the_key():
+    assert normalize("  Sunflowers  by   Van Gogh ", 1, " Paintings ") == normalize(
+        "sunflowers by van gogh", True, "paintings"
+    )
+    assert normalize("sunflowers", True, "") != normalize("sunflowers", False, "")
+
+
+def test_entries_are_fresh_then_stale_then_dropped(clock):
+    cache = QueryCache(":memory:", ttl=60, max_age=600)
+    assert cache.get("vase", False, "") is None
+    cache.put("vase", False, "", [3, 1, 2])
+    assert cache.get("Vase ", False, "") == ([3, 1, 2], True)
+    clock.now += 61
+    assert cache.get("vase", False, "") == ([3, 1, 2], False)
+    clock.now += 600
+    assert cache.get("vase", False, "") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["stale_hits"], stats["misses"]) == (1, 1, 2)
+    assert stats["hit_ratio"] == 0.5
+
+
+def test_entries_persist(tmp_path, clock):
+    path = str(tmp_path / "queries.db")
+    QueryCache(path).put("vase", True, "Ceramics", [1, 2])
+    assert QueryCache(path).get("vase", True, "Ceramics") == ([1, 2], True)
+
+
+def test_oldest_searches_are_evicted_from_disk(tmp_path, clock):
+    path = str(tmp_path / "queries.db")
+    cache = QueryCache(path, max_entries=2)
+    for number, query in enumerate(("one", "two", "three")):
+        clock.now += 1
+        cache.put(query, False, "", [number])
+    assert cache.stats()["entries"] == 2
+    reopened = QueryCache(path)
+    assert reopened.get("one", False, "") is None
+    assert reopened.get("three", False, "") == ([2], True)
+
+
+def test_memory_keeps_the_most_recently_used_searches(clock):
+    cache = QueryCache(":memory:", memory_entries=2)
+    cache.put("one", False, "", [1])
+    cache.put("two", False, "", [2])
+    cache.get("one", False, "")
+    cache.put("three", False, "", [3])
+    assert list(cache._memory) == [
+        normalize("one", False, ""),
+        normalize("three", False, ""),
+    ]
+    # Still answered from disk
+    assert cache.get("two", False, "") == ([2], True)
+
+
+def test_clear(clock):
+    cache = QueryCache(":memory:")
+    cache.put("vase", False, "", [1])
+    cache.clear()
+    assert cache.get("vase", False, "") is None
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,103 @@
+import time
+
+import pytest
+
+import config
+from cancellation import CancelToken, Cancelled
+from rate_limit import RateLimiter, backoff_delay
+
+
+def limiter(**kwargs):
+    settings = dict(
+        max_rate=100, burst=10, concurrency=4, min_concurrency=1, max_concurrency=8
+    )
+    settings.update(kwargs)
+    return RateLimiter(**settings)
+
+
+def test_slots_bound_requests_in_flight():
+    rate_limiter = limiter(concurrency=2)
+    rate_limiter.acquire()
+    rate_limiter.acquire()
+    assert rate_limiter.stats()["in_flight"] == 2
+    with pytest.raises(Cancelled):
+        rate_limiter.acquire(CancelToken(timeout=0.1))
+    rate_limiter.release(200, 0.01)
+    rate_limiter.acquire(CancelToken(timeout=5))
+    assert rate_limiter.stats()["requests"] == 3
+
+
+def test_requests_are_paced_after_a_burst():
+    rate_limiter = limiter(max_rate=20, burst=2)
+    started = time.monotonic()
+    for _ in range(4):
+        rate_limiter.acquire(CancelToken(timeout=5))
+        rate_limiter.release(200)
+    # Two requests from the burst, then one every 50 ms
+    assert time.monotonic() - started >= 0.09
+
+
+def test_throttling_backs_off_once_per_second():
+    rate_limiter = limiter()
+    rate_limiter.acquire()
+    rate_limiter.release(429)
+    stats = rate_limiter.stats()
+    assert stats["rate"] == 100 * config.RATE_LIMIT_BACKOFF_FACTOR
+    assert stats["ceiling"] == 100 * config.RATE_LIMIT_CEILING_FACTOR
+    assert stats["concurrency"] == 2
+    rate_limiter.acquire(CancelToken(timeout=5))
+    rate_limiter.release(503)
+    stats = rate_limiter.stats()
+    assert stats["rate"] == 100 * config.RATE_LIMIT_BACKOFF_FACTOR
+    assert stats["throttled"] == 2
+
+
+def test_rate_recovers_up_to_the_ceiling():
+    rate_limiter = limiter()
+    rate_limiter.acquire()
+    rate_limiter.release(429)
+    # Outcomes only, rather than waiting for thousands of paced requests
+    for _ in range(5000):
+        rate_limiter.release(200)
+    assert rate_limiter.stats()["rate"] == rate_limiter.stats()["ceiling"]
+
+
+def test_failures_shrink_concurrency_down_to_the_minimum():
+    rate_limiter = limiter(concurrency=4, min_concurrency=2)
+    for _ in range(10):
+        rate_limiter.acquire(CancelToken(timeout=5))
+        rate_limiter.release(None)
+    assert rate_limiter.stats()["concurrency"] == 2
+
+
+def test_slow_responses_shrink_concurrency():
+    rate_limiter = limiter(concurrency=4)
+    rate_limiter.release(200, 0.01)
+    for _ in range(20):
+        rate_limiter.release(200, 1.0)
+    assert rate_limiter.stats()["concurrency"] < 4
+
+
+def test_retry_budget_is_spent_and_refilled(monkeypatch):
+    monkeypatch.setattr(config, "RETRY_BUDGET_MAX", 2)
+    monkeypatch.setattr(config, "RETRY_BUDGET_RATIO", 0.5)
+    rate_limiter = limiter()
+    assert rate_limiter.allow_retry()
+    assert rate_limiter.allow_retry()
+    assert not rate_limiter.allow_retry()
+    assert rate_limiter.stats()["retries_denied"] == 1
+    for _ in range(2):
+        rate_limiter.acquire(CancelToken(timeout=5))
+        rate_limiter.release(200)
+    assert rate_limiter.allow_retry()
+    assert rate_limiter.stats()["retried"] == 3
+
+
+def test_backoff_delay(monkeypatch):
+    monkeypatch.setattr(config, "RETRY_BASE_DELAY", 1)
+    monkeypatch.setattr(config, "RETRY_MAX_DELAY", 8)
+    assert all(0 <= backoff_delay(2) <= 4 for _ in range(100))
+    assert all(backoff_delay(10) <= 8 for _ in range(100))
+    assert backoff_delay(0, retry_after="5") == 5
+    assert backoff_delay(0, retry_after="60") == 8
+    assert 0 <= backoff_delay(0, retry_after="Wed, 21 Oct 2015 07:28:00 GMT") <= 1
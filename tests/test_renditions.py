@@ -0,0 +1,29 @@
+import renditions
+
+SMALL_URL = "https://images.metmuseum.org/CRDImages/ep/web-large/DT1567.jpg"
+ORIGINAL_URL = "https://images.metmuseum.org/CRDImages/ep/original/DT1567.jpg"
+
+
+def test_thumbnail_and_full_image_urls():
+    data = {"primaryImageSmall": SMALL_URL, "primaryImage": ORIGINAL_URL}
+    assert renditions.rendition_urls(data) == [
+        (renditions.SMALL, SMALL_URL),
+        (renditions.ORIGINAL, ORIGINAL_URL),
+    ]
+    assert renditions.thumbnail_url(data) == SMALL_URL
+    assert renditions.full_image_url(data) == ORIGINAL_URL
+
+
+def test_falls_back_to_the_only_rendition():
+    data = {"primaryImageSmall": "", "primaryImage": ORIGINAL_URL}
+    assert renditions.thumbnail_url(data) == ORIGINAL_URL
+    assert renditions.thumbnail_url({"primaryImage": ""}) is None
+
+
+def test_downloads_are_accounted_by_tier():
+    before = renditions.stats()
+    renditions.record_download(SMALL_URL, 100)
+    renditions.record_download(ORIGINAL_URL, 1000)
+    after = renditions.stats()
+    assert after["small"]["bytes"] - before["small"]["bytes"] == 100
+    assert after["original"]["downloads"] - before["original"]["downloads"] == 1
@@ -0,0 +1,69 @@
+import asyncio
+
+from PySide6.QtCore import Qt
+
+from fetch import FetchDataThread
+from results import ResultDataRole, ResultsModel, ResultsProxyModel
+
+
+def record(object_id):
+    return {"objectID": object_id, "title": f"Object {object_id}"}
+
+
+class Client:
+    """Fetches records of any object, as SearchClient.fetch_batches() does."""
+
+    def __init__(self):
+        self.fetched = []
+
+    async def fetch_batches(self, plan, classification=""):
+        while (object_id := plan.next_id()) is not None:
+            self.fetched.append(object_id)
+            plan.record(record(object_id))
+            yield [record(object_id)]
+
+
+def shown(proxy):
+    return [
+        proxy.index(row, 0).data(ResultDataRole)["objectID"]
+        for row in range(proxy.rowCount())
+    ]
+
+
+def revalidate(model, cached_ids, position, object_ids):
+    """Runs revalidate() as the application does, with the results at cached_ids up to
+    position shown.  Returns the fetch thread, the client and the page end."""
+    thread = FetchDataThread("vase", False, "", object_ids=list(cached_ids))
+    pages = []
+    thread.result_ready.connect(lambda _, results: model.append_results(results))
+    thread.results_removed.connect(lambda _, removed: model.remove_objects(removed))
+    thread.ids_ready.connect(lambda _, ids: model.set_order(ids))
+    thread.page_end.connect(lambda _, offset: pages.append(offset))
+    client = Client()
+
+    async def run():
+        refresh = asyncio.get_running_loop().create_future()
+        refresh.set_result(object_ids)
+        await thread.revalidate(client, refresh, position)
+
+    asyncio.run(run())
+    return thread, client, pages
+
+
+def test_revalidated_page_follows_the_search_run_again(qapp):
+    model = ResultsModel()
+    proxy = ResultsProxyModel()
+    proxy.setSourceModel(model)
+    proxy.set_sort(proxy.sort_field, Qt.AscendingOrder)
+    model.append_results([record(n) for n in (1, 2, 3, 4)])
+    # 2 is gone, and 7 and 8 are new among the objects shown
+    thread, client, pages = revalidate(
+        model, [1, 2, 3, 4, 5, 6], 4, [7, 1, 3, 8, 4, 5, 6]
+    )
+    assert client.fetched == [7, 8]
+    assert shown(proxy) == [7, 1, 3, 8, 4]
+    assert thread.object_ids == [7, 1, 3, 8, 4, 5, 6]
+    assert pages == [5]  # The next page starts at 5
+    # The next page is appended after the revalidated one
+    model.append_results([record(5)])
+    assert shown(proxy) == [7, 1, 3, 8, 4, 5]
@@ -0,0 +1,62 @@
+import sys
+
+from PySide6.QtGui import QColor, QImage
+
+import session
+import thumbnail_pack
+
+
+def paths(tmp_path):
+    return {
+        "path": str(tmp_path / "session.bin"),
+        "pack_path": str(tmp_path / "session.pack"),
+    }
+
+
+def thumbnail(color):
+    image = QImage(20, 10, thumbnail_pack.FRAME_FORMAT)
+    image.fill(QColor(color))
+    return image
+
+
+def test_snapshot_round_trip(tmp_path):
+    state = {"search_params": ["vase", True, ""], "results": [{"objectID": 7}]}
+    thumbnails = {"https://images.example/7.jpg": thumbnail("#ff0000")}
+    assert session.save(state, [7, 8, 9], thumbnails, **paths(tmp_path))
+    loaded_state, object_ids, pack = session.load(**paths(tmp_path))
+    assert loaded_state == state
+    assert object_ids == [7, 8, 9]
+    image = pack.get("https://images.example/7.jpg")
+    assert QColor(image.pixel(0, 0)).name() == "#ff0000"
+    pack.close()
+
+
+def test_no_snapshot(tmp_path):
+    assert session.load(**paths(tmp_path)) is None
+
+
+def test_unreadable_snapshots_are_ignored(tmp_path):
+    session.save({}, [1, 2], {}, **paths(tmp_path))
+    path = paths(tmp_path)["path"]
+    with open(path, "rb") as file:
+        content = file.read()
+    with open(path, "wb") as file:
+        file.write(content[:-2])
+    assert session.load(**paths(tmp_path)) is None
+    with open(path, "wb") as file:
+        file.write(b"METSESS1" + content[8:])
+    assert session.load(**paths(tmp_path)) is None
+
+
+def test_clear(tmp_path):
+    thumbnails = {"https://images.example/1.jpg": thumbnail("#00ff00")}
+    session.save({}, [], thumbnails, **paths(tmp_path))
+    session.clear(**paths(tmp_path))
+    assert session.load(**paths(tmp_path)) is None
+    assert not (tmp_path / "session.pack").exists()
+
+
+def test_loading_without_a_snapshot_leaves_the_pack_unimported(tmp_path, monkeypatch):
+    monkeypatch.delitem(sys.modules, "thumbnail_pack")
+    assert session.load(**paths(tmp_path)) is None
+    assert "thumbnail_pack" not in sys.modules
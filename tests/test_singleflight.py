@@ -0,0 +1,147 @@
+import threading
+import time
+
+import pytest
+
+import config
+import singleflight
+from singleflight import SingleFlight
+
+
+def run_concurrently(group, key, function, callers, **kwargs):
+    """Calls group.do() from callers threads at once and returns their results."""
+    results = [None] * callers
+    errors = [None] * callers
+
+    def call(number):
+        try:
+            results[number] = group.do(key, function, **kwargs)
+        except Exception as e:
+            errors[number] = e
+
+    threads = [threading.Thread(target=call, args=(n,)) for n in range(callers)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def wait_for_calls(group, calls):
+    while group.stats()["calls"] < calls:
+        time.sleep(0.001)
+
+
+def test_concurrent_calls_share_one_execution():
+    group = SingleFlight("test shared")
+    release = threading.Event()
+    calls = []
+
+    def function(is_running, progress):
+        calls.append(1)
+        release.wait(5)
+        return "result"
+
+    threads, results, errors = run_concurrently(group, "key", function, 4)
+    wait_for_calls(group, 4)
+    assert group.in_flight("key")
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert results == ["result"] * 4
+    assert errors == [None] * 4
+    assert len(calls) == 1
+    stats = group.stats()
+    assert (stats["executions"], stats["shared"], stats["in_flight"]) == (1, 3, 0)
+    assert stats["shared_ratio"] == 0.75
+    assert singleflight.stats()["test shared"] == stats
+
+
+def test_later_calls_start_a_new_execution():
+    group = SingleFlight("test sequential")
+    assert group.do("key", lambda is_running, progress: 1) == 1
+    assert group.do("key", lambda is_running, progress: 2) == 2
+    assert group.do("other", lambda is_running, progress: 3) == 3
+    assert group.stats()["executions"] == 3
+
+
+def test_errors_reach_every_caller():
+    group = SingleFlight("test errors")
+    release = threading.Event()
+
+    def function(is_running, progress):
+        release.wait(5)
+        raise ValueError("failed")
+
+    threads, results, errors = run_concurrently(group, "key", function, 3)
+    wait_for_calls(group, 3)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert all(isinstance(error, ValueError) for error in errors)
+    assert not group.in_flight("key")
+
+
+def test_caller_that_stops_gets_none(monkeypatch):
+    monkeypatch.setattr(config, "SINGLE_FLIGHT_POLL_INTERVAL", 0.01)
+    group = SingleFlight("test leaving")
+    started = threading.Event()
+    release = threading.Event()
+    still_wanted = []
+
+    def function(is_running, progress):
+        started.set()
+        release.wait(5)
+        still_wanted.append(is_running())
+        return "result"
+
+    leader = threading.Thread(target=group.do, args=("key", function))
+    leader.start()
+    started.wait(5)
+    assert group.do("key", function, is_running=lambda: False) is None
+    release.set()
+    leader.join(5)
+    assert still_wanted == [True]  # The leader still wanted it
+
+
+def test_execution_stops_once_no_caller_wants_it():
+    group = SingleFlight("test stopping")
+    running = threading.Event()
+    running.set()
+    seen = []
+
+    def function(is_running, progress):
+        seen.append(is_running())
+        running.clear()
+        seen.append(is_running())
+
+    group.do("key", function, is_running=running.is_set)
+    assert seen == [True, False]
+
+
+def test_progress_reaches_every_caller():
+    group = SingleFlight("test progress")
+    release = threading.Event()
+    reports = []
+
+    def function(is_running, progress):
+        release.wait(5)
+        progress(1, 2)
+
+    threads, _, _ = run_concurrently(
+        group, "key", function, 2, progress=lambda *args: reports.append(args)
+    )
+    wait_for_calls(group, 2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert reports == [(1, 2), (1, 2)]
+
+
+@pytest.mark.parametrize("callers", [1, 8])
+def test_flights_are_removed_once_done(callers):
+    group = SingleFlight(f"test cleanup {callers}")
+    threads, _, _ = run_concurrently(
+        group, "key", lambda is_running, progress: None, callers
+    )
+    for thread in threads:
+        thread.join(5)
+    assert group.stats()["in_flight"] == 0
@@ -0,0 +1,192 @@
+import os
+
+from PySide6.QtGui import QColor, QImage
+
+import thumbnail_pack
+from thumbnail_pack import FRAME_FORMAT, HEADER, SLOT_HEADER, ThumbnailPack
+
+WIDTH = 8
+HEIGHT = 6
+
+
+def image(color, width=WIDTH, height=HEIGHT):
+    frame = QImage(width, height, FRAME_FORMAT)
+    frame.fill(QColor(color))
+    return frame
+
+
+def color(frame):
+    return QColor(frame.pixel(0, 0)).name()
+
+
+def open_pack(tmp_path, **kwargs):
+    return ThumbnailPack(str(tmp_path / "thumbnails.pack"), WIDTH, HEIGHT, **kwargs)
+
+
+def test_get_returns_appended_frames(tmp_path):
+    pack = open_pack(tmp_path)
+    assert pack.append("a", image("#ff0000"))
+    assert color(pack.get("a")) == "#ff0000"
+    # Appended after the file was mapped for the first frame
+    assert pack.append("b", image("#00ff00", 4, 3))
+    frame = pack.get("b")
+    assert (frame.width(), frame.height()) == (4, 3)
+    assert color(frame) == "#00ff00"
+    assert pack.get("c") is None
+    assert "a" in pack and "c" not in pack
+
+
+def test_larger_images_are_not_added(tmp_path):
+    pack = open_pack(tmp_path)
+    assert not pack.append("a", image("#ff0000", WIDTH + 1, HEIGHT))
+    assert "a" not in pack
+
+
+def test_frames_persist_across_reopening(tmp_path):
+    pack = open_pack(tmp_path)
+    pack.append("a", image("#ff0000"))
+    pack.append("b", image("#00ff00"))
+    pack.append("a", image("#0000ff"))
+    pack.remove("b")
+    pack.close()
+    pack = open_pack(tmp_path)
+    assert color(pack.get("a")) == "#0000ff"
+    assert pack.get("b") is None
+    assert pack.stats()["frames"] == 1
+    assert pack.stats()["dead_frames"] == 2
+
+
+def test_pack_of_another_frame_size_is_started_over(tmp_path):
+    pack = open_pack(tmp_path)
+    pack.append("a", image("#ff0000"))
+    pack.close()
+    pack = ThumbnailPack(str(tmp_path / "thumbnails.pack"), WIDTH * 2, HEIGHT)
+    assert pack.get("a") is None
+
+
+def corrupt(path, slot, pack):
+    offset = HEADER.size + slot * pack.slot_bytes + SLOT_HEADER.size
+    with open(path, "r+b") as file:
+        file.seek(offset)
+        file.write(b"\x01\x02\x03\x04")
+
+
+def test_corrupt_frames_are_dropped(tmp_path):
+    pack = open_pack(tmp_path)
+    pack.append("a", image("#ff0000"))
+    pack.append("b", image("#00ff00"))
+    pack.close()
+    corrupt(pack.path, 0, pack)
+    pack = open_pack(tmp_path)
+    assert pack.get("a") is None
+    assert "a" not in pack
+    assert color(pack.get("b")) == "#00ff00"
+
+
+def test_check_drops_corrupt_frames(tmp_path):
+    pack = open_pack(tmp_path)
+    pack.append("a", image("#ff0000"))
+    pack.append("b", image("#00ff00"))
+    corrupt(pack.path, 1, pack)
+    assert pack.check() == 1
+    assert "b" not in pack
+    assert pack.check() == 0
+
+
+def test_truncated_tail_is_dropped(tmp_path):
+    pack = open_pack(tmp_path)
+    pack.append("a", image("#ff0000"))
+    pack.append("b", image("#00ff00"))
+    pack.close()
+    with open(pack.path, "r+b") as file:
+        file.truncate(HEADER.size + pack.slot_bytes + 10)
+    pack = open_pack(tmp_path)
+    assert color(pack.get("a")) == "#ff0000"
+    assert pack.get("b") is None
+    assert pack.append("b", image("#00ff00"))
+    assert color(pack.get("b")) == "#00ff00"
+
+
+def test_drawing_on_a_frame_leaves_the_file_unchanged(tmp_path):
+    pack = open_pack(tmp_path)
+    pack.append("a", image("#ff0000"))
+    frame = pack.get("a")
+    frame.fill(QColor("#ffffff"))
+    assert pack.check() == 0
+    pack.compact()
+    assert color(pack.get("a")) == "#ff0000"
+    pack.close()
+    assert color(open_pack(tmp_path).get("a")) == "#ff0000"
+
+
+def test_compact_keeps_the_most_recently_used_frames(tmp_path):
+    pack = open_pack(tmp_path)
+    for url, rgb in (("a", "#ff0000"), ("b", "#00ff00"), ("c", "#0000ff")):
+        pack.append(url, image(rgb))
+    pack.get("a")
+    pack.compact(keep=2)
+    assert "b" not in pack
+    assert color(pack.get("a")) == "#ff0000"
+    assert color(pack.get("c")) == "#0000ff"
+    assert pack.stats()["dead_frames"] == 0
+    # Recency survives compaction: "c" was used last
+    pack.compact(keep=1)
+    assert "a" not in pack and "c" in pack
+
+
+def test_frames_changed_during_compaction_are_kept_up_to_date(tmp_path, monkeypatch):
+    pack = open_pack(tmp_path)
+    for url, rgb in (("a", "#ff0000"), ("b", "#00ff00"), ("c", "#0000ff")):
+        pack.append(url, image(rgb))
+    copy_frames = pack._copy_frames
+    changed = []
+
+    def copy_and_change(*args):
+        if not changed:
+            # Between the snapshot and the swap, as another thread would
+            pack.remove("b")
+            pack.append("c", image("#ffff00"))
+            pack.append("d", image("#00ffff"))
+            changed.append(True)
+        return copy_frames(*args)
+
+    monkeypatch.setattr(pack, "_copy_frames", copy_and_change)
+    pack.compact()
+    assert "b" not in pack
+    assert color(pack.get("a")) == "#ff0000"
+    assert color(pack.get("c")) == "#ffff00"
+    assert color(pack.get("d")) == "#00ffff"
+    assert pack.stats()["frames"] == 3
+    # "b" and the old "c" were copied before they changed
+    assert pack.stats()["dead_frames"] == 2
+    pack.close()
+    pack = open_pack(tmp_path)
+    assert {url for url in "abcd" if url in pack} == {"a", "c", "d"}
+
+
+def test_full_pack_is_compacted_in_the_background(tmp_path):
+    max_bytes = HEADER.size + 8 * (SLOT_HEADER.size + WIDTH * HEIGHT * 4)
+    pack = open_pack(tmp_path, max_bytes=max_bytes)
+    for number in range(9):
+        assert pack.append(str(number), image("#ff0000"))
+    pack._compaction.join(10)
+    assert "8" in pack and "0" not in pack
+    assert pack.stats()["bytes"] <= max_bytes
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_clear_removes_every_frame(tmp_path):
+    pack = open_pack(tmp_path)
+    pack.append("a", image("#ff0000"))
+    pack.clear()
+    assert pack.get("a") is None
+    assert pack.stats()["frames"] == 0
+    assert os.path.getsize(pack.path) == HEADER.size
+
+
+def test_get_pack_opens_the_shared_pack(monkeypatch, tmp_path):
+    monkeypatch.setattr(thumbnail_pack, "_pack", None)
+    monkeypatch.setattr(
+        thumbnail_pack.config, "THUMBNAIL_PACK_PATH", str(tmp_path / "shared.pack")
+    )
+    assert thumbnail_pack.get_pack() is thumbnail_pack.get_pack()
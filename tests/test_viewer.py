@@ -0,0 +1,47 @@
+from PySide6.QtCore import QBuffer, QByteArray, QIODevice
+from PySide6.QtGui import QColor, QImage
+
+import decode_pool
+import image_cache
+import viewer
+from tests.conftest import wait_until
+
+IMAGE_URL = "https://images.example/original/viewer-test.jpg"
+
+
+def jpeg(width, height):
+    image = QImage(width, height, QImage.Format_RGB32)
+    image.fill(QColor(40, 90, 160))
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.WriteOnly)
+    image.save(buffer, "JPG")
+    return bytes(data)
+
+
+def test_smooth_scaling_reuses_the_decoded_image(qapp, monkeypatch):
+    image_cache.get_cache().put(IMAGE_URL, jpeg(400, 300))
+    window = viewer.FullImageViewer(IMAGE_URL)
+    try:
+        assert wait_until(qapp, lambda: window.loader is None)
+        assert window.original_pixmap is not None
+        assert window.original_image is not None
+        assert window.original_image.size() == window.original_pixmap.size()
+
+        scaled = []
+        pool = decode_pool.get_pool()
+        scale = pool.scale
+
+        def record_scale(image, width, height):
+            scaled.append(image)
+            return scale(image, width, height)
+
+        monkeypatch.setattr(pool, "scale", record_scale)
+        window.scale_smoothly((200, 150))
+        window.scale_smoothly((100, 75))
+        assert scaled[0] is window.original_image
+        assert scaled[1] is window.original_image
+        assert wait_until(qapp, lambda: not window.scaling)
+        assert window.scaled_pixmaps[(100, 75)].width() == 100
+    finally:
+        window.close()
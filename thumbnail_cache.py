@@ -0,0 +1,105 @@
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from PySide6.QtCore import QBuffer, QByteArray, QIODevice
+from PySide6.QtGui import QImage
+
+import config
+from disk_cache import DiskCache
+
+
+class ThumbnailCache:
+    """Two tier cache of scaled thumbnails keyed by image URL.
+    Decoded images are kept in memory, encoded copies persist on disk."""
+
+    def __init__(
+        self,
+        directory=config.THUMBNAIL_CACHE_DIR,
+        max_disk_bytes=config.THUMBNAIL_CACHE_MAX_BYTES,
+        max_memory_bytes=config.THUMBNAIL_MEMORY_CACHE_MAX_BYTES,
+    ):
+        """Opens the on-disk tier in directory."""
+        self.disk = DiskCache(directory, max_disk_bytes)
+        self.max_memory_bytes = max_memory_bytes
+        self.memory_hits = 0
+        self._memory = OrderedDict()  # URL -> QImage, least recently used first
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        """Returns the cached thumbnail for url as a QImage, or None."""
+        with self._lock:
+            image = self._memory.get(url)
+            if image is not None:
+                self._memory.move_to_end(url)
+                self.memory_hits += 1
+                return image
+        data = self.disk.get(url)
+        if data is None:
+            return None
+        image = QImage()
+        if not image.loadFromData(data):
+            return None
+        self._remember(url, image)
+        return image
+
+    def put(self, url, image):
+        """Caches an already scaled thumbnail for url."""
+        self._remember(url, image)
+        data = self.encode(image)
+        if data:
+            self.disk.put(url, data)
+
+    @staticmethod
+    def encode(image):
+        """Encodes a thumbnail compactly: JPEG unless it needs transparency."""
+        image_format = "PNG" if image.hasAlphaChannel() else "JPG"
+        buffer = QByteArray()
+        device = QBuffer(buffer)
+        device.open(QIODevice.WriteOnly)
+        if not image.save(device, image_format, config.THUMBNAIL_CACHE_QUALITY):
+            return None
+        device.close()
+        return bytes(buffer.data())
+
+    def stats(self):
+        """Returns memory and disk tier statistics."""
+        return {
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "memory_hits": self.memory_hits,
+            "disk": self.disk.stats(),
+        }
+
+    def _remember(self, url, image):
+        """Adds image to the memory tier, evicting least recently used entries over budget."""
+        with self._lock:
+            previous = self._memory.pop(url, None)
+            if previous is not None:
+                self._memory_bytes -= previous.sizeInBytes()
+            self._memory[url] = image
+            self._memory_bytes += image.sizeInBytes()
+            while self._memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= evicted.sizeInBytes()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Returns the shared thumbnail cache, opening it on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = ThumbnailCache()
+            except OSError as e:
+                print(f"Error opening thumbnail cache: {e}")
+                _cache = ThumbnailCache(
+                    os.path.join(tempfile.gettempdir(), "metexplorer-thumbnails")
+                )
+        return _cache
@@ -0,0 +1,394 @@
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+
+from PySide6.QtGui import QImage
+
+import config
+
+# File signature and version, then the frame size the pack was created for
+MAGIC = b"METPACK1"
+HEADER = struct.Struct("<8sHH52x")
+
+# Each frame slot starts with its index entry: digest of the thumbnail URL, thumbnail
+# size, CRC-32 of its pixels and flags.  A slot of zeros marks the end of the frames.
+SLOT_HEADER = struct.Struct("<16sHHII4x")
+LIVE = 1
+
+# Pixel format of every frame.  QPixmaps are made from it without conversion.
+FRAME_FORMAT = QImage.Format_ARGB32_Premultiplied
+BYTES_PER_PIXEL = 4
+
+# Slots added to the file at a time, so that it is not remapped on every append
+GROWTH_SLOTS = 64
+
+
+def digest(url):
+    """Returns the key of url in the index."""
+    return hashlib.blake2b(url.encode("utf-8"), digest_size=16).digest()
+
+
+class ThumbnailPack:
+    """Decoded thumbnails in one memory-mapped file, ready to show without decoding.
+    Every frame has a fixed-size slot fitting width x height pixels, after a header
+    that indexes it, so the file is its own offset index.  QImages returned by get()
+    are made directly over the mapped pages.  They are mapped copy-on-write, so an
+    image drawn on does not change the file; the file itself is only read and written
+    through file operations.  Whether those show in a private mapping depends on the
+    platform, so frames written after the file was mapped are read from a new mapping.
+    Frames are only ever appended; replaced and removed ones are reclaimed by compact().
+    The pack is compacted down to its most recently used frames, on a background
+    thread, when it would outgrow max_bytes.
+    Thread safe."""
+
+    def __init__(
+        self,
+        path,
+        width=config.THUMBNAIL_MAX_WIDTH,
+        height=config.THUMBNAIL_MAX_HEIGHT,
+        max_bytes=None,
+    ):
+        """Opens the pack at path, creating it if missing.  A pack made for another
+        frame size, or unreadable, is started over."""
+        self.path = path
+        self.width = width
+        self.height = height
+        self.max_bytes = max_bytes
+        self.frame_bytes = width * height * BYTES_PER_PIXEL
+        self.slot_bytes = SLOT_HEADER.size + self.frame_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+        # URL digest -> slot number of its live frame, least recently used first
+        self._index = OrderedDict()
+        self._verified = set()  # Slots whose CRC has been checked since opening
+        self._count = 0  # Slots in use, live or not
+        self._capacity = 0  # Slots the file has room for
+        self._mapped = 0  # Slots written before the file was mapped
+        self._map = None
+        self._file = None
+        self._compact_lock = threading.Lock()  # Held by compact() throughout
+        self._compaction = None  # Thread compacting the pack once it is full
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._open()
+
+    def __contains__(self, url):
+        """Checks for a frame of url without reading it."""
+        with self._lock:
+            return digest(url) in self._index
+
+    def get(self, url):
+        """Returns the frame of url as a QImage over the mapped file, or None.
+        A frame failing its integrity check is dropped."""
+        key = digest(url)
+        with self._lock:
+            slot = self._index.get(key)
+            if slot is None:
+                self.misses += 1
+                return None
+            if slot >= self._mapped:
+                self._remap()
+            offset = self._offset(slot)
+            _, width, height, crc, _ = SLOT_HEADER.unpack_from(self._map, offset)
+            start = offset + SLOT_HEADER.size
+            pixels = memoryview(self._map)[
+                start : start + width * height * BYTES_PER_PIXEL
+            ]
+            if slot not in self._verified:
+                if zlib.crc32(pixels) != crc:
+                    print(f"Error reading thumbnail pack: frame {slot} is corrupt")
+                    self._kill(key, slot)
+                    self.misses += 1
+                    return None
+                self._verified.add(slot)
+            self._index.move_to_end(key)
+            self.hits += 1
+        return QImage(pixels, width, height, width * BYTES_PER_PIXEL, FRAME_FORMAT)
+
+    def append(self, url, image):
+        """Adds the frame of url, replacing any earlier one.  Returns whether it was
+        added; images larger than the frame size are not."""
+        if image.width() > self.width or image.height() > self.height:
+            return False
+        if image.format() != FRAME_FORMAT:
+            image = image.convertToFormat(FRAME_FORMAT)
+        key = digest(url)
+        pixels = bytes(image.constBits())[: image.sizeInBytes()]
+        header = SLOT_HEADER.pack(
+            key, image.width(), image.height(), zlib.crc32(pixels), LIVE
+        )
+        with self._lock:
+            if self.max_bytes and self._file_bytes(self._count + 1) > self.max_bytes:
+                self._start_compaction()
+            if self._count == self._capacity:
+                self._grow()
+            slot = self._count
+            offset = self._offset(slot)
+            try:
+                # Pixels first, so a frame whose header made it to disk is complete
+                self._file.seek(offset + SLOT_HEADER.size)
+                self._file.write(pixels)
+                self._file.seek(offset)
+                self._file.write(header)
+                self._file.flush()
+            except OSError as e:
+                print(f"Error writing thumbnail pack: {e}")
+                return False
+            self._count += 1
+            previous = self._index.get(key)
+            if previous is not None:
+                self._kill(key, previous)
+            self._index[key] = slot
+            self._verified.add(slot)
+        return True
+
+    def remove(self, url):
+        """Drops the frame of url, if any.  Its slot is reclaimed by compact()."""
+        key = digest(url)
+        with self._lock:
+            slot = self._index.get(key)
+            if slot is not None:
+                self._kill(key, slot)
+
+    def compact(self, keep=None):
+        """Rewrites the pack with only its live frames, the keep most recently used of
+        them if keep is given.  Frames are copied from the file without holding the
+        lock, so lookups and appends go on meanwhile; frames appended or removed during
+        the copy are accounted for when the new file replaces the old one.
+        QImages from get() stay valid: they map the replaced file."""
+        with self._compact_lock:
+            with self._lock:
+                if self._file is None:
+                    return
+                frames = list(self._index.items())
+                if keep is not None:
+                    frames = frames[max(0, len(frames) - keep) :] if keep else []
+                count = self._count
+            self._compact(frames, count)
+
+    def check(self):
+        """Verifies every frame in the file against its CRC and drops corrupt ones.
+        Returns the number dropped."""
+        corrupt = 0
+        with self._lock:
+            for key, slot in list(self._index.items()):
+                if self._read_frame(self._file, slot) is None:
+                    self._kill(key, slot)
+                    corrupt += 1
+                else:
+                    self._verified.add(slot)
+        return corrupt
+
+    def clear(self):
+        """Removes every frame."""
+        self.compact(keep=0)
+
+    def stats(self):
+        """Returns frame counts, the file size and lookup counts."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "frames": len(self._index),
+                "dead_frames": self._count - len(self._index),
+                "bytes": self._file_bytes(self._capacity),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+    def close(self):
+        """Closes the file.  QImages from get() stay valid."""
+        with self._lock:
+            self._close()
+
+    def _open(self):
+        """Maps the file and reads the index of its frames.
+        Caller must hold the lock."""
+        try:
+            self._file = open(self.path, "r+b")
+        except FileNotFoundError:
+            self._file = open(self.path, "w+b")
+        self._file.seek(0, os.SEEK_END)
+        size = self._file.tell()
+        header = None
+        if size >= HEADER.size:
+            self._file.seek(0)
+            header = HEADER.unpack(self._file.read(HEADER.size))
+        if header != (MAGIC, self.width, self.height):
+            if size:
+                print(f"Error opening thumbnail pack: {self.path} has another format")
+            self._file.truncate(0)
+            self._file.seek(0)
+            self._file.write(HEADER.pack(MAGIC, self.width, self.height))
+            self._file.flush()
+            size = HEADER.size
+        # A slot cut short by a crash is dropped
+        self._capacity = (size - HEADER.size) // self.slot_bytes
+        self._file.truncate(self._file_bytes(self._capacity))
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_COPY)
+        self._index = OrderedDict()
+        self._verified = set()
+        self._count = self._capacity
+        for slot in range(self._capacity):
+            key, width, height, _, flags = SLOT_HEADER.unpack_from(
+                self._map, self._offset(slot)
+            )
+            if not any(key) and not flags:
+                self._count = slot
+                break
+            if flags & LIVE and width <= self.width and height <= self.height:
+                self._index[key] = slot
+        self._mapped = self._count
+
+    def _close(self):
+        """Caller must hold the lock."""
+        self._map = None  # Unmapped once no QImage uses it
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _remap(self):
+        """Maps the file again, so that every frame written so far is mapped.
+        The previous mapping stays valid for the QImages made over it.
+        Caller must hold the lock."""
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_COPY)
+        self._mapped = self._count
+
+    def _grow(self):
+        """Adds up to GROWTH_SLOTS empty slots, within max_bytes, and maps them.
+        Caller must hold the lock."""
+        capacity = self._capacity + GROWTH_SLOTS
+        if self.max_bytes:
+            capacity = min(capacity, self._max_slots())
+        self._capacity = max(capacity, self._count + 1)
+        self._file.truncate(self._file_bytes(self._capacity))
+        self._remap()
+
+    def _start_compaction(self):
+        """Compacts the pack to three quarters of max_bytes on a background thread,
+        unless that thread is already running.  Caller must hold the lock."""
+        if self._compaction is not None and self._compaction.is_alive():
+            return
+        self._compaction = threading.Thread(
+            target=self.compact,
+            kwargs={"keep": self._max_slots() * 3 // 4},
+            name="thumbnail pack compaction",
+            daemon=True,
+        )
+        self._compaction.start()
+
+    def _compact(self, frames, count):
+        """Rewrites the pack with frames [(key, slot)], and those appended from slot
+        count on, see compact()."""
+        temp_path = f"{self.path}.{threading.get_ident()}.tmp"
+        try:
+            with open(self.path, "rb") as source, open(temp_path, "w+b") as file:
+                file.write(HEADER.pack(MAGIC, self.width, self.height))
+                copied = self._copy_frames(source, file, frames)
+                with self._lock:
+                    if self._file is None:
+                        raise OSError("the pack was closed")
+                    for key, (slot, new_slot) in copied.items():
+                        if self._index.get(key) != slot:
+                            # Replaced or removed during the copy
+                            file.seek(self._offset(new_slot) + SLOT_HEADER.size - 8)
+                            file.write(struct.pack("<I", 0))
+                    # Appended during the copy
+                    appended = [
+                        (key, slot)
+                        for key, slot in self._index.items()
+                        if slot >= count
+                    ]
+                    copied.update(
+                        self._copy_frames(self._file, file, appended, len(copied))
+                    )
+                    file.flush()
+                    os.replace(temp_path, self.path)
+                    order = list(self._index)
+                    self._close()
+                    self._open()
+                    # Keep the recency order of frames used during the copy
+                    self._index = OrderedDict(
+                        (key, self._index[key]) for key in order if key in self._index
+                    )
+                    self._verified.update(new_slot for _, new_slot in copied.values())
+        except OSError as e:
+            print(f"Error compacting thumbnail pack: {e}")
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+    def _read_frame(self, file, slot):
+        """Returns the slot of a frame as read from file, header and pixels, or None if
+        its pixels fail the CRC."""
+        file.seek(self._offset(slot))
+        data = file.read(self.slot_bytes)
+        if len(data) < SLOT_HEADER.size:
+            return None
+        _, width, height, crc, _ = SLOT_HEADER.unpack_from(data)
+        pixels = memoryview(data)[
+            SLOT_HEADER.size : SLOT_HEADER.size + width * height * BYTES_PER_PIXEL
+        ]
+        return data if zlib.crc32(pixels) == crc else None
+
+    def _copy_frames(self, source, file, frames, first=0):
+        """Appends the frames of [(key, slot)] read from source to file, from slot first
+        on.  Corrupt frames are left out.  Returns {key: (slot, slot in file)}."""
+        copied = {}
+        for key, slot in frames:
+            data = self._read_frame(source, slot)
+            if data is None:
+                print(f"Error compacting thumbnail pack: frame {slot} is corrupt")
+                continue
+            new_slot = first + len(copied)
+            file.seek(self._offset(new_slot))
+            file.write(data)
+            copied[key] = (slot, new_slot)
+        return copied
+
+    def _kill(self, key, slot):
+        """Marks the frame of key in slot as removed, in the index and in the file.
+        Caller must hold the lock."""
+        if self._index.get(key) == slot:
+            del self._index[key]
+        try:
+            self._file.seek(self._offset(slot) + SLOT_HEADER.size - 8)
+            self._file.write(struct.pack("<I", 0))
+            self._file.flush()
+        except OSError as e:
+            print(f"Error writing thumbnail pack: {e}")
+
+    def _offset(self, slot):
+        return HEADER.size + slot * self.slot_bytes
+
+    def _file_bytes(self, slots):
+        return HEADER.size + slots * self.slot_bytes
+
+    def _max_slots(self):
+        return max(1, (self.max_bytes - HEADER.size) // self.slot_bytes)
+
+
+_pack = None
+_pack_lock = threading.Lock()
+
+
+def get_pack():
+    """Returns the shared thumbnail pack, opening it on first use.
+    Returns None if it cannot be opened."""
+    global _pack
+    with _pack_lock:
+        if _pack is None:
+            try:
+                _pack = ThumbnailPack(
+                    config.THUMBNAIL_PACK_PATH,
+                    max_bytes=config.THUMBNAIL_PACK_MAX_BYTES,
+                )
+            except (OSError, ValueError) as e:
+                print(f"Error opening thumbnail pack: {e}")
+                return None
+        return _pack
@@ -1,5 +1,6 @@
-import requests
-from PySide6.QtCore import Qt, Signal
+from collections import OrderedDict
+
+from PySide6.QtCore import Qt, QThread, QTimer, Signal
 from PySide6.QtGui import QPixmap, QImage
 from PySide6.QtWidgets import (
     QLabel,
@@ -8,20 +9,93 @@ from PySide6.QtWidgets import (
     QWidget,
     QMainWindow,
     QSizePolicy,
+    QProgressBar,
     QPushButton,
 )
 
 import config
+import decode_pool
+import downloader
+import http_client
+import image_cache
+import instrumentation
+import pixmap_cache
+import prefetch
+import saver
 import utils
 
 
+# Loader threads still running, kept referenced until they finish even if their viewer is gone
+running_loaders = set()
+
+
+class ViewerImageLoader(QThread):
+    """Downloads image renditions for the viewer, smallest first, reporting progress."""
+
+    image_loaded = Signal(str, QImage)
+    progress = Signal(int, int)  # Bytes received, total bytes (0 if unknown)
+    failed = Signal(str)
+
+    def __init__(self, urls, max_width, max_height):
+        """Downloads each URL in turn, decoding it to fit within max_width x max_height."""
+        super().__init__()
+        self.urls = urls
+        self.max_width = max_width
+        self.max_height = max_height
+        self._is_running = True
+
+    def run(self):
+        """Downloads and decodes each rendition.  Emits image_loaded for each one."""
+        for url in self.urls:
+            if not self._is_running:
+                return
+            # Renditions are cached as served, so saving one later is a file copy.
+            content = image_cache.get_cache().get(url)
+            downloaded = content is None
+            if url == self.urls[-1]:
+                prefetch.get_prefetcher().record_view(url, not downloaded)
+            if downloaded:
+                try:
+                    content = self.download(url)
+                except Exception as e:
+                    print(f"Error downloading image: {e}")
+            if not self._is_running:
+                return
+            image = None
+            if content is not None:
+                try:
+                    image = (
+                        decode_pool.get_pool()
+                        .decode(content, self.max_width, self.max_height, url)
+                        .result()
+                    )
+                except Exception as e:
+                    print(f"Error decoding image: {e}")
+            if image is None:
+                self.failed.emit(url)
+                continue
+            if downloaded:
+                image_cache.get_cache().put(url, content)
+            self.image_loaded.emit(url, image)
+
+    def download(self, url):
+        """Downloads url, emitting progress.  Returns None on failure or cancellation."""
+        return http_client.download(url, lambda: self._is_running, self.progress.emit)
+
+    def stop(self):
+        """Abandons the remaining downloads."""
+        self._is_running = False
+
+
 class FullImageViewer(QMainWindow):
     """A viewer to display full sized image and option to download it."""
 
     closed = Signal()
+    smoothly_scaled = Signal(int, tuple, QImage)  # Pixmap generation, display size, image
 
-    def __init__(self, image_url, object_url=None):
-        """Initialize the viewer with full size image and sets up the UI."""
+    def __init__(self, image_url, object_url=None, preview_url=None):
+        """Initialize the viewer with full size image and sets up the UI.
+        preview_url is a smaller rendition shown while the full image downloads."""
         super().__init__()
         self.setWindowTitle("Full Image Viewer")
         self.resize(config.VIEWER_DEFAULT_WIDTH, config.VIEWER_DEFAULT_HEIGHT)
@@ -29,6 +103,12 @@ class FullImageViewer(QMainWindow):
         self.image_url = image_url
         self.object_url = object_url
         self.original_pixmap = None
+        self.original_image = None  # original_pixmap as a QImage, for the decode pool
+        self.scaled_pixmaps = OrderedDict()  # Display size -> smoothly scaled original_pixmap
+        self.pixmap_generation = 0  # Incremented when original_pixmap changes
+        self.scaling = set()  # Display sizes being smoothly scaled by the decode pool
+        self.smoothly_scaled.connect(self.show_smoothly_scaled)
+        self.loader = None  # Thread downloading the current image
         self.image_label = QLabel()
         self.image_label.setAlignment(Qt.AlignCenter)
         self.image_label.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
@@ -42,14 +122,30 @@ class FullImageViewer(QMainWindow):
         else:
             self.learn_more_button.setDisabled(True)
 
+        # Download progress, with a button to stop the download
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setTextVisible(False)
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.clicked.connect(self.cancel_loading)
+
+        # Smooth rescaling once resizing settles
+        self.resize_timer = QTimer(self)
+        self.resize_timer.setSingleShot(True)
+        self.resize_timer.setInterval(config.VIEWER_RESIZE_SETTLE_MS)
+        self.resize_timer.timeout.connect(self.update_pixmap)
+
         # Add Download Image button
         self.download_button = QPushButton("Download Image")
         self.download_button.clicked.connect(
-            lambda: utils.download_image_to_local(self.original_pixmap, self.image_url)
+            lambda: saver.save_image(self.image_url, self.statusBar().showMessage, self)
         )
 
         layout = QVBoxLayout()
         layout.addWidget(self.image_label)
+        progress_layout = QHBoxLayout()
+        progress_layout.addWidget(self.progress_bar)
+        progress_layout.addWidget(self.cancel_button)
+        layout.addLayout(progress_layout)
         buttons_layout = QHBoxLayout()
         buttons_layout.addWidget(self.learn_more_button)
         buttons_layout.addWidget(self.download_button)
@@ -57,38 +153,181 @@ class FullImageViewer(QMainWindow):
         container = QWidget()
         container.setLayout(layout)
         self.setCentralWidget(container)
-        self.download_viewer_image(self.image_url)
-
-    def download_viewer_image(self, image_url):
-        """Downloads the image and refreshes the viewer."""
-        response = requests.get(image_url)
-        if response.status_code == 200:
-            image = QImage()
-            image.loadFromData(response.content)
-            self.original_pixmap = QPixmap(image)
-            self.update_pixmap()
-        else:
+        self.load_image(self.image_url, preview_url)
+
+    def load_image(self, image_url, preview_url=None):
+        """Shows the cached thumbnail of preview_url at once, then downloads
+        the preview rendition followed by the full image in the background.
+        Any download in progress for a previous image is cancelled."""
+        self.cancel_loading()
+        self.set_pixmap(None)
+        self.download_button.setDisabled(True)
+        cache = pixmap_cache.get_cache()
+        pixmap = cache.get(self.decoded_key(image_url))
+        if pixmap is not None:
+            # Viewed before and still in memory
+            self.set_pixmap(pixmap)
+            self.download_button.setDisabled(False)
+            return
+        if preview_url:
+            pixmap = cache.get(pixmap_cache.thumbnail_key(preview_url))
+            thumbnail = None
+            if pixmap is None:
+                thumbnail = downloader.cached_thumbnail(preview_url)
+                if thumbnail is not None:
+                    pixmap = QPixmap.fromImage(thumbnail)
+            if pixmap is not None:
+                self.set_pixmap(pixmap, thumbnail)
+        if self.original_pixmap is None:
+            self.image_label.setText("Loading...")
+
+        self.loader = ViewerImageLoader(
+            [url for url in dict.fromkeys([preview_url, image_url]) if url],
+            *self.decode_size(),
+        )
+        self.loader.image_loaded.connect(self.show_loaded_image)
+        self.loader.progress.connect(self.show_progress)
+        self.loader.failed.connect(self.show_failure)
+        self.loader.finished.connect(self.loading_finished)
+        self.progress_bar.setRange(0, 0)
+        self.progress_bar.show()
+        self.cancel_button.show()
+        running_loaders.add(self.loader)
+        self.loader.start()
+
+    def cancel_loading(self):
+        """Stops the current download.  The thread winds down in the background."""
+        if self.loader is not None:
+            self.loader.stop()
+            self.loader = None
+        self.progress_bar.hide()
+        self.cancel_button.hide()
+
+    def decode_size(self):
+        """Returns the largest size worth decoding images at: the screen's, in device pixels.
+        The window never shows more, and originals stay cached on disk for saving."""
+        screen = self.screen()
+        size = screen.availableSize() * screen.devicePixelRatio()
+        return size.width(), size.height()
+
+    def decoded_key(self, url):
+        """Returns the pixmap cache key of url decoded for this viewer."""
+        return pixmap_cache.PixmapCache.key(url, *self.decode_size())
+
+    def is_current(self):
+        """Returns whether the signal being handled comes from the current loader."""
+        return self.sender() is self.loader and self.loader is not None
+
+    def show_loaded_image(self, url, image):
+        """Displays a downloaded rendition in place of the previous one."""
+        if not self.is_current():
+            return
+        pixmap = QPixmap.fromImage(image)
+        pixmap_cache.get_cache().put(self.decoded_key(url), pixmap)
+        self.set_pixmap(pixmap, image)
+        if url == self.image_url:
+            self.download_button.setDisabled(False)
+
+    def show_progress(self, received, total):
+        """Updates the progress bar.  It stays indeterminate if the size is unknown."""
+        if not self.is_current():
+            return
+        if total:
+            self.progress_bar.setRange(0, total)
+            self.progress_bar.setValue(received)
+
+    def show_failure(self, url):
+        """Reports a failed download unless an earlier rendition is already shown."""
+        if self.is_current() and self.original_pixmap is None:
             self.image_label.setText("Failed to load image")
 
-    def update_pixmap(self):
-        """Refreshes the displayed image based on window size update."""
+    def loading_finished(self):
+        """Hides the progress bar and releases finished threads."""
+        loader = self.sender()
+        if loader is self.loader:
+            self.loader = None
+            self.progress_bar.hide()
+            self.cancel_button.hide()
+        running_loaders.discard(loader)
+        loader.deleteLater()
+
+    def set_pixmap(self, pixmap, image=None):
+        """Replaces the image being displayed, dropping renditions scaled from the old one.
+        Pass the QImage the pixmap was made from, if any, to scale it from."""
+        self.original_pixmap = pixmap
+        self.original_image = image
+        self.pixmap_generation += 1
+        self.scaled_pixmaps.clear()
+        self.scaling.clear()
+        if pixmap is None:
+            self.image_label.clear()
+        self.update_pixmap()
+
+    def update_pixmap(self, smooth=True):
+        """Refreshes the displayed image based on window size update.
+        Fast scaling is used while the window is being resized, and until the decode pool
+        has scaled the image smoothly.
+        Smoothly scaled renditions are cached for the most recent window sizes."""
         if self.original_pixmap:
             available_size = self.centralWidget().size()
-            scaled_pixmap = self.original_pixmap.scaled(
-                available_size,
-                Qt.KeepAspectRatio,
-                Qt.SmoothTransformation,
-            )
+            key = (available_size.width(), available_size.height())
+            scaled_pixmap = self.scaled_pixmaps.get(key)
+            if scaled_pixmap is not None:
+                self.scaled_pixmaps.move_to_end(key)
+            else:
+                with instrumentation.span("viewer_scale"):
+                    scaled_pixmap = self.original_pixmap.scaled(
+                        available_size,
+                        Qt.KeepAspectRatio,
+                        Qt.FastTransformation,
+                    )
+                if smooth:
+                    self.scale_smoothly(key)
             self.image_label.setPixmap(scaled_pixmap)
 
+    def scale_smoothly(self, key):
+        """Has the decode pool scale the image smoothly to the display size key."""
+        if key in self.scaling:
+            return
+        self.scaling.add(key)
+        generation = self.pixmap_generation
+
+        def scaled(future):
+            try:
+                self.smoothly_scaled.emit(generation, key, future.result())
+            except RuntimeError:
+                pass  # The viewer was deleted meanwhile
+            except Exception as e:
+                print(f"Error scaling image: {e}")
+
+        if self.original_image is None:
+            # Only pixmaps from the pixmap cache come without their image
+            self.original_image = self.original_pixmap.toImage()
+        decode_pool.get_pool().scale(self.original_image, *key).add_done_callback(
+            scaled
+        )
+
+    def show_smoothly_scaled(self, generation, key, image):
+        """Caches a smoothly scaled rendition, and shows it if the size still fits."""
+        if generation != self.pixmap_generation or key not in self.scaling:
+            return
+        self.scaling.discard(key)
+        self.scaled_pixmaps[key] = QPixmap.fromImage(image)
+        while len(self.scaled_pixmaps) > config.VIEWER_SCALED_CACHE_SIZE:
+            self.scaled_pixmaps.popitem(last=False)
+        available_size = self.centralWidget().size()
+        if key == (available_size.width(), available_size.height()):
+            self.image_label.setPixmap(self.scaled_pixmaps[key])
+
     def resizeEvent(self, event):
-        self.update_pixmap()
+        self.update_pixmap(smooth=False)
+        self.resize_timer.start()
         super().resizeEvent(event)
 
-    def update_image(self, image_url, object_url=None):
+    def update_image(self, image_url, object_url=None, preview_url=None):
         """Updates the image in viewer with new URL."""
         self.image_url = image_url
-        self.download_viewer_image(self.image_url)
+        self.load_image(self.image_url, preview_url)
         self.object_url = object_url
 
         # Enable Learn More button if there is a URL
@@ -102,5 +341,6 @@ class FullImageViewer(QMainWindow):
 
     def closeEvent(self, event):
         """Send a signal when viewer is closed."""
+        self.cancel_loading()
         self.closed.emit()
         super().closeEvent(event)